@@ -0,0 +1,837 @@
+from __future__ import annotations
+from dataclasses import dataclass, asdict
+from typing import Any, TypeAlias
+
+from utils import Frame, FrameData, Gaussian, DataRecord
+import utils
+
+import numpy
+import math
+import cv2
+
+class AnalyzerKind:
+    """
+    Configuration class for the engine a camera is analysed with.
+    """
+    GAUSS = "gauss"
+    """
+    Gaussian fits to the horizontal and vertical projections, see GaussFitAnalyzer. Records DataRecord.
+    """
+    MOMENT = "moment"
+    """
+    Second moments of the beam (ISO 11146 D4σ), see MomentAnalyzer. No iterative fitting. Records MomentRecord.
+    """
+    CENTROID = "centroid"
+    """
+    Centroid of the pixels above a fraction of the peak, see CentroidAnalyzer. Records CentroidRecord.
+    """
+    ELLIPSE = "ellipse"
+    """
+    Rotated elliptical 2D Gaussian fitted coarse to fine on an image pyramid, see EllipseFitAnalyzer. Records EllipseRecord.
+    """
+
+NO_ERROR = numpy.zeros(4)
+
+CLIP_NOISE = 4.0
+"""
+Noise sigma above the background level a frame is clipped at to find the beam, see clipped_moments_fit(...).
+"""
+
+ELLIPSE_FIT_MAX_ITER = 20
+"""
+Maximum number of Levenberg-Marquardt iterations of an elliptical fit. Fits start close to the result (from the coarse
+pyramid level or the previous frame), so they usually converge in a few.
+"""
+
+@dataclass
+class Ellipse:
+    """
+    Rotated elliptical Gaussian with constant offset, amplitude * exp(-u²/(2 sigma_major²) - v²/(2 sigma_minor²)) + offset,
+    where u and v are the pixel coordinates relative to the center, rotated by angle.
+    """
+    amplitude: float
+    center_x: float
+    center_y: float
+    sigma_major: float
+    sigma_minor: float
+    angle: float
+    """
+    Angle in radians from the horizontal axis to the major axis, in the range -π/2 to π/2 (positive towards +y).
+    """
+    offset: float
+    perr: numpy.array[float]
+    """
+    Standard errors of amplitude, center_x, center_y, sigma_major, sigma_minor, angle and offset.
+    """
+
+    @classmethod
+    def from_params(cls, params: numpy.ndarray, perr: numpy.ndarray) -> Ellipse:
+        """
+        Orders the axes so that sigma_major is the larger one and wraps the angle into its range.
+        """
+        amplitude, center_x, center_y, sigma_major, sigma_minor, angle, offset = (float(value) for value in params)
+        perr = perr.copy()
+        sigma_major, sigma_minor = abs(sigma_major), abs(sigma_minor)
+        if sigma_major < sigma_minor:
+            sigma_major, sigma_minor = sigma_minor, sigma_major
+            perr[[3, 4]] = perr[[4, 3]]
+            angle += math.pi / 2
+        angle = (angle + math.pi / 2) % math.pi - math.pi / 2
+        return cls(amplitude, center_x, center_y, sigma_major, sigma_minor, angle, offset, perr)
+
+    @property
+    def params(self) -> numpy.ndarray:
+        return numpy.array([self.amplitude, self.center_x, self.center_y, self.sigma_major, self.sigma_minor, self.angle, self.offset])
+
+    @property
+    def variances(self) -> tuple[float, float, float]:
+        """
+        Second moments (variance x, variance y, covariance) of the Gaussian in square pixels.
+        """
+        cos, sin = math.cos(self.angle), math.sin(self.angle)
+        major, minor = self.sigma_major**2, self.sigma_minor**2
+        return major * cos**2 + minor * sin**2, major * sin**2 + minor * cos**2, (major - minor) * sin * cos
+
+    def rescaled(self, factor: float, shift: float) -> Ellipse:
+        """
+        Converts an ellipse fitted to a resampled frame, see Gaussian.rescaled(...). Amplitude and offset are per pixel
+        and stay.
+        """
+        return Ellipse(
+            self.amplitude,
+            self.center_x * factor + shift,
+            self.center_y * factor + shift,
+            self.sigma_major * factor,
+            self.sigma_minor * factor,
+            self.angle,
+            self.offset,
+            self.perr * numpy.array([1.0, factor, factor, factor, factor, 1.0, 1.0])
+        )
+
+    def shifted(self, x: float, y: float) -> Ellipse:
+        return Ellipse(self.amplitude, self.center_x + x, self.center_y + y, self.sigma_major, self.sigma_minor, self.angle, self.offset, self.perr)
+
+@dataclass
+class BeamFit:
+    """
+    Result of a beam analysis in pixels of the analysed frame, independent of the engine. Every engine describes the
+    beam by a Gaussian per axis, so tracking, the display overlay and rescaling work alike for all of them.
+    """
+    horiz: Gaussian
+    vert: Gaussian
+    covariance: float = 0.0
+    """
+    Mixed second moment <xy> - <x><y> in square pixels. 0 for engines that treat the axes separately.
+    """
+    total: float = 0.0
+    """
+    Sum of the analysed pixel intensities.
+    """
+    ellipse: Ellipse | None = None
+    """
+    Full 2D fit, only from engines that fit the beam in two dimensions.
+    """
+
+    @classmethod
+    def from_ellipse(cls, ellipse: Ellipse) -> BeamFit:
+        """
+        Describes an elliptical fit by its marginal Gaussians (the projections of the fitted beam without offset).
+        """
+        variance_x, variance_y, covariance = ellipse.variances
+        sigma_x, sigma_y = math.sqrt(variance_x), math.sqrt(variance_y)
+        total = 2.0 * math.pi * ellipse.amplitude * ellipse.sigma_major * ellipse.sigma_minor
+        root_two_pi = math.sqrt(2.0 * math.pi)
+        horiz = Gaussian(total / (root_two_pi * sigma_x), ellipse.center_x, sigma_x, 0.0, NO_ERROR)
+        vert = Gaussian(total / (root_two_pi * sigma_y), ellipse.center_y, sigma_y, 0.0, NO_ERROR)
+        return cls(horiz, vert, covariance, total, ellipse)
+
+    def rescaled(self, factor: float, shift: float) -> BeamFit:
+        """
+        Converts the fit to a frame resampled by factor, see Gaussian.rescaled(...).
+        """
+        return BeamFit(
+            self.horiz.rescaled(factor, shift),
+            self.vert.rescaled(factor, shift),
+            self.covariance * factor**2,
+            self.total * factor**2,
+            self.ellipse.rescaled(factor, shift) if self.ellipse is not None else None
+        )
+
+    def shifted(self, x: float, y: float) -> BeamFit:
+        """
+        Moves the fit by x and y pixels, e.g. from a region of interest to the frame it was cut from.
+        """
+        return BeamFit(
+            self.horiz.rescaled(1.0, x),
+            self.vert.rescaled(1.0, y),
+            self.covariance,
+            self.total,
+            self.ellipse.shifted(x, y) if self.ellipse is not None else None
+        )
+
+@dataclass
+class MomentRecord:
+    frame_id: int
+    timestamp: int
+
+    total: float
+    center_horiz: float
+    center_vert: float
+    sigma_horiz: float
+    sigma_vert: float
+    covariance: float
+    d4s_horiz: float
+    """
+    Second moment beam diameter (4 sigma) along the horizontal axis.
+    """
+    d4s_vert: float
+    azimuth: float
+    """
+    Angle in radians between the horizontal axis and the principal axis of the beam closer to it (ISO 11146).
+    """
+
+    @classmethod
+    def create(cls, fit: BeamFit, frame_data: FrameData) -> MomentRecord:
+        sigma_horiz, sigma_vert = fit.horiz.sigma, fit.vert.sigma
+        return cls(
+            frame_id = frame_data.frame_id,
+            timestamp = frame_data.timestamp,
+
+            total = fit.total,
+            center_horiz = fit.horiz.center,
+            center_vert = fit.vert.center,
+            sigma_horiz = sigma_horiz,
+            sigma_vert = sigma_vert,
+            covariance = fit.covariance,
+            d4s_horiz = 4.0 * sigma_horiz,
+            d4s_vert = 4.0 * sigma_vert,
+            azimuth = azimuth(sigma_horiz**2, sigma_vert**2, fit.covariance)
+        )
+
+    def asdict(self) -> dict[str, Any]:
+        return asdict(self)
+
+@dataclass
+class CentroidRecord:
+    frame_id: int
+    timestamp: int
+
+    total: float
+    center_horiz: float
+    center_vert: float
+    sigma_horiz: float
+    sigma_vert: float
+
+    @classmethod
+    def create(cls, fit: BeamFit, frame_data: FrameData) -> CentroidRecord:
+        return cls(
+            frame_id = frame_data.frame_id,
+            timestamp = frame_data.timestamp,
+
+            total = fit.total,
+            center_horiz = fit.horiz.center,
+            center_vert = fit.vert.center,
+            sigma_horiz = fit.horiz.sigma,
+            sigma_vert = fit.vert.sigma
+        )
+
+    def asdict(self) -> dict[str, Any]:
+        return asdict(self)
+
+@dataclass
+class EllipseRecord:
+    frame_id: int
+    timestamp: int
+
+    amplitude: float
+    center_horiz: float
+    center_vert: float
+    sigma_major: float
+    sigma_minor: float
+    angle: float
+    """
+    Angle in radians from the horizontal axis to the major axis, see Ellipse.angle.
+    """
+    offset: float
+    err_amplitude: float
+    err_center_horiz: float
+    err_center_vert: float
+    err_sigma_major: float
+    err_sigma_minor: float
+    err_angle: float
+    err_offset: float
+
+    sigma_horiz: float
+    """
+    Width of the beam projected onto the horizontal axis, comparable to DataRecord.sigma_horiz.
+    """
+    sigma_vert: float
+
+    @classmethod
+    def create(cls, fit: BeamFit, frame_data: FrameData) -> EllipseRecord:
+        ellipse = fit.ellipse
+        return cls(
+            frame_id = frame_data.frame_id,
+            timestamp = frame_data.timestamp,
+
+            amplitude = ellipse.amplitude,
+            center_horiz = ellipse.center_x,
+            center_vert = ellipse.center_y,
+            sigma_major = ellipse.sigma_major,
+            sigma_minor = ellipse.sigma_minor,
+            angle = ellipse.angle,
+            offset = ellipse.offset,
+            err_amplitude = ellipse.perr[0],
+            err_center_horiz = ellipse.perr[1],
+            err_center_vert = ellipse.perr[2],
+            err_sigma_major = ellipse.perr[3],
+            err_sigma_minor = ellipse.perr[4],
+            err_angle = ellipse.perr[5],
+            err_offset = ellipse.perr[6],
+
+            sigma_horiz = fit.horiz.sigma,
+            sigma_vert = fit.vert.sigma
+        )
+
+    def asdict(self) -> dict[str, Any]:
+        return asdict(self)
+
+def azimuth(variance_horiz: float, variance_vert: float, covariance: float) -> float:
+    """
+    Azimuth of a beam from its second moments (ISO 11146), in the range -π/4 to π/4.
+    """
+    if variance_horiz == variance_vert:
+        return math.copysign(math.pi / 4, covariance) if covariance != 0 else 0.0
+    return 0.5 * math.atan(2.0 * covariance / (variance_horiz - variance_vert))
+
+def moments_fit(frame: Frame, origin: tuple[int, int], offset: float = 0.0) -> BeamFit:
+    """
+    Centroid and central second moments of a frame via cv2.moments (a single pass, no conversion of the frame).
+    The offset is subtracted from every pixel in closed form, negative results count as they are (ISO 11146).
+    An error in the offset adds up over every pixel, so use it on an aperture around the beam, not on a large frame
+    (see clipped_moments_fit).
+
+    :param origin: Position (x, y) of the frame in the analysed frame, added to the centroid.
+    :param offset: Background level subtracted from every pixel.
+    :raises ValueError: The frame is empty or dark.
+    """
+    height, width = frame.shape[:2]
+    sum_x = width * (width - 1) / 2
+    sum_y = height * (height - 1) / 2
+    moments = cv2.moments(frame)
+    total = moments["m00"] - offset * width * height
+    if total <= 0:
+        raise ValueError("Frame has no intensity")
+    center_x = (moments["m10"] - offset * height * sum_x) / total
+    center_y = (moments["m01"] - offset * width * sum_y) / total
+    variance_x = (moments["m20"] - offset * height * sum_x * (2 * width - 1) / 3) / total - center_x**2
+    variance_y = (moments["m02"] - offset * width * sum_y * (2 * height - 1) / 3) / total - center_y**2
+    covariance = (moments["m11"] - offset * sum_x * sum_y) / total - center_x * center_y
+    if variance_x <= 0 or variance_y <= 0:
+        raise ValueError("Beam is narrower than a pixel")
+
+    sigma_horiz, sigma_vert = math.sqrt(variance_x), math.sqrt(variance_y)
+    root_two_pi = math.sqrt(2.0 * math.pi)
+    horiz = Gaussian(total / (root_two_pi * sigma_horiz), center_x + origin[0], sigma_horiz, 0.0, NO_ERROR)
+    vert = Gaussian(total / (root_two_pi * sigma_vert), center_y + origin[1], sigma_vert, 0.0, NO_ERROR)
+    return BeamFit(horiz, vert, covariance, total)
+
+def clipped_moments_fit(frame: Frame, level: float, dst: Frame | None = None) -> BeamFit:
+    """
+    Moments of a frame after subtracting level from every pixel, negative results counting as 0. Clipping at a few
+    noise sigma above the background makes the moments robust against background and noise over a large frame, at
+    the cost of slightly too small widths. Good to find the beam, e.g. to seed an aperture or a fit.
+
+    :param level: Level subtracted from every pixel, e.g. the baseline plus a few noise sigma (see background(...)).
+    :param dst: Optional buffer of the shape and type of the frame for the clipped frame.
+    :raises ValueError: Nothing of the frame is above the level.
+    """
+    clipped = cv2.subtract(frame, level, dst=dst)
+    return moments_fit(clipped, (0, 0))
+
+def background(frame: Frame) -> tuple[float, float]:
+    """
+    Background level and noise (standard deviation) of a frame, estimated from its outermost rows and columns, where
+    the beam is assumed to have decayed.
+    """
+    height, width = frame.shape[:2]
+    edges = (frame[0], frame[height - 1], frame[1:height - 1, 0], frame[1:height - 1, width - 1])
+    if sum(edge.size for edge in edges) == 0:
+        return 0.0, 0.0
+    values = numpy.concatenate([edge.ravel() for edge in edges]).astype(numpy.float64)
+    return float(numpy.mean(values)), float(numpy.std(values))
+
+class GaussFitAnalyzer:
+    """
+    Fits a Gaussian with offset to each projection of the frame (Levenberg-Marquardt, see utils.gauss_fit).
+    The fits of the previous frame are the warm start of the next one.
+    """
+    record_type = DataRecord
+
+    def __init__(self):
+        """
+        **DO NOT USE!** Constructor for GaussFitAnalyzer class is only for internal usage.
+        Use GaussFitAnalyzer.create() instead!
+        """
+        self._horiz: Gaussian | None = None
+        self._vert: Gaussian | None = None
+
+    @classmethod
+    def create(cls) -> GaussFitAnalyzer:
+        return cls()
+
+    def analyze(self, frame: Frame, origin: tuple[int, int] = (0, 0)) -> BeamFit:
+        """
+        :param frame: Processed mono frame.
+        :type frame: Frame
+        :param origin: Position (x, y) of the frame within the analysed frame, e.g. the corner of a region of interest.
+            The result is given in pixels of the analysed frame.
+        :type origin: tuple[int, int]
+        :raises ValueError: A projection is empty or flat, or a fit does not describe a beam inside the frame.
+        :rtype: BeamFit
+        """
+        x0, y0 = origin
+        height, width = frame.shape[:2]
+        horiz_warm = self._horiz.rescaled(1.0, -x0) if self._horiz is not None else None
+        vert_warm = self._vert.rescaled(1.0, -y0) if self._vert is not None else None
+        horiz_proj, vert_proj = utils.project(frame)
+        try:
+            horiz = utils.gauss_fit(horiz_proj, warm_start=horiz_warm)
+            vert = utils.gauss_fit(vert_proj, warm_start=vert_warm)
+            if not (self._plausible(horiz, width) and self._plausible(vert, height)):
+                raise ValueError("Gaussian fit does not describe a beam inside the frame")
+        except ValueError:
+            self.reset()
+            raise
+        self._horiz = horiz.rescaled(1.0, x0)
+        self._vert = vert.rescaled(1.0, y0)
+        return BeamFit(self._horiz, self._vert)
+
+    def record(self, fit: BeamFit, frame_data: FrameData) -> DataRecord:
+        return DataRecord.create(fit.horiz, fit.vert, frame_data)
+
+    def reset(self) -> None:
+        """
+        Drops the warm start.
+        """
+        self._horiz = None
+        self._vert = None
+
+    @staticmethod
+    def _plausible(gaussian: Gaussian, length: int) -> bool:
+        """
+        Whether a fit is finite, centered within the projection and not wider than it, so that it is safe as the warm
+        start of the next frame and as the beam the region of interest follows. Only for internal usage.
+        """
+        values = (gaussian.amplitude, gaussian.center, gaussian.sigma, gaussian.offset)
+        return all(math.isfinite(value) for value in values) and 0 <= gaussian.center < length and 0 < gaussian.sigma <= length
+
+class MomentAnalyzer:
+    """
+    Centroid and second moment widths (ISO 11146 D4σ) of the frame. Background and noise far from the beam inflate
+    second moments, so the moments are evaluated over an aperture of a few beam diameters around the centroid with
+    the baseline (the mean of the pixels outside the aperture) subtracted, iterated until the aperture settles. The
+    first aperture comes from the moments of the frame clipped at the background level of the outermost rows and
+    columns plus CLIP_NOISE noise sigma (see clipped_moments_fit(...)), which find the beam without depending on an
+    exact baseline. The aperture of the previous frame is the warm start of
+    the next one, so a steady beam takes a single pass over its aperture instead of one over the whole frame.
+    """
+    record_type = MomentRecord
+
+    def __init__(self, aperture: float, iterations: int):
+        """
+        **DO NOT USE!** Constructor for MomentAnalyzer class is only for internal usage.
+        Use MomentAnalyzer.create(...) instead!
+        """
+        self._aperture = aperture
+        self._iterations = iterations
+        self._last: BeamFit | None = None
+        self._buffer: Frame | None = None
+
+    @classmethod
+    def create(cls, aperture: float = 3.0, iterations: int = 5) -> MomentAnalyzer:
+        """
+        Creates a MomentAnalyzer.
+
+        :param aperture: Width and height of the integration aperture in D4σ beam diameters (ISO 11146 uses 3).
+        :type aperture: float
+        :param iterations: Maximum number of aperture refinements, 0 to integrate over the whole frame (only for frames thresholded
+            to their beam, see moments_fit(...)).
+        :type iterations: int
+        :return: MomentAnalyzer object.
+        :rtype: MomentAnalyzer
+        """
+        return cls(aperture, iterations)
+
+    def analyze(self, frame: Frame, origin: tuple[int, int] = (0, 0)) -> BeamFit:
+        """
+        See GaussFitAnalyzer.analyze(...).
+
+        :raises ValueError: The frame is dark.
+        """
+        height, width = frame.shape[:2]
+        offset, noise = background(frame)
+        frame_sum = float(cv2.sumElems(frame)[0])
+        warm = self._last is not None and self._iterations > 0
+        try:
+            if self._iterations == 0:
+                window = (0, 0, width, height)
+            elif warm:
+                window = self._window(self._last.shifted(-origin[0], -origin[1]), width, height)
+            else:
+                if self._buffer is None or self._buffer.shape != frame.shape or self._buffer.dtype != frame.dtype:
+                    self._buffer = numpy.empty(frame.shape, frame.dtype)
+                window = self._window(clipped_moments_fit(frame, offset + CLIP_NOISE * noise, self._buffer), width, height)
+
+            fit = self._moments(frame, window, frame_sum, offset)
+            for _ in range(self._iterations):
+                aperture = self._window(fit, width, height)
+                if aperture == window:
+                    break
+                window = aperture
+                fit = self._moments(frame, window, frame_sum, offset)
+        except ValueError:
+            if not warm:
+                self.reset()
+                raise
+            self._last = None
+            return self.analyze(frame, origin)
+
+        self._last = fit.shifted(*origin)
+        return self._last
+
+    def record(self, fit: BeamFit, frame_data: FrameData) -> MomentRecord:
+        return MomentRecord.create(fit, frame_data)
+
+    def reset(self) -> None:
+        """
+        Drops the warm start.
+        """
+        self._last = None
+
+    def _moments(self, frame: Frame, window: tuple[int, int, int, int], frame_sum: float, offset: float) -> BeamFit:
+        """
+        Moments over a window with the baseline subtracted. The baseline is the mean of all pixels outside the window,
+        far more of them than the edges, unless the window leaves fewer pixels than the edges (given as offset).
+        Only for internal usage.
+        """
+        height, width = frame.shape[:2]
+        x0, y0, x1, y1 = window
+        aperture = frame[y0:y1, x0:x1]
+        outside = width * height - aperture.size
+        if outside >= 2 * (width + height):
+            offset = (frame_sum - float(cv2.sumElems(aperture)[0])) / outside
+        return moments_fit(aperture, (x0, y0), offset)
+
+    def _window(self, fit: BeamFit, width: int, height: int) -> tuple[int, int, int, int]:
+        """
+        Integration aperture (x0, y0, x1, y1) around a fit, clipped to the frame. The whole frame if nothing is left.
+        Only for internal usage.
+        """
+        half_width = self._aperture * 2.0 * fit.horiz.sigma
+        half_height = self._aperture * 2.0 * fit.vert.sigma
+        x0 = max(int(fit.horiz.center - half_width), 0)
+        y0 = max(int(fit.vert.center - half_height), 0)
+        x1 = min(int(math.ceil(fit.horiz.center + half_width)) + 1, width)
+        y1 = min(int(math.ceil(fit.vert.center + half_height)) + 1, height)
+        if x1 <= x0 or y1 <= y0:
+            return (0, 0, width, height)
+        return (x0, y0, x1, y1)
+
+class CentroidAnalyzer:
+    """
+    Intensity weighted centroid of the pixels above a fraction of the peak intensity. Cutting at a fraction of the peak
+    removes background and noise without a background frame; the widths are the second moments of the remaining pixels.
+    """
+    record_type = CentroidRecord
+
+    def __init__(self, level: float):
+        """
+        **DO NOT USE!** Constructor for CentroidAnalyzer class is only for internal usage.
+        Use CentroidAnalyzer.create(...) instead!
+        """
+        self._level = level
+        self._buffer: Frame | None = None
+
+    @classmethod
+    def create(cls, level: float = 0.2) -> CentroidAnalyzer:
+        """
+        Creates a CentroidAnalyzer.
+
+        :param level: Fraction of the peak intensity subtracted from every pixel before weighting (negative results count as 0).
+        :type level: float
+        :return: CentroidAnalyzer object.
+        :rtype: CentroidAnalyzer
+        """
+        return cls(level)
+
+    def analyze(self, frame: Frame, origin: tuple[int, int] = (0, 0)) -> BeamFit:
+        """
+        See GaussFitAnalyzer.analyze(...).
+
+        :raises ValueError: The frame is dark.
+        """
+        if self._buffer is None or self._buffer.shape != frame.shape:
+            self._buffer = numpy.empty(frame.shape, frame.dtype)
+        peak = float(cv2.minMaxLoc(frame)[1])
+        cv2.subtract(frame, self._level * peak, dst=self._buffer)
+        return moments_fit(self._buffer, origin)
+
+    def record(self, fit: BeamFit, frame_data: FrameData) -> CentroidRecord:
+        return CentroidRecord.create(fit, frame_data)
+
+    def reset(self) -> None:
+        pass
+
+class EllipseFitAnalyzer:
+    """
+    Fits a rotated elliptical Gaussian with offset to the frame, which keeps the rotation and ellipticity the projections
+    lose. A full resolution 2D fit is far too slow for live frames, so the fit runs coarse to fine: the frame is reduced
+    on an image pyramid (cv2.pyrDown) to a few thousand pixels, fitted there starting from its clipped moments, and the result
+    refined on the full resolution pixels of a window a few sigma around the beam. Large windows are sampled with a
+    stride, which bounds the cost of the refinement independent of the beam size. The fit of the previous frame is the
+    warm start of the next one and skips the coarse level.
+    """
+    record_type = EllipseRecord
+
+    def __init__(self, coarse_size: int, window: float, max_pixels: int):
+        """
+        **DO NOT USE!** Constructor for EllipseFitAnalyzer class is only for internal usage.
+        Use EllipseFitAnalyzer.create(...) instead!
+        """
+        self._coarse_size = coarse_size
+        self._window = window
+        self._max_pixels = max_pixels
+        self._last: Ellipse | None = None
+
+    @classmethod
+    def create(cls, coarse_size: int = 128, window: float = 3.0, max_pixels: int = 8192) -> EllipseFitAnalyzer:
+        """
+        Creates an EllipseFitAnalyzer.
+
+        :param coarse_size: Maximum width and height of the coarse pyramid level in pixels.
+        :type coarse_size: int
+        :param window: Half width and height of the refinement window in sigmas of the beam along the axis.
+        :type window: float
+        :param max_pixels: Maximum number of pixels the refinement fits; larger windows are sampled with a stride.
+        :type max_pixels: int
+        :return: EllipseFitAnalyzer object.
+        :rtype: EllipseFitAnalyzer
+        """
+        return cls(coarse_size, window, max_pixels)
+
+    def analyze(self, frame: Frame, origin: tuple[int, int] = (0, 0)) -> BeamFit:
+        """
+        See GaussFitAnalyzer.analyze(...).
+
+        :raises ValueError: The frame is flat or the fit does not describe a beam inside the frame.
+        """
+        height, width = frame.shape[:2]
+        ellipse = None
+        if self._last is not None:
+            start = self._last.shifted(-origin[0], -origin[1])
+            if 0 <= start.center_x < width and 0 <= start.center_y < height:
+                ellipse = self._refine(frame, start)
+        if ellipse is None:
+            ellipse = self._refine(frame, self._coarse(frame))
+        if ellipse is None:
+            self.reset()
+            raise ValueError("Elliptical Gaussian fit did not converge")
+
+        self._last = ellipse.shifted(*origin)
+        return BeamFit.from_ellipse(self._last)
+
+    def record(self, fit: BeamFit, frame_data: FrameData) -> EllipseRecord:
+        return EllipseRecord.create(fit, frame_data)
+
+    def reset(self) -> None:
+        """
+        Drops the warm start.
+        """
+        self._last = None
+
+    def _coarse(self, frame: Frame) -> Ellipse:
+        """
+        Fits the coarsest pyramid level, starting from its moments clipped above the background (see clipped_moments_fit(...)),
+        and converts the result to full resolution.
+        Every pyrDown blurs by a variance of 1 pixel² before it halves the frame, which is removed from the widths.
+        Only for internal usage.
+
+        :raises ValueError: The frame is flat.
+        """
+        level = frame
+        levels = 0
+        while max(level.shape[:2]) > self._coarse_size:
+            level = cv2.pyrDown(level)
+            levels += 1
+
+        offset, noise = background(level)
+        moments = clipped_moments_fit(level, offset + CLIP_NOISE * noise)
+        variance_x, variance_y = moments.horiz.sigma**2, moments.vert.sigma**2
+        spread = math.hypot(0.5 * (variance_x - variance_y), moments.covariance)
+        mean = 0.5 * (variance_x + variance_y)
+        angle = 0.5 * math.atan2(2.0 * moments.covariance, variance_x - variance_y)
+        peak = float(cv2.minMaxLoc(level)[1]) - offset
+        start = numpy.array([peak, moments.horiz.center, moments.vert.center, math.sqrt(mean + spread), math.sqrt(max(mean - spread, 0.25)), angle, offset])
+
+        height, width = level.shape[:2]
+        x = numpy.tile(numpy.arange(width, dtype=numpy.float64), height)
+        y = numpy.repeat(numpy.arange(height, dtype=numpy.float64), width)
+        params, _ = ellipse_fit(x, y, level.ravel(), start)
+        if params is None:
+            params = start
+
+        scale = 2.0**levels
+        blur = (scale**2 - 1.0) / 3.0
+        params = params.copy()
+        params[1:3] *= scale
+        params[3:5] = numpy.sqrt(numpy.maximum((params[3:5] * scale)**2 - blur, 0.25))
+        return Ellipse.from_params(params, numpy.zeros(7))
+
+    def _refine(self, frame: Frame, start: Ellipse) -> Ellipse | None:
+        """
+        Fits the full resolution pixels of a window around the start, sampled with a stride if the window holds more
+        than max_pixels pixels. Returns None if the fit fails or leaves the frame. Only for internal usage.
+        """
+        height, width = frame.shape[:2]
+        variance_x, variance_y, _ = start.variances
+        half_width = self._window * math.sqrt(variance_x)
+        half_height = self._window * math.sqrt(variance_y)
+        x0 = max(int(start.center_x - half_width), 0)
+        y0 = max(int(start.center_y - half_height), 0)
+        x1 = min(int(math.ceil(start.center_x + half_width)) + 1, width)
+        y1 = min(int(math.ceil(start.center_y + half_height)) + 1, height)
+        if x1 - x0 < 3 or y1 - y0 < 3:
+            return None
+
+        stride = max(int(math.ceil(math.sqrt((x1 - x0) * (y1 - y0) / self._max_pixels))), 1)
+        window = frame[y0:y1:stride, x0:x1:stride]
+        rows, columns = window.shape[:2]
+        x = numpy.tile(numpy.arange(x0, x1, stride, dtype=numpy.float64), rows)
+        y = numpy.repeat(numpy.arange(y0, y1, stride, dtype=numpy.float64), columns)
+        params, perr = ellipse_fit(x, y, window.ravel(), start.params)
+        if params is None or not (0 <= params[1] < width and 0 <= params[2] < height):
+            return None
+        return Ellipse.from_params(params, perr)
+
+def ellipse_fit(x: numpy.ndarray, y: numpy.ndarray, values: numpy.ndarray, start: numpy.ndarray) -> tuple[numpy.ndarray | None, numpy.ndarray]:
+    """
+    Fits a rotated elliptical Gaussian with offset to pixel values by Levenberg-Marquardt iterations with the analytic
+    Jacobian, like utils.gauss_fit in one dimension.
+
+    :param x: Horizontal coordinate of every pixel.
+    :param y: Vertical coordinate of every pixel.
+    :param values: Pixel values.
+    :param start: Starting parameters (amplitude, center_x, center_y, sigma_major, sigma_minor, angle, offset).
+    :return: Fitted parameters, or None if the fit diverged, and their standard errors.
+    """
+    z = numpy.asarray(values, dtype=numpy.float64)
+    scale = float(numpy.max(numpy.abs(z))) if len(z) else 0.0
+    if len(z) <= 7 or scale == 0:
+        return None, numpy.full(7, numpy.inf)
+    z = z / scale
+    unit = numpy.array([scale, 1.0, 1.0, 1.0, 1.0, 1.0, scale])
+
+    params = _ellipse_levenberg_marquardt(x, y, z, start / unit)
+    if params is None:
+        return None, numpy.full(7, numpy.inf)
+    return params * unit, _ellipse_perr(x, y, z, params) * unit
+
+def _ellipse_jacobian(x: numpy.ndarray, y: numpy.ndarray, params: numpy.ndarray) -> tuple[numpy.ndarray, numpy.ndarray]:
+    """
+    Model values and Jacobian (7 x n, one row per parameter) of the elliptical Gaussian with offset. Only for internal usage.
+    """
+    amplitude, center_x, center_y, sigma_major, sigma_minor, angle, offset = params
+    cos, sin = math.cos(angle), math.sin(angle)
+    dx = x - center_x
+    dy = y - center_y
+    u = (dx * cos + dy * sin) / sigma_major
+    v = (dy * cos - dx * sin) / sigma_minor
+    e = numpy.exp(-0.5 * (u * u + v * v))
+    ae = amplitude * e
+    au = ae * u / sigma_major
+    av = ae * v / sigma_minor
+    jacobian = numpy.empty((7, len(x)))
+    jacobian[0] = e
+    jacobian[1] = au * cos - av * sin
+    jacobian[2] = au * sin + av * cos
+    jacobian[3] = au * u
+    jacobian[4] = av * v
+    jacobian[5] = ae * u * v * (sigma_major / sigma_minor - sigma_minor / sigma_major)
+    jacobian[6] = 1.0
+    return ae + offset, jacobian
+
+def _ellipse_levenberg_marquardt(x: numpy.ndarray, y: numpy.ndarray, z: numpy.ndarray, params: numpy.ndarray) -> numpy.ndarray | None:
+    """
+    Levenberg-Marquardt iterations with Marquardt's diagonal scaling, see utils._gauss_levenberg_marquardt.
+    Returns the last parameters if the fit does not converge within ELLIPSE_FIT_MAX_ITER iterations, None if they are
+    not finite. Only for internal usage.
+    """
+    damping = 1e-3
+    model, jacobian = _ellipse_jacobian(x, y, params)
+    residual = z - model
+    ssr = numpy.dot(residual, residual)
+
+    for _ in range(ELLIPSE_FIT_MAX_ITER):
+        jtj = jacobian @ jacobian.T
+        jtr = jacobian @ residual
+        diagonal = numpy.diag(jtj).copy()
+        diagonal[diagonal == 0] = 1.0
+
+        while True:
+            try:
+                step = numpy.linalg.solve(jtj + damping * numpy.diag(diagonal), jtr)
+            except numpy.linalg.LinAlgError:
+                return None
+            candidate = params + step
+            if candidate[3] == 0 or candidate[4] == 0:
+                candidate[3:5] = params[3:5]
+            candidate_residual = z - _ellipse_jacobian(x, y, candidate)[0]
+            candidate_ssr = numpy.dot(candidate_residual, candidate_residual)
+            if candidate_ssr <= ssr:
+                break
+            damping *= 10
+            if damping > 1e10:
+                return params if numpy.all(numpy.isfinite(params)) else None
+
+        converged = ssr - candidate_ssr <= utils.GAUSS_FIT_TOLERANCE * ssr
+        params, ssr = candidate, candidate_ssr
+        damping = max(damping / 10, 1e-10)
+        if converged:
+            break
+        model, jacobian = _ellipse_jacobian(x, y, params)
+        residual = z - model
+    return params if numpy.all(numpy.isfinite(params)) else None
+
+def _ellipse_perr(x: numpy.ndarray, y: numpy.ndarray, z: numpy.ndarray, params: numpy.ndarray) -> numpy.ndarray:
+    """
+    Standard errors from the covariance estimate inv(J^T J) * SSR / (n - 7). Only for internal usage.
+    """
+    model, jacobian = _ellipse_jacobian(x, y, params)
+    residual = z - model
+    try:
+        cov_matrix = numpy.linalg.inv(jacobian @ jacobian.T) * numpy.dot(residual, residual) / (len(x) - 7)
+    except numpy.linalg.LinAlgError:
+        return numpy.full(7, numpy.inf)
+    return numpy.sqrt(numpy.abs(numpy.diag(cov_matrix)))
+
+Analyzer: TypeAlias = GaussFitAnalyzer | MomentAnalyzer | CentroidAnalyzer | EllipseFitAnalyzer
+Record: TypeAlias = DataRecord | MomentRecord | CentroidRecord | EllipseRecord
+"""
+Every record type has the fields center_horiz, center_vert, sigma_horiz and sigma_vert.
+"""
+
+def create_analyzer(kind: AnalyzerKind) -> Analyzer:
+    """
+    Creates the analyzer of the given kind with its default settings. Analyzers hold per camera state, use one per camera.
+    """
+    match kind:
+        case AnalyzerKind.GAUSS:
+            return GaussFitAnalyzer.create()
+        case AnalyzerKind.MOMENT:
+            return MomentAnalyzer.create()
+        case AnalyzerKind.CENTROID:
+            return CentroidAnalyzer.create()
+        case AnalyzerKind.ELLIPSE:
+            return EllipseFitAnalyzer.create()
+    raise ValueError(f"Unknown analyzer: {kind}")
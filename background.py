@@ -0,0 +1,194 @@
+from __future__ import annotations
+
+from utils import Frame
+
+import threading
+import numpy
+import cv2
+import os
+
+class Background:
+    """
+    Running average of beam-off frames, held in memory as a mono uint8 frame at processing resolution.
+    Filters reference the Background object itself, so every update is seen by them without rebuilding the pipeline.
+
+    There is one Background per name and process, see get_background(...). Pickling a Background (e.g. sending
+    a pipeline to a dispatched camera) only transfers its name; it resolves to the instance of the receiving process.
+    """
+    def __init__(self, name: str, path: str):
+        """
+        **DO NOT USE!** Constructor for Background class is only for internal usage.
+        Use get_background(...) instead!
+        """
+        self._name = name
+        self._path = path
+        self._frame: Frame | None = None
+        self._average: numpy.ndarray | None = None
+        self._count = 0
+        self._resampled: dict[tuple[int, ...], Frame] = {}
+        self._lock = threading.Lock()
+        self._pending: Frame | None = None
+        self._saved = threading.Condition()
+        self._writer: threading.Thread | None = None
+
+    def __reduce__(self):
+        return (get_background, (self._name,))
+
+    @property
+    def name(self) -> str:
+        return self._name
+
+    @property
+    def frame(self) -> Frame | None:
+        """
+        Averaged background, None until it is loaded or learned.
+        """
+        return self._frame
+
+    def load(self) -> bool:
+        """
+        Loads the background from disk (any PNG, color images are converted to mono).
+
+        :return: False if there is no background file.
+        :rtype: bool
+        """
+        frame = cv2.imread(self._path, cv2.IMREAD_GRAYSCALE) if os.path.exists(self._path) else None
+        if frame is None:
+            return False
+        with self._lock:
+            self._frame = frame
+            self._average = frame.astype(numpy.float32)
+            self._count = 0
+            self._resampled = {}
+        return True
+
+    def reset(self) -> None:
+        """
+        Starts a new average. The current background stays in use until the first update.
+        """
+        self._count = 0
+
+    def update(self, frame: Frame, alpha: float = 0.05) -> None:
+        """
+        Adds a beam-off mono frame to the running average. The first 1 / alpha frames after a reset are averaged equally,
+        later ones decay exponentially with the given weight. The background frame is updated in place.
+
+        :param frame: Mono frame at processing resolution, taken without beam.
+        :type frame: Frame
+        :param alpha: Weight of the new frame once the average is established.
+        :type alpha: float
+        """
+        with self._lock:
+            if self._average is None or self._average.shape != frame.shape or self._count == 0:
+                self._average = frame.astype(numpy.float32)
+                if self._frame is None or self._frame.shape != frame.shape:
+                    self._frame = numpy.empty_like(frame)
+            else:
+                cv2.accumulateWeighted(frame, self._average, max(alpha, 1.0 / (self._count + 1)))
+            self._count += 1
+            cv2.convertScaleAbs(self._average, dst=self._frame)
+            self._resampled = {}
+
+    def resolve(self, shape: tuple[int, ...]) -> Frame | None:
+        """
+        Background for frames of the given shape. A background of twice or half the size (full against half
+        resolution processing) is resampled once per update.
+
+        :raises ValueError: The background does not fit frames of this shape.
+        :return: Background frame, None if there is no background yet.
+        :rtype: Frame | None
+        """
+        frame = self._frame
+        if frame is None or frame.shape == shape:
+            return frame
+        resampled = self._resampled.get(shape)
+        if resampled is not None:
+            return resampled
+
+        height, width = frame.shape
+        if shape not in ((height // 2, width // 2), (height * 2, width * 2)):
+            raise ValueError(f"Background {self._name} of shape {frame.shape} does not fit frames of shape {shape}")
+        resampled = cv2.resize(frame, (shape[1], shape[0]), interpolation=cv2.INTER_AREA if shape[0] < height else cv2.INTER_LINEAR)
+        self._resampled[shape] = resampled
+        return resampled
+
+    def save(self) -> None:
+        """
+        Writes a snapshot of the background to disk on a writer thread, so the caller never waits for the encoding.
+        Only the latest snapshot is written if saves arrive faster than the disk.
+        """
+        if self._frame is None:
+            return
+        with self._lock:
+            snapshot = self._frame.copy()
+        with self._saved:
+            self._pending = snapshot
+            if self._writer is None:
+                self._writer = threading.Thread(target=self._write, name=f"background-{self._name}", daemon=True)
+                self._writer.start()
+
+    def flush(self, timeout: float | None = None) -> bool:
+        """
+        Waits until the pending snapshot is written.
+
+        :return: False if the timeout passed first.
+        :rtype: bool
+        """
+        with self._saved:
+            return self._saved.wait_for(lambda: self._pending is None, timeout)
+
+    def _write(self) -> None:
+        """
+        Writer thread. Writes to a temporary file first, so an interrupted write never leaves a broken background.
+        Only for internal usage.
+        """
+        while True:
+            with self._saved:
+                frame = self._pending
+                if frame is None:
+                    self._writer = None
+                    self._saved.notify_all()
+                    return
+            root, extension = os.path.splitext(self._path)
+            temp_path = f"{root}.tmp{extension}"
+            if cv2.imwrite(temp_path, frame):
+                os.replace(temp_path, self._path)
+            else:
+                print(f"Cannot save background {self._name}")
+            with self._saved:
+                if self._pending is frame:
+                    self._pending = None
+
+_backgrounds: dict[str, Background] = {}
+_backgrounds_lock = threading.Lock()
+
+def background_path(name: str) -> str:
+    """
+    Path of the saved background of a camera. Kept apart from the subimage saved by utils.save_subimage(...),
+    which holds a frame with the beam.
+    """
+    return f"./config/{name}-background.png"
+
+def get_background(name: str) -> Background:
+    """
+    Background of a camera in this process. Created on first use and loaded from ./config/<name>-background.png if present.
+
+    :param name: Camera name.
+    :type name: str
+    :return: The Background object shared by every user in this process.
+    :rtype: Background
+    """
+    with _backgrounds_lock:
+        background = _backgrounds.get(name)
+        if background is None:
+            background = Background(name, background_path(name))
+            background.load()
+            _backgrounds[name] = background
+        return background
+
+def flush_backgrounds(timeout: float | None = None) -> None:
+    """
+    Waits until every background of this process is written to disk.
+    """
+    for background in list(_backgrounds.values()):
+        background.flush(timeout)
@@ -1,22 +1,12 @@
 from __future__ import annotations
-from dataclasses import dataclass
+from dataclasses import replace
 from typing import Any
 
-from utils import FrameData, Frame, except_continue, except_raise
+from utils import FrameData, Frame, CameraConfig, except_continue, except_raise
+from pool import FramePool
 
 import PySpin
-
-@dataclass
-class CameraConfig:
-    width: int | None = None
-    height: int | None = None
-    offset_x: int | None = None
-    offset_y: int | None = None
-    frame_rate: int | None = None
-    adc_bit_depth: Any | None = None
-    exposure_time: int | None = None
-    gain: float | None = None
-    gamma: float | None = None
+import numpy
 
 class StreamMode:
     """
@@ -36,7 +26,49 @@ class StreamMode:
     Stream mode configuration for Unix-like machines including Darwin (macos) utilizing Unix domain sockets.
     """
 
+class BufferMode:
+    """
+    Configuration class for the handling of the stream buffers on the host.
+    """
+    PREVIEW = 0
+    """
+    NewestOnly handling with a few buffers. Always delivers the most recent image; older images are discarded silently.
+    """
+    LOSSLESS = 1
+    """
+    OldestFirst handling with as many buffers as the memory budget allows. Images are delivered in order and only lost
+    once every buffer is full, which shows up as a frame id gap.
+    """
+
+class IncompleteFrame(ValueError):
+    """
+    Raised by acquire(...) for an image the camera delivered incomplete.
+    """
+    def __init__(self, frame_id: int | None):
+        super().__init__("Image is incomplete.")
+        self.frame_id = frame_id
+        """
+        Frame id of the incomplete image, None if the camera did not deliver it.
+        """
+
 class Camera:
+    PREVIEW_BUFFER_COUNT = 3
+    """
+    Number of stream buffers in BufferMode.PREVIEW.
+    """
+    LOSSLESS_MIN_BUFFER_COUNT = 16
+    """
+    Minimum number of stream buffers in BufferMode.LOSSLESS, regardless of the memory budget.
+    """
+    POOL_CAPACITY = 80
+    """
+    Maximum number of pooled frame buffers. Covers the frames queued between the pipeline stages plus the ones in work.
+    """
+    POOL_PREALLOCATE = 8
+    """
+    Number of frame buffers allocated when the camera is set up.
+    """
+
     def __init__(self, name: str, cam: PySpin.CameraPtr):
         """
         **DO NOT USE!** Constructor for Camera class is only for internal usage. 
@@ -44,7 +76,19 @@ class Camera:
         """
         self._name = name
         self._cam = cam
+        self._nodes = {
+            "width": cam.Width,
+            "height": cam.Height,
+            "offset_x": cam.OffsetX,
+            "offset_y": cam.OffsetY,
+            "frame_rate": cam.AcquisitionFrameRate,
+            "adc_bit_depth": cam.AdcBitDepth,
+            "exposure_time": cam.ExposureTime,
+            "gain": cam.Gain,
+            "gamma": cam.Gamma,
+        }
         self._config: CameraConfig
+        self._pool: FramePool | None = None
     
     @classmethod
     def init(cls, name: str, cam: PySpin.CameraPtr, stream_mode: StreamMode) -> Camera:
@@ -77,10 +121,8 @@ class Camera:
         :param config: Config object (still unspecified).
         :raises PySpin.SpinnakerException: May fail to setup camera correctly.
         """
+        self.set_buffering(BufferMode.PREVIEW)
         with except_raise("Error during camera setup"):
-            self._cam.TLStream.StreamBufferHandlingMode.SetValue(PySpin.StreamBufferHandlingMode_NewestOnly)
-            self._cam.TLStream.StreamBufferCountMode.SetValue(PySpin.StreamBufferCountMode_Manual)
-            self._cam.TLStream.StreamBufferCountManual.SetValue(3)
             self._cam.GevSCPSPacketSize.SetValue(9000)
             self._cam.AcquisitionMode.SetValue(PySpin.AcquisitionMode_Continuous)
 
@@ -104,17 +146,22 @@ class Camera:
         self.update_config()
         
     def update_config(self) -> None:
-        self._config = CameraConfig(
-            width = self._cam.Width.GetValue(),
-            height = self._cam.Height.GetValue(),
-            offset_x = self._cam.OffsetX.GetValue(),
-            offset_y = self._cam.OffsetY.GetValue(),
-            frame_rate = self._cam.AcquisitionFrameRate.GetValue(),
-            adc_bit_depth = self._cam.AdcBitDepth.GetValue(),
-            exposure_time = self._cam.ExposureTime.GetValue(),
-            gain = self._cam.Gain.GetValue(),
-            gamma = self._cam.Gamma.GetValue()
-        )
+        """
+        Reads the whole config from the device. Only needed if the device was configured outside of this object,
+        the config setter keeps the config up to date by itself.
+        """
+        self._config = CameraConfig(**{name: node.GetValue() for name, node in self._nodes.items()})
+        self._update_pool()
+
+    def _update_pool(self) -> None:
+        """
+        Creates the frame pool or resizes it to the configured image size. Only for internal usage.
+        """
+        shape = (self._config.height, self._config.width)
+        if self._pool is None:
+            self._pool = FramePool.create(shape, self.POOL_CAPACITY, self.POOL_PREALLOCATE)
+        else:
+            self._pool.resize(shape + self._pool.shape[2:])
 
     @property
     def name(self) -> str:
@@ -122,85 +169,170 @@ class Camera:
 
     @property
     def config(self) -> CameraConfig:
-        return self._config
+        return replace(self._config)
 
     @config.setter
     def config(self, config: CameraConfig) -> None:
-        if not self._cam.IsStreaming():
-            if config.height is not None:
-                with except_continue():
-                    self._cam.Width.SetValue(config.width)
-            
-            if config.width is not None:
-                with except_continue():
-                    self._cam.Height.SetValue(config.height)
-            
-            if config.adc_bit_depth is not None:
-                with except_continue():
-                    self._cam.AdcBitDepth.SetValue(config.adc_bit_depth)
+        """
+        Writes the fields of config that differ from the current config, in dependency order: size before offset,
+        bit depth and exposure time before frame rate. None fields are left unchanged, as are the size and bit depth
+        while streaming. Fields the device rejects keep their current value. Written fields hold the value the device
+        accepted, and the frame rate is read back after an exposure change, as the exposure time limits it.
+        """
+        streaming = self._cam.IsStreaming()
+        current = self.config
+        offset_x = config.offset_x if config.offset_x is not None else current.offset_x
+        offset_y = config.offset_y if config.offset_y is not None else current.offset_y
+        resize = not streaming and any(
+            getattr(config, name) is not None and getattr(config, name) != getattr(current, name) for name in ("width", "height")
+        )
 
-        if config.offset_x is not None:
-            with except_continue():
-                self._cam.OffsetX.SetValue(config.offset_x)
+        if resize:
+            self._write("offset_x", 0)
+            self._write("offset_y", 0)
+            self._write("width", config.width)
+            self._write("height", config.height)
 
-        if config.offset_y is not None:
-            with except_continue():
-                self._cam.OffsetY.SetValue(config.offset_y)
+        self._write("offset_x", offset_x)
+        self._write("offset_y", offset_y)
+        for name in ("exposure_time", "gain", "gamma"):
+            self._write(name, getattr(config, name))
+        if self._config.exposure_time != current.exposure_time:
+            with except_continue("Cannot read frame_rate"):
+                self._config.frame_rate = self._nodes["frame_rate"].GetValue()
 
-        if config.exposure_time is not None:
-            with except_continue():
-                self._cam.ExposureTime.SetValue(config.exposure_time)
+        if not streaming:
+            self._write("adc_bit_depth", config.adc_bit_depth)
 
-        if config.gain is not None:
+        if config.frame_rate is not None and config.frame_rate != current.frame_rate:
             with except_continue():
-                self._cam.Gain.SetValue(config.gain)
+                self._write("frame_rate", min(config.frame_rate, self._nodes["frame_rate"].GetMax()))
 
-        if config.gamma is not None:
-            with except_continue():
-                self._cam.Gamma.SetValue(config.gamma)
-        
-        if config.frame_rate is not None:
-            frame_rate = self._cam.AcquisitionFrameRate.GetMax()
-            if config.frame_rate < frame_rate: 
-                frame_rate = config.frame_rate
-            with except_continue():
-                self._cam.AcquisitionFrameRate.SetValue(frame_rate)
+        if resize:
+            self._update_pool()
 
-        self.update_config()
-            
-    def begin(self) -> None:
+    def _write(self, name: str, value: Any) -> None:
+        """
+        Writes one config field to the device if it differs from the current config, and updates the current config
+        with the value read back, as the device may clamp or quantize it. Only for internal usage.
+        """
+        if value is None or value == getattr(self._config, name):
+            return
+        with except_continue(f"Cannot set {name}"):
+            node = self._nodes[name]
+            node.SetValue(value)
+            setattr(self._config, name, node.GetValue())
+
+    def set_buffering(self, mode: BufferMode, memory_budget: int = 0) -> int:
+        """
+        Configures the stream buffers on the host. Only possible while the image acquisition is not running.
+
+        :param mode: Buffer handling, see BufferMode.
+        :type mode: BufferMode
+        :param memory_budget: Bytes available for stream buffers in BufferMode.LOSSLESS.
+        :type memory_budget: int
+        :raises PySpin.SpinnakerException: May fail to configure the stream buffers.
+        :return: Number of stream buffers.
+        :rtype: int
+        """
+        with except_raise("Cannot configure stream buffers"):
+            stream = self._cam.TLStream
+            if mode == BufferMode.LOSSLESS:
+                count = max(memory_budget // max(self._cam.PayloadSize.GetValue(), 1), self.LOSSLESS_MIN_BUFFER_COUNT)
+                count = min(count, stream.StreamBufferCountManual.GetMax())
+                stream.StreamBufferHandlingMode.SetValue(PySpin.StreamBufferHandlingMode_OldestFirst)
+            else:
+                count = self.PREVIEW_BUFFER_COUNT
+                stream.StreamBufferHandlingMode.SetValue(PySpin.StreamBufferHandlingMode_NewestOnly)
+            stream.StreamBufferCountMode.SetValue(PySpin.StreamBufferCountMode_Manual)
+            stream.StreamBufferCountManual.SetValue(count)
+            return count
+
+    def set_trigger(self, source: str | None) -> None:
+        """
+        Lets an external signal start every exposure (FrameStart on the rising edge) or switches back to free running.
+
+        :param source: Trigger input line (e.g. "Line0"), or None for free running.
+        :type source: str | None
+        :raises PySpin.SpinnakerException: May fail to configure the trigger.
+        """
+        with except_raise("Cannot configure trigger"):
+            self._cam.TriggerMode.SetValue(PySpin.TriggerMode_Off)
+            if source is None:
+                return
+            self._cam.TriggerSelector.SetValue(PySpin.TriggerSelector_FrameStart)
+            self._cam.TriggerSource.SetValue(getattr(PySpin, f"TriggerSource_{source}"))
+            self._cam.TriggerActivation.SetValue(PySpin.TriggerActivation_RisingEdge)
+            self._cam.TriggerMode.SetValue(PySpin.TriggerMode_On)
+
+    def reset_timestamp(self) -> None:
+        """
+        Resets the timestamp clock of the camera to 0.
+
+        :raises PySpin.SpinnakerException: May fail to reset the clock.
+        """
+        with except_raise("Cannot reset timestamp"):
+            self._cam.TimestampReset.Execute()
+
+    def begin(self, reset_timestamp: bool = True) -> None:
         """
         Begins the image acquisition for the pysical camera device. Nessessary before acquiring any images.
         
+        :param reset_timestamp: Reset the timestamp clock first. Pass False if it was reset together with other cameras.
+        :type reset_timestamp: bool
         :raises PySpin.SpinnakerException: May fail to start the image acquisition.
         """
+        if reset_timestamp:
+            self.reset_timestamp()
         with except_raise("Cannot begin image acquisition"):
-            self._cam.TimestampReset.Execute()
             self._cam.BeginAcquisition()
 
-    def acquire(self) -> tuple[FrameData, Frame]:
+    def acquire(self, timeout: int | None = None) -> tuple[FrameData, Frame]:
         """
         Acquires an image from the pysical camera device and returns it as frame data (2D Array) in BayerBG format.
+        The frame is a pooled buffer; the image is copied into it and released to Spinnaker right away, so the few stream buffers
+        are never held by the pipeline. Hand the frame back with release(...) once it is processed.
         In the case of an Exception, try to handle it gracefully and continue acquiring, because a lost frame does not close the acquisition.
         
+        :param timeout: Maximum waiting time for the next image in milliseconds. Waits indefinitely if None.
+        :type timeout: int | None
         :raises PySpin.SpinnakerException: May fail to acquire an image.
-        :raises ValueError: Image data might be corrupted.
+        :raises IncompleteFrame: Image data is incomplete.
         """
         with except_raise("Acquisition error"):
-            image = self._cam.GetNextImage()
+            image = self._cam.GetNextImage() if timeout is None else self._cam.GetNextImage(timeout)
             if image.IsIncomplete():
-                raise ValueError("Image is incomplete.")
+                frame_id = None
+                with except_continue():
+                    frame_id = image.GetChunkData().GetFrameID()
+                image.Release()
+                raise IncompleteFrame(frame_id)
             
             chunk_data = image.GetChunkData()
             frame_id = chunk_data.GetFrameID()
             timestamp = chunk_data.GetTimestamp()
             exposure_time = chunk_data.GetExposureTime()
             capture_format = image.GetPixelFormatName()
-            frame = image.GetNDArray().copy()
+            image_data = image.GetNDArray()
+            if image_data.shape != self._pool.shape:
+                self._pool.resize(image_data.shape)
+            frame = self._pool.take()
+            numpy.copyto(frame, image_data)
 
             image.Release()
             return FrameData(frame_id, timestamp, exposure_time, capture_format), frame
 
+    def release(self, frame: Frame) -> None:
+        """
+        Hands an acquired frame back to the frame pool once it is not needed anymore. Frames passed on to several
+        consumers need one release per holder, see FramePool.retain(...).
+        """
+        self._pool.release(frame)
+
+    @property
+    def pool(self) -> FramePool:
+        return self._pool
+
     def end(self) -> None:
         """
         Stops camera from acquiring more images. Nessesary for cleanup.
@@ -1,138 +1,253 @@
 from __future__ import annotations
 from dataclasses import dataclass
 from contextlib import contextmanager
+from typing import Any, Callable
 
-from processor import Pipeline, FrameFilter
-from utils import DisplayMode
-from camera import CameraConfig, Camera
+from processor import FrameFilter
+from utils import DisplayMode, except_continue
+from camera import CameraConfig
 
 from multiprocessing import Queue
 import multiprocessing as mp
+import queue
+import time
 
 @dataclass
 class ExitMsg:
     success: bool
     message: str
 
+class CommandKind:
+    """
+    Enumeration over the commands a Channel carries to the dispatched camera.
+    """
+    FILTERS = 0
+    CAMERA_CONFIG = 1
+    DISPLAY_MODE = 2
+    REQUEST_CAMERA_CONFIG = 3
+    CALCULATE = 4
+    STOP_CALCULATION = 5
+    RECORD = 6
+    STOP_RECORDING = 7
+    SAVE_SUBIMAGE = 8
+    LEARN_BACKGROUND = 9
+    STOP_LEARNING_BACKGROUND = 10
+
 @dataclass
+class Command:
+    kind: int
+    seq: int
+    """
+    Position of the command among all commands sent over the Channel, starting at 1.
+    """
+    payload: Any = None
+
+class Control:
+    """
+    Slots of the shared control block of a Channel.
+    """
+    VERSION = 0
+    """
+    Number of commands sent so far. The receiver only reads the command queue while it applied fewer commands.
+    """
+    TERMINATE = 1
+    EXIT_FAILED = 2
+    EXIT_MSG_LENGTH = 3
+    SIZE = 4
+
+EXIT_MSG_SIZE = 1024
+COMMAND_TIMEOUT = 1.0
+"""
+Default time in seconds to wait for a reply, and the longest time the receiver waits for an announced command in transit.
+"""
+
 class Channel:
-    def __init__(
-            self, 
-            sig_term, 
-            sig_calc, 
-            sig_record,
-            sig_save_subimage,
-            display_mode_queue: Queue, 
-            processor_queue: Queue, 
-            cam_config_queue: Queue, 
-            sig_request_cam_config, 
-            cam_config_respond_queue: Queue):
-        self._sig_term = sig_term
-        self._sig_calc = sig_calc
-        self._sig_record = sig_record
-        self._sig_save_subimage = sig_save_subimage
-        self._display_mode_queue = display_mode_queue
-        self._processor_queue = processor_queue
-        self._cam_config_queue = cam_config_queue
-        self._sig_request_cam_config = sig_request_cam_config
-        self._cam_config_respond_queue = cam_config_respond_queue
-        self._exit_msg_lock = mp.Lock()
-        self._exit_msg = ExitMsg(True, "")
+    """
+    Control plane between the controlling process and a dispatched camera.
+
+    A shared control block holds a version counter, the termination flag and the exit message. Commands go through a
+    single queue in the order they are sent and every command increments the version, so the receiver polls with one
+    integer compare and only touches the queue when something changed. Requests are answered through a reply queue.
+    """
+    def __init__(self, control, exit_msg, lock, command_queue: Queue, reply_queue: Queue):
+        """
+        **DO NOT USE!** Constructor for Channel class is only for internal usage.
+        Use Channel.create() instead!
+        """
+        self._control = control
+        self._exit_msg = exit_msg
+        self._lock = lock
+        self._command_queue = command_queue
+        self._reply_queue = reply_queue
+        self._applied = 0
+        self._calculate = False
+        self._record = False
+        self._save_subimage = False
+        self._learn_background = False
 
     @classmethod
     def create(cls) -> Channel:
-        sig_term = mp.Event()
-        sig_calc = mp.Event()
-        sig_record = mp.Event()
-        sig_save_subimage = mp.Event()
-        display_mode_queue = Queue(maxsize=1)
-        processor_queue = Queue(maxsize=1)
-        cam_config_queue = Queue(maxsize=1)
-        sig_request_cam_config = mp.Event()
-        cam_config_respond_queue = Queue(maxsize=1)
-
-        return cls(
-            sig_term, 
-            sig_calc, 
-            sig_record, 
-            sig_save_subimage,
-            display_mode_queue, 
-            processor_queue, 
-            cam_config_queue, 
-            sig_request_cam_config, 
-            cam_config_respond_queue
-        )
-    
-    def recv_filters(self) -> Pipeline:
-        return self._processor_queue.get(block=False)
+        control = mp.RawArray("q", Control.SIZE)
+        exit_msg = mp.RawArray("c", EXIT_MSG_SIZE)
+        return cls(control, exit_msg, mp.Lock(), Queue(), Queue())
 
     def send_filters(self, *filters: FrameFilter) -> None:
-        self._processor_queue.put(filters)
-
-    def recv_display_mode(self) -> DisplayMode:
-        return self._display_mode_queue.get(block=False)
+        self._send(CommandKind.FILTERS, filters)
 
     def send_display_mode(self, display_mode: DisplayMode) -> None:
-        self._display_mode_queue.put(display_mode)
+        self._send(CommandKind.DISPLAY_MODE, display_mode)
+
+    def send_camera_config(self, camera_config: CameraConfig) -> None:
+        self._send(CommandKind.CAMERA_CONFIG, camera_config)
+
+    def request_camera_config(self, timeout: float | None = COMMAND_TIMEOUT) -> CameraConfig:
+        """
+        Asks the dispatched camera for its current config. Replies to earlier requests that timed out are discarded.
+
+        :param timeout: Maximum time to wait for the reply in seconds, None waits indefinitely.
+        :type timeout: float | None
+        :raises TimeoutError: The camera did not reply in time.
+        :return: Config of the dispatched camera.
+        :rtype: CameraConfig
+        """
+        seq = self._send(CommandKind.REQUEST_CAMERA_CONFIG)
+        deadline = None if timeout is None else time.perf_counter() + timeout
+        while True:
+            remaining = None if deadline is None else max(deadline - time.perf_counter(), 0.0)
+            try:
+                reply_seq, camera_config = self._reply_queue.get(timeout=remaining)
+            except queue.Empty:
+                raise TimeoutError("Camera did not reply with its config") from None
+            if reply_seq == seq:
+                return camera_config
 
     def terminate(self) -> None:
-        self._sig_term.set()
+        """
+        Takes effect immediately, ahead of every queued command.
+        """
+        self._control[Control.TERMINATE] = 1
 
     def should_terminate(self) -> bool:
-        return self._sig_term.is_set()
+        return self._control[Control.TERMINATE] != 0
 
     def calculate(self) -> None:
-        self._sig_calc.set()
+        self._calculate = True
+        self._send(CommandKind.CALCULATE)
 
     def stop_calculation(self) -> None:
-        self._sig_record.clear()
-        self._sig_calc.clear()
+        self._record = False
+        self._calculate = False
+        self._send(CommandKind.STOP_CALCULATION)
 
     def should_calculate(self) -> bool:
-        return self._sig_calc.is_set()
+        return self._calculate
 
     def record(self) -> None:
-        if not self._sig_calc.is_set():
+        if not self._calculate:
             raise Exception("Did not start calculating the ray parameters")
-        self._sig_record.set()
+        self._record = True
+        self._send(CommandKind.RECORD)
 
     def stop_recording(self) -> None:
-        self._sig_record.clear()
+        self._record = False
+        self._send(CommandKind.STOP_RECORDING)
 
     def should_record(self) -> bool:
-        return self._sig_record.is_set()
-    
+        return self._record
+
     def save_subimage(self) -> None:
-        self._sig_save_subimage.set()
+        self._send(CommandKind.SAVE_SUBIMAGE)
 
     def should_save_subimage(self) -> bool:
-        should_save_subimage = self._sig_save_subimage.is_set()
-        self._sig_save_subimage.clear()
+        should_save_subimage = self._save_subimage
+        self._save_subimage = False
         return should_save_subimage
 
-    def request_camera_config(self) -> CameraConfig:
-        self._sig_request_cam_config.set()
-        return self._cam_config_respond_queue.get(block=True)
-    
-    def sync_camera_config(self, camera: Camera) -> None:
-        if self._sig_request_cam_config.is_set():
-            self._cam_config_respond_queue.put(camera.config)
+    def learn_background(self) -> None:
+        """
+        Starts a new background average from the following frames. Only signal this while the beam is off.
+        """
+        self._learn_background = True
+        self._send(CommandKind.LEARN_BACKGROUND)
 
-    def recv_camera_config(self) -> CameraConfig:
-        return self._cam_config_queue.get(block=False)
+    def stop_learning_background(self) -> None:
+        self._learn_background = False
+        self._send(CommandKind.STOP_LEARNING_BACKGROUND)
+
+    def should_learn_background(self) -> bool:
+        return self._learn_background
+
+    def poll(self, apply: Callable[[Command], None]) -> bool:
+        """
+        Applies every command sent since the last poll, in the order they were sent. Calculation, recording,
+        subimage and background commands update the state of the Channel, all others are passed on to apply.
+        Costs a single integer compare when nothing was sent.
+
+        :param apply: Handler for filter, display mode, camera config and camera config request commands.
+        :type apply: Callable[[Command], None]
+        :return: Whether any command was applied.
+        :rtype: bool
+        """
+        version = self._control[Control.VERSION]
+        if version == self._applied:
+            return False
+
+        while self._applied < version:
+            try:
+                command = self._command_queue.get(timeout=COMMAND_TIMEOUT)
+            except queue.Empty:
+                break
+            self._applied = command.seq
+            match command.kind:
+                case CommandKind.CALCULATE:
+                    self._calculate = True
+                case CommandKind.STOP_CALCULATION:
+                    self._record = False
+                    self._calculate = False
+                case CommandKind.RECORD:
+                    self._record = self._calculate
+                case CommandKind.STOP_RECORDING:
+                    self._record = False
+                case CommandKind.SAVE_SUBIMAGE:
+                    self._save_subimage = True
+                case CommandKind.LEARN_BACKGROUND:
+                    self._learn_background = True
+                case CommandKind.STOP_LEARNING_BACKGROUND:
+                    self._learn_background = False
+                case _:
+                    with except_continue(f"Cannot apply command {command.kind}"):
+                        apply(command)
+        return True
+
+    def reply(self, command: Command, payload: Any) -> None:
+        self._reply_queue.put((command.seq, payload))
 
-    def send_camera_config(self, camera_config: CameraConfig) -> None:
-        return self._cam_config_queue.put(camera_config)
-    
     @property
     def exit_msg(self) -> ExitMsg:
-        with self._exit_msg_lock:
-            return self._exit_msg
-    
+        with self._lock:
+            message = self._exit_msg.raw[:self._control[Control.EXIT_MSG_LENGTH]]
+            return ExitMsg(self._control[Control.EXIT_FAILED] == 0, message.decode(errors="replace"))
+
     @exit_msg.setter
     def exit_msg(self, exit_msg: ExitMsg) -> None:
-        with self._exit_msg_lock:
-            self._exit_msg = exit_msg
+        message = exit_msg.message.encode()[:EXIT_MSG_SIZE]
+        with self._lock:
+            self._exit_msg[:len(message)] = message
+            self._control[Control.EXIT_MSG_LENGTH] = len(message)
+            self._control[Control.EXIT_FAILED] = 0 if exit_msg.success else 1
+
+    def _send(self, kind: int, payload: Any = None) -> int:
+        """
+        Queues a command before announcing it in the control block. Only for internal usage.
+
+        :return: Sequence number of the command.
+        :rtype: int
+        """
+        with self._lock:
+            seq = self._control[Control.VERSION] + 1
+            self._command_queue.put(Command(kind, seq, payload))
+            self._control[Control.VERSION] = seq
+        return seq
 
 @contextmanager
 def except_process(err_msg: str, channel: Channel):
@@ -140,4 +255,4 @@ def except_process(err_msg: str, channel: Channel):
         yield
     except Exception:
         channel.exit_msg = ExitMsg(False, err_msg)
-        raise
\ No newline at end of file
+        raise
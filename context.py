@@ -1,10 +1,22 @@
 from __future__ import annotations
 
+from typing import Any
+
 from camera import Camera, StreamMode
+from simulator import SimulatedCamera, SimulationConfig
+from utils import except_continue
 
 import PySpin
 import platform
 import json
+import os
+
+CAMERA_MAP_PATH = "./config/camera_map.json"
+DISCOVERY_CACHE_PATH = "./config/discovery_cache.json"
+"""
+Interface of every camera found by the last full search, by serial number. Lets a single camera be opened by
+enumerating only its interface.
+"""
 
 class Context:
     """
@@ -18,16 +30,20 @@ class Context:
         """
         self._system = system
         self._stream_mode = stream_mode
-        self._cameras: PySpin.CameraList
-        self._cam_map: dict[str, str] 
-        self._connected: dict[str, str] 
-        self.search_cams(True)
+        self._cameras: PySpin.CameraList | None = None
+        self._interfaces: PySpin.InterfaceList | None = None
+        self._interface_cameras: list[PySpin.CameraList] = []
+        self._cam_map: dict[str, str | dict[str, Any]] = {}
+        self._connected: dict[str, str | dict[str, Any]] | None = None
 
     @classmethod
-    def create(cls) -> Context:
+    def create(cls, search: bool = True) -> Context:
         """
         Creates a Context object. Context is nessessary to gain access to the connected cameras.
-        
+
+        :param search: Search all interfaces for the cameras of the camera map right away. Without the search,
+            get_camera(...) only enumerates the interface a camera was last found on, see DISCOVERY_CACHE_PATH.
+        :type search: bool
         :return: Returns a Context object (Factory function)
         :rtype: Context
         """
@@ -38,34 +54,134 @@ class Context:
         if os == "Linux" or os == "Darwin":
             stream_mode = StreamMode.SOCKET
         
-        return cls(system, stream_mode)
+        context = cls(system, stream_mode)
+        if search:
+            context.search_cams(True)
+        else:
+            context.read_cam_map()
+        return context
     
     def get_connected(self) -> list[str]:
+        if self._connected is None:
+            self.search_cams(False)
         return self._connected.keys()
+
+    def read_cam_map(self) -> None:
+        with open(CAMERA_MAP_PATH, "r") as file:
+            self._cam_map = json.load(file)
     
     def search_cams(self, read_config: bool) -> list[str]:
+        """
+        Enumerates the cameras on all interfaces and updates the discovery cache.
+        """
         if read_config:
-            with open("./config/camera_map.json", "r") as file:
-                self._cam_map = json.load(file)
+            self.read_cam_map()
 
+        self._release_cameras()
         self._cameras = self._system.GetCameras()
         
         self._connected = {
-            cam_key: cam_serial 
-            for cam_key, cam_serial in self._cam_map.items() 
-            if self._cameras.GetBySerial(cam_serial).IsValid()
+            cam_key: cam_entry
+            for cam_key, cam_entry in self._cam_map.items()
+            if is_simulated(cam_entry) or self._cameras.GetBySerial(cam_entry).IsValid()
         }
+        with except_continue("Cannot update discovery cache"):
+            self._update_discovery()
     
-    def get_camera(self, name: str) -> Camera:
-        if not name in self._connected:
+    def get_camera(self, name: str) -> Camera | SimulatedCamera:
+        """
+        Opens a camera of the camera map. Without a prior search, the camera is looked up on the interface it was last
+        found on; all interfaces are only searched if that fails.
+        """
+        if not name in self._cam_map or (self._connected is not None and not name in self._connected):
             raise Exception("This camera is not connected!")
         
-        cam = self._cameras.GetBySerial(self._cam_map[name])
+        cam_entry = self._cam_map[name]
+        if is_simulated(cam_entry):
+            return SimulatedCamera.init(name, SimulationConfig.from_dict(cam_entry))
+
+        cam = self._find_cached(cam_entry) if self._cameras is None else None
+        if cam is None:
+            if self._cameras is None:
+                self.search_cams(False)
+            if not name in self._connected:
+                raise Exception("This camera is not connected!")
+            cam = self._cameras.GetBySerial(cam_entry)
         return Camera.init(name, cam, self._stream_mode)
     
     def release(self) -> None:
         """
         Nessessary for cleanup. Releases the objects the Context class holds a pointer to.
         """
-        self._cameras.Clear()
-        self._system.ReleaseInstance()
\ No newline at end of file
+        self._release_cameras()
+        self._system.ReleaseInstance()
+
+    def _find_cached(self, serial: str) -> PySpin.CameraPtr | None:
+        """
+        Looks a camera up on the interface of the discovery cache. Only for internal usage.
+
+        :return: Camera handle, None if the camera is not cached or not found there.
+        :rtype: PySpin.CameraPtr | None
+        """
+        interface_id = load_discovery().get(serial)
+        if interface_id is None:
+            return None
+        with except_continue("Cached camera lookup failed"):
+            if self._interfaces is None:
+                self._interfaces = self._system.GetInterfaces()
+            for interface in self._interfaces:
+                if interface.TLInterface.InterfaceID.GetValue() != interface_id:
+                    continue
+                cameras = interface.GetCameras()
+                self._interface_cameras.append(cameras)
+                cam = cameras.GetBySerial(serial)
+                if cam.IsValid():
+                    return cam
+        return None
+
+    def _update_discovery(self) -> None:
+        """
+        Stores the interface of every connected physical camera, using the camera lists of the last search.
+        Only for internal usage.
+        """
+        serials = [cam_entry for cam_entry in self._connected.values() if not is_simulated(cam_entry)]
+        discovery = {}
+        self._interfaces = self._system.GetInterfaces(False)
+        for interface in self._interfaces:
+            cameras = interface.GetCameras(False)
+            self._interface_cameras.append(cameras)
+            interface_id = interface.TLInterface.InterfaceID.GetValue()
+            for serial in serials:
+                if cameras.GetBySerial(serial).IsValid():
+                    discovery[serial] = interface_id
+        save_discovery(discovery)
+
+    def _release_cameras(self) -> None:
+        """
+        Clears the camera and interface lists. Only for internal usage.
+        """
+        for cameras in self._interface_cameras:
+            cameras.Clear()
+        self._interface_cameras = []
+        if self._interfaces is not None:
+            self._interfaces.Clear()
+            self._interfaces = None
+        if self._cameras is not None:
+            self._cameras.Clear()
+            self._cameras = None
+
+def is_simulated(cam_entry: str | dict[str, Any]) -> bool:
+    """
+    Camera map entries are either the serial number of a physical camera or an object marked with "simulated": true.
+    """
+    return isinstance(cam_entry, dict) and bool(cam_entry.get("simulated", False))
+
+def load_discovery() -> dict[str, str]:
+    if not os.path.exists(DISCOVERY_CACHE_PATH):
+        return {}
+    with open(DISCOVERY_CACHE_PATH, "r") as file:
+        return json.load(file)
+
+def save_discovery(discovery: dict[str, str]) -> None:
+    with open(DISCOVERY_CACHE_PATH, "w") as file:
+        json.dump(discovery, file, indent=4)
\ No newline at end of file
@@ -1,48 +1,248 @@
 from __future__ import annotations
 
-from camera import Camera, CameraConfig
+from camera import Camera, CameraConfig, BufferMode, IncompleteFrame
 from processor import Processor
 from context import Context
-from channel import Channel, ExitMsg, except_process
+from channel import Channel, Command, CommandKind, ExitMsg, except_process
+from stage import Stage, StageQueue, StageClosed, DropPolicy
+from ring import FrameRing, RingFrame
+from display import Display, Overlay
+from recorder import RecordFormat, Recorder, MissingFrameLog, MissingReason, create_recorder
+from framefile import FrameWriter
+from tracker import RoiTracker
+from analyzer import AnalyzerKind, Analyzer, BeamFit, Record, create_analyzer
+from background import get_background, flush_backgrounds
+from telemetry import Telemetry, TelemetrySnapshot, Metric, Counter, QueueSlot, Phase, append_metrics
+from stability import Stability, StabilitySnapshot
+from stream import RecordStream, RecordSubscriber
 import utils
-from utils import Frame, FrameData, CaptureFormat, Capture, DisplayMode, DataRecord, except_continue, except_raise, Timer, HardwareTimer
+from utils import Frame, Capture, DisplayMode, except_continue, except_raise, Timer, HardwareTimer
 
+from dataclasses import dataclass
 from multiprocessing import Process
-import pygame
-import numpy
-import cv2
+from functools import partial
+import threading
+import queue
 import time
-import csv
+
+@dataclass
+class DispatchConfig:
+    """
+    Per camera settings of the dispatch loop.
+    """
+    fast_mono: bool = False
+    """
+    Analyse the half resolution mono frame (green pixels of the Bayer mosaic) instead of the full demosaiced one.
+    Fit results are converted back to full resolution. The processing pipeline then runs on half resolution frames,
+    so crops and backgrounds have to be given in half resolution as well.
+    """
+    display_size: tuple[int, int] = (1000, 800)
+    """
+    Window size (width, height) in pixels. Frames are scaled to fit.
+    """
+    display_rate: float = 30.0
+    """
+    Maximum number of frames per second rendered in the window, independent of the camera frame rate.
+    """
+    record_format: RecordFormat = RecordFormat.CSV
+    """
+    File format of the records. Binary record files (RecordFormat.BINARY) convert to CSV with recorder.convert_to_csv(...).
+    """
+    record_batch_size: int = 256
+    """
+    Number of records written to disk at once (binary format only).
+    """
+    record_flush_interval: float = 1.0
+    """
+    Maximum number of seconds before recorded data is flushed to disk.
+    """
+    analyzer: AnalyzerKind = AnalyzerKind.GAUSS
+    """
+    Engine the processed frames are analysed with. Determines the fields of the records, see analyzer.AnalyzerKind.
+    """
+    track_roi: bool = False
+    """
+    Process and fit only a region a few sigma around the beam, placed by the fit of the previous frame (see tracker.RoiTracker).
+    Records keep the coordinates of the full processed frame. The processed frames in the shared memory ring show the region only.
+    """
+    track_sigmas: float = 6.0
+    """
+    Half width and height of the tracked region in fitted sigmas. Narrower regions are faster, but leave less baseline
+    for the fitted offset, which shifts the fitted sigma slightly against a full frame fit.
+    """
+    background_alpha: float = 0.05
+    """
+    Weight of a new frame in the running background average once 1 / background_alpha frames are averaged.
+    """
+    raw_record: bool = False
+    """
+    While recording, additionally append every acquired frame unprocessed to a memory-mapped raw file, see framefile.FrameWriter.
+    """
+    lossless_record: bool = False
+    """
+    While recording, switch the stream buffers to BufferMode.LOSSLESS and log every frame id that is not recorded,
+    with its reason, to ./record/<camera name>-<date>.missing. Switching restarts the acquisition, so the first frames
+    after starting and stopping a recording are lost; the log covers every frame from the first one after the switch.
+    """
+    lossless_memory_budget: int = 512 * 2**20
+    """
+    Bytes of host memory for stream buffers in lossless recording. Determines how long analysis may fall behind the camera.
+    """
+    metrics_interval: float | None = None
+    """
+    Seconds between two telemetry snapshots appended to ./record/<camera name>-<date>.metrics (JSON lines), None to write none.
+    Telemetry is always available through Dispatch.get_telemetry().
+    """
+    stability_windows: tuple[int, ...] = (100, 1000, 10000)
+    """
+    Lengths in records of the windows beam stability statistics are kept over, see Dispatch.get_stability().
+    """
+    stability_block: int = 10
+    """
+    Number of records summarized at once by the stability statistics. Windows are resolved to whole blocks.
+    """
+    stream_slots: int = 1024
+    """
+    Number of records kept for subscribers of the record stream (see Dispatch.subscribe()), i.e. how far a subscriber
+    may fall behind before it loses records.
+    """
 
 class Dispatch:
     def __init__(self, cam_name, process: Process, channel: Channel):
         self._cam_name = cam_name
         self._process = process
         self._channel = channel
+        self._ring: FrameRing | None = None
+        self._telemetry: Telemetry | None = None
+        self._stability: Stability | None = None
+        self._start_time: float | None = None
 
     @classmethod
-    def create(cls, cam_name: str, display: int = 0, config: CameraConfig | None = None):
+    def create(cls, cam_name: str, display: int = 0, config: CameraConfig | None = None, dispatch_config: DispatchConfig | None = None):
         channel = Channel.create()
-        process = Process(target=dispatch, args=(cam_name, channel, display, config))
+        dispatch_config = dispatch_config if dispatch_config is not None else DispatchConfig()
+        process = Process(target=dispatch, args=(cam_name, channel, display, config, dispatch_config))
         return cls(cam_name, process, channel)
     
     def start(self) -> None:
+        self._start_time = time.time()
         self._process.start()
     
     def terminate(self) -> tuple[bool, str]:
         self._channel.terminate()
         self._process.join()
+        if self._ring is not None:
+            self._ring.close()
+            self._ring = None
+        if self._telemetry is not None:
+            self._telemetry.close()
+            self._telemetry = None
+        if self._stability is not None:
+            self._stability.close()
+            self._stability = None
         return self._channel.exit_msg
 
+    def get_frames(self, count: int = 1) -> list[RingFrame]:
+        """
+        Reads the latest frames of the dispatched camera from its shared memory ring, newest first.
+        The frames are zero-copy views, see RingFrame. Frames larger than the ring slots (the image size grew after the
+        dispatch started) are not published, see TelemetrySnapshot.unpublished.
+
+        :param count: Maximum number of frames.
+        :type count: int
+        :return: Latest frames, empty until the camera delivered its first frame.
+        :rtype: list[RingFrame]
+        """
+        if self._ring is None:
+            try:
+                self._ring = FrameRing.attach(ring_name(self._cam_name))
+            except FileNotFoundError:
+                return []
+        return self._ring.latest(count)
+
+    def get_telemetry(self) -> TelemetrySnapshot | None:
+        """
+        Reads the latency histograms, frame counters and queue depths of the dispatched camera from shared memory.
+
+        :return: Snapshot of the telemetry, None until the camera is set up.
+        :rtype: TelemetrySnapshot | None
+        """
+        if self._telemetry is None:
+            try:
+                self._telemetry = Telemetry.attach(telemetry_name(self._cam_name))
+            except FileNotFoundError:
+                return None
+        return self._telemetry.snapshot()
+
+    def get_startup(self) -> dict[str, float] | None:
+        """
+        Startup timing breakdown of the dispatched camera: seconds from start() until each startup phase completed
+        (see telemetry.Phase), for the phases completed so far.
+
+        :return: Seconds per completed phase, None until the telemetry is available.
+        :rtype: dict[str, float] | None
+        """
+        telemetry = self.get_telemetry()
+        if telemetry is None or self._start_time is None:
+            return None
+        return {name: when - self._start_time for name, when in telemetry.startup.items()}
+
+    def get_stability(self) -> StabilitySnapshot | None:
+        """
+        Reads the rolling beam stability statistics (mean, standard deviation, min/max and Allan deviation of the
+        beam centers and widths) of the dispatched camera from shared memory, see stability.Stability.
+        Only calculated frames contribute.
+
+        :return: Snapshot of the statistics, None until the camera is set up.
+        :rtype: StabilitySnapshot | None
+        """
+        if self._stability is None:
+            try:
+                self._stability = Stability.attach(stability_name(self._cam_name))
+            except FileNotFoundError:
+                return None
+        return self._stability.snapshot()
+
+    def subscribe(self, from_start: bool = False) -> RecordSubscriber | None:
+        """
+        Subscribes to the records of the dispatched camera as they are calculated, see stream.RecordSubscriber.
+        Subscribers in other processes attach with RecordSubscriber.attach(stream_name(camera name)).
+        Close the subscriber when done.
+
+        :param from_start: Start with the oldest record still kept instead of the next one.
+        :type from_start: bool
+        :return: Subscriber, None until the camera is set up.
+        :rtype: RecordSubscriber | None
+        """
+        try:
+            return RecordSubscriber.attach(stream_name(self._cam_name), from_start)
+        except FileNotFoundError:
+            return None
+
     def set_processor(self, processor: Processor) -> None:
-        self._channel.processor = processor
+        self._channel.send_filters(*processor.filters)
 
     def set_camera_config(self, config: CameraConfig) -> None:
         self._channel.send_camera_config(config)
 
-    def get_camera_config(self) -> CameraConfig:
-        return self._channel.request_camera_config()
+    def get_camera_config(self, timeout: float | None = 1.0) -> CameraConfig:
+        """
+        :raises TimeoutError: The dispatched camera did not reply within timeout seconds.
+        """
+        return self._channel.request_camera_config(timeout)
     
+    def learn_background(self) -> None:
+        """
+        Starts averaging a new background of the camera (used by ProcessFilter.SUBSTRACT). Only call this while the beam is off.
+        """
+        self._channel.learn_background()
+
+    def stop_learning_background(self) -> None:
+        """
+        Stops averaging and saves the background to ./config/<camera name>-background.png.
+        """
+        self._channel.stop_learning_background()
+
     def set_display_mode(self, display_mode: DisplayMode) -> None:
         self._channel.send_display_mode(display_mode)
 
@@ -56,119 +256,433 @@ class Dispatch:
     def cam_name(self) -> str:
         return self._cam_name
 
-def dispatch(cam_name: str, channel: Channel, display: int, config: CameraConfig | None) -> None:
-    pygame.init()
-    pygame.display.set_caption(f"CamView")
-    screen = pygame.display.set_mode((1000, 800), display=display)
-    context = Context.create()
+RING_SLOTS = 8
+"""
+Number of frames kept in the shared memory ring of a dispatched camera.
+"""
+
+def ring_name(cam_name: str) -> str:
+    return f"camview-{cam_name}"
+
+def telemetry_name(cam_name: str) -> str:
+    return f"camview-telemetry-{cam_name}"
+
+def stability_name(cam_name: str) -> str:
+    return f"camview-stability-{cam_name}"
+
+def stream_name(cam_name: str) -> str:
+    return f"camview-stream-{cam_name}"
+
+def dispatch(cam_name: str, channel: Channel, display: int, config: CameraConfig | None, dispatch_config: DispatchConfig) -> None:
+    window = Display.create(display, dispatch_config.display_size, dispatch_config.display_rate)
+    ring = None
+    telemetry = None
+    stability = None
+    stream = None
     
     try:
+        with except_process("Cannot create telemetry", channel):
+            telemetry = Telemetry.create(telemetry_name(cam_name))
+        telemetry.mark(Phase.PROCESS)
+
         with except_process(f"Device not found", channel):
+            context = Context.create(search=False)
+            telemetry.mark(Phase.CONTEXT)
             camera = context.get_camera(cam_name)
+            telemetry.mark(Phase.CAMERA)
         
         with except_process(f"Cannot setup camera", channel):
             camera.setup(auto_off=True)
 
         if config is not None:
             camera.config = config
+        telemetry.mark(Phase.SETUP)
+
+        with except_process("Cannot create frame ring", channel):
+            ring = FrameRing.create(ring_name(cam_name), RING_SLOTS, camera.config.height, camera.config.width)
+
+        with except_process("Cannot create stability statistics", channel):
+            stability = Stability.create(stability_name(cam_name), dispatch_config.stability_windows, dispatch_config.stability_block)
+
+        with except_process("Cannot create record stream", channel):
+            stream = RecordStream.create(stream_name(cam_name), create_analyzer(dispatch_config.analyzer).record_type, dispatch_config.stream_slots)
         
         with except_process(f"Error during dispatch", channel):
-            dispatch_run(screen, camera, channel)
+            dispatch_run(window, camera, channel, ring, telemetry, stability, stream, dispatch_config)
         
     except:
         pass
     finally:
-        pygame.quit()
+        if ring is not None:
+            ring.close()
+        if telemetry is not None:
+            telemetry.close()
+        if stability is not None:
+            stability.close()
+        if stream is not None:
+            stream.close()
+        flush_backgrounds()
+        window.quit()
 
-def dispatch_run(screen: pygame.Surface, camera: Camera, channel: Channel) -> None:
-    file = None
-    writer = None
-    
-    processor = Processor.create()
+ANALYSIS_QUEUE_SIZE = 64
+"""
+Number of acquired frames the analysis stage may fall behind before acquisition waits for it.
+"""
+DISPLAY_QUEUE_SIZE = 1
+"""
+Number of acquired frames waiting for the display. Older frames are replaced by newer ones.
+"""
+DISPLAY_POLL_INTERVAL = 0.01
+"""
+Longest time in seconds the main loop sleeps between two checks for control updates while no frame is due for display.
+"""
+ACQUISITION_TIMEOUT = 500
+"""
+Timeout in milliseconds for a single acquisition, so that the acquisition stage can notice termination.
+"""
+
+def dispatch_run(window: Display, camera: Camera, channel: Channel, ring: FrameRing, telemetry: Telemetry, stability: Stability, stream: RecordStream, dispatch_config: DispatchConfig) -> None:
+    release = lambda item: camera.release(item[1])
+    analysis_queue = StageQueue.create(ANALYSIS_QUEUE_SIZE, DropPolicy.BLOCK, on_drop=release)
+    display_queue = StageQueue.create(DISPLAY_QUEUE_SIZE, DropPolicy.DROP_OLDEST, on_drop=release)
+    record_queue = StageQueue.create(1, DropPolicy.DROP_OLDEST)
+
+    analysis_processor = Processor.create()
+    display_processor = Processor.create()
     display_mode = DisplayMode.RGB
-    
-    timer = HardwareTimer.create(1000, lambda fps: print(f"{fps:.1f}"))
+    record = None
+    metrics_path = utils.get_filename(camera.name, "metrics") if dispatch_config.metrics_interval is not None else None
+    metrics_due = time.perf_counter()
+    missing_log = MissingFrameLog.create()
+
+    queues = ((QueueSlot.ANALYSIS, analysis_queue), (QueueSlot.DISPLAY, display_queue))
+    acquisition = Stage.create("acquisition", partial(acquisition_stage, camera, channel, telemetry, missing_log, queues, dispatch_config))
+    analysis = Stage.create("analysis", partial(analysis_stage, camera, channel, ring, telemetry, stability, stream, missing_log, analysis_queue, record_queue, analysis_processor, dispatch_config))
+
     with except_raise():
         camera.begin()
+    telemetry.mark(Phase.ACQUISITION)
+    acquisition.start()
+    analysis.start()
+
+    try:
+        while not channel.should_terminate():
+            acquisition.check()
+            analysis.check()
+            window.pump()
+
+            new_display_mode = sync_updates(channel, camera, (analysis_processor, display_processor))
+            if new_display_mode is not None: display_mode = new_display_mode
+
+            if metrics_path is not None and time.perf_counter() >= metrics_due:
+                metrics_due += dispatch_config.metrics_interval
+                with except_continue("Cannot write metrics"):
+                    append_metrics(metrics_path, telemetry.snapshot())
+
+            wait = window.time_until_due()
+            if wait > 0:
+                time.sleep(min(wait, DISPLAY_POLL_INTERVAL))
+                continue
+
+            try:
+                frame_data, frame = display_queue.get(timeout=0.1)
+            except queue.Empty:
+                continue
 
-    while not channel.should_terminate():
-        new_display_mode = sync_updates(channel, camera, display_mode, processor)
-        if new_display_mode is not None: display_mode = new_display_mode
+            with except_continue():
+                record = record_queue.get(timeout=0)
+            telemetry.queue(QueueSlot.RECORD, record_queue.depth, record_queue.dropped)
 
+            try:
+                start = time.perf_counter_ns()
+                capture = Capture.create(frame_data, frame, display_processor.process)
+                overlay = None
+                if record is not None and channel.should_calculate():
+                    overlay = get_overlay(record, display_mode, analysis_processor, display_processor, dispatch_config)
+                window.show(capture, display_mode, overlay)
+                telemetry.lap(Metric.DISPLAY, start)
+
+                if channel.should_save_subimage():
+                    utils.save_subimage(camera.name, capture.rgb)
+            finally:
+                camera.release(frame)
+    finally:
+        acquisition.stop()
+        analysis_queue.close()
+        display_queue.close()
+        acquisition.join()
+        analysis.join()
+        for item in display_queue.drain():
+            release(item)
+        missing_log.stop()
+        camera.end()
+
+def acquisition_stage(camera: Camera, channel: Channel, telemetry: Telemetry, missing_log: MissingFrameLog, queues: tuple[tuple[int, StageQueue], ...], dispatch_config: DispatchConfig, stop: threading.Event) -> None:
+    """
+    Acquisition stage loop. Hands every acquired frame to all consuming stages; their queues decide what to drop.
+    Each queue holds its own reference to the pooled frame. The queues are given with their telemetry slot, the first
+    one feeds the analysis. The queues are closed before the stage is joined, which wakes a put blocked on a full
+    analysis queue; frames put into a closed queue are released.
+    With lossless recording, the stream buffers are switched when recording starts and stops, and every frame id gap
+    is logged as missing.
+    """
+    timer = HardwareTimer.create(1000, lambda fps: print(f"{fps:.1f}"))
+    analysis_queue = queues[0][1]
+    lossless = False
+    last_frame_id = None
+    backlog = False
+
+    while not stop.is_set():
+        if dispatch_config.lossless_record and channel.should_record() != lossless:
+            lossless = not lossless
+            switch_buffering(camera, BufferMode.LOSSLESS if lossless else BufferMode.PREVIEW, dispatch_config.lossless_memory_budget)
+            if lossless:
+                missing_log.start(utils.get_filename(camera.name, "missing"))
+            else:
+                missing_log.stop()
+            last_frame_id = None
+            backlog = False
+
+        start = time.perf_counter_ns()
         try:
-            frame_data, capture = capture_next_frame(camera, processor)
+            frame_data, frame = camera.acquire(ACQUISITION_TIMEOUT)
+        except IncompleteFrame as ex:
+            print(f"Capture Error: {ex}")
+            telemetry.count(Counter.INCOMPLETE)
+            if lossless and ex.frame_id is not None:
+                last_frame_id = log_missing(missing_log, last_frame_id, ex.frame_id, backlog)
+                missing_log.log(ex.frame_id, MissingReason.INCOMPLETE)
+            continue
         except Exception as ex:
             print(f"Capture Error: {ex}")
+            telemetry.count(Counter.ERRORS)
             continue
+        telemetry.lap(Metric.ACQUIRE, start)
 
         timer.frame(frame_data.timestamp)
+        telemetry.frame(frame_data.frame_id, frame_data.timestamp)
+        if lossless:
+            last_frame_id = log_missing(missing_log, last_frame_id, frame_data.frame_id, backlog)
+            backlog = analysis_queue.depth >= ANALYSIS_QUEUE_SIZE
 
-        if channel.should_calculate():
-            with except_continue("Gauss fit exception"):
-                horiz_proj, vert_proj = utils.project(capture.processed)
-                horiz_gaussian = utils.gauss_fit(horiz_proj)
-                vert_gaussian = utils.gauss_fit(vert_proj)
-                record = DataRecord.create(horiz_gaussian, vert_gaussian, frame_data)
-                record_dict = record.asdict()
-
-            if channel.should_record():
-                if file is None:
-                    file = open(utils.get_filename(camera.name), "w", newline="")
-                    writer = csv.DictWriter(file, fieldnames=record_dict.keys())
-                    writer.writeheader()
-                writer.writerow(record_dict)
-                file.flush()
-        
-        display_frame = get_display_frame(capture, display_mode)
-        display_frame = numpy.rot90(display_frame)
-        show_surface = pygame.surfarray.make_surface(display_frame)
-        screen.blit(show_surface, (0, 0))
-        pygame.display.flip()
-
-        if channel.should_save_subimage():
-            utils.save_subimage(camera.name, capture.rgb)
-
-    camera.end()
-    if file is not None:
-        file.close()
-
-def sync_updates(channel: Channel, camera: Camera, processor: Processor) -> DisplayMode | None:
-    with except_continue():
-        processor.updated_pipline(channel.recv_processor())
-
-    with except_continue():
-        camera.config = channel.recv_camera_config()
-
-    channel.sync_camera_config(camera)
-
-    with except_continue():
-        return channel.recv_display_mode()    
-    return None
-
-def capture_next_frame(cam: Camera, processor: Processor) -> tuple[FrameData, Capture]:
-    frame_data, frame = cam.acquire()
-
-    rgb_frame: Frame
-    mono_frame: Frame
-    match frame_data.capture_format:
-        case CaptureFormat.BAYER_RG8:
-            rgb_frame = utils.convert_bayer_rgb(frame)
-            mono_frame = utils.convert_bayer_mono(frame)
-        case CaptureFormat.MONO8:
-            rgb_frame = utils.expand_mono_rgb(frame)
-            mono_frame = frame
-        case CaptureFormat.RGB8:
-            rgb_frame = frame
-            mono_frame = utils.convert_rgb_mono(frame)
-
-    processed_frame = processor.process(mono_frame)
-    return frame_data, Capture(rgb_frame, mono_frame, processed_frame)
-
-def get_display_frame(capture: Capture, display_mode: DisplayMode) -> Frame:
-    match display_mode:
-        case DisplayMode.RGB:
-            return capture.rgb
-        case DisplayMode.MONO:
-            return utils.expand_mono_rgb(capture.mono)
-        case DisplayMode.PROCESSED:
-            return utils.expand_mono_rgb(capture.processed)
\ No newline at end of file
+        camera.pool.retain(frame, len(queues) - 1)
+        for slot, stage_queue in queues:
+            if not stage_queue.put((frame_data, frame)) and lossless and stage_queue is analysis_queue:
+                missing_log.log(frame_data.frame_id, MissingReason.DISCARDED)
+            telemetry.queue(slot, stage_queue.depth, stage_queue.dropped)
+
+def switch_buffering(camera: Camera, mode: BufferMode, memory_budget: int) -> None:
+    """
+    Restarts the acquisition with other stream buffers. The timestamp clock keeps running.
+    """
+    with except_raise("Cannot switch stream buffers"):
+        camera.end()
+        count = camera.set_buffering(mode, memory_budget)
+        camera.begin(reset_timestamp=False)
+    print(f"{camera.name}: {count} stream buffers ({'lossless' if mode == BufferMode.LOSSLESS else 'preview'})")
+
+def log_missing(missing_log: MissingFrameLog, last_frame_id: int | None, frame_id: int, backlog: bool) -> int:
+    """
+    Logs the frame ids skipped since the last acquired one. The camera only skips frames with all stream buffers full;
+    if acquisition was held back by the analysis meanwhile, the backlog is the reason.
+
+    :param backlog: The analysis queue was full when the last frame was handed over.
+    :type backlog: bool
+    :return: The new last frame id.
+    :rtype: int
+    """
+    if last_frame_id is not None and frame_id > last_frame_id + 1:
+        reason = MissingReason.ANALYSIS_BACKLOG if backlog else MissingReason.BUFFER_OVERRUN
+        missing_log.log(last_frame_id + 1, reason, frame_id - last_frame_id - 1)
+    return frame_id
+
+def analysis_stage(camera: Camera, channel: Channel, ring: FrameRing, telemetry: Telemetry, stability: Stability, stream: RecordStream, missing_log: MissingFrameLog, analysis_queue: StageQueue, record_queue: StageQueue, processor: Processor, dispatch_config: DispatchConfig, stop: threading.Event) -> None:
+    """
+    Analysis stage loop. Fits and records every frame handed over by the acquisition stage until its queue is closed.
+    With raw recording enabled, every frame is also appended to the raw file, whether or not it is calculated.
+    Once recording stops, the record and raw files are closed, so the next recording starts new files.
+    While the background is learned, every frame is added to the background of the camera, which is saved once learning stops.
+    Every frame is published to the shared memory ring, together with its mono and processed frame while calculating.
+    Frames that do not fit the ring (it is sized at startup) are counted as unpublished in the telemetry.
+    The latest record is passed on to the display overlay. Frames that fail to be recorded (or raw recorded) in a lossless recording are logged as missing.
+    """
+    recorder: Recorder | None = None
+    frame_writer: FrameWriter | None = None
+    analyzer = create_analyzer(dispatch_config.analyzer)
+    mono_buffer = None
+    tracker = RoiTracker.create(dispatch_config.track_sigmas) if dispatch_config.track_roi else None
+    tracked_filters = processor.filters
+    background = get_background(camera.name)
+    learning = False
+
+    try:
+        while True:
+            try:
+                frame_data, frame = analysis_queue.get()
+            except StageClosed:
+                break
+
+            try:
+                if not channel.should_record():
+                    if recorder is not None:
+                        with except_continue("Record exception"):
+                            recorder.close()
+                        recorder = None
+                    if frame_writer is not None:
+                        with except_continue("Raw record exception"):
+                            frame_writer.close()
+                        frame_writer = None
+
+                if dispatch_config.raw_record and channel.should_record():
+                    written = False
+                    with except_continue("Raw record exception"):
+                        start = time.perf_counter_ns()
+                        if frame_writer is None:
+                            frame_writer = FrameWriter.create(utils.get_filename(camera.name, "raw"), camera.config, frame_data.capture_format)
+                        frame_writer.write(frame_data, frame)
+                        written = True
+                        telemetry.lap(Metric.RECORD, start)
+                    if not written:
+                        missing_log.log(frame_data.frame_id, MissingReason.RAW_RECORD_FAILED)
+
+                if channel.should_learn_background():
+                    if not learning:
+                        background.reset()
+                        learning = True
+                    with except_continue("Background exception"):
+                        capture = Capture.create(frame_data, frame)
+                        background.update(capture.half_mono if dispatch_config.fast_mono else capture.mono, dispatch_config.background_alpha)
+                elif learning:
+                    background.save()
+                    learning = False
+
+                if not channel.should_calculate():
+                    start = time.perf_counter_ns()
+                    if not ring.write(frame_data, frame):
+                        telemetry.count(Counter.UNPUBLISHED)
+                    telemetry.lap(Metric.PUBLISH, start)
+                    continue
+
+                recorded = False
+                with except_continue("Analysis exception"):
+                    roi = None
+                    if tracker is not None:
+                        if processor.filters is not tracked_filters:
+                            tracker.reset()
+                            tracked_filters = processor.filters
+                        roi = tracker.roi
+
+                    start = time.perf_counter_ns()
+                    process = processor.process if roi is None else partial(processor.process, roi=roi)
+                    capture = Capture.create(frame_data, frame, process, mono_buffer)
+                    if dispatch_config.fast_mono:
+                        mono_frame = capture.half_mono
+                        start = telemetry.lap(Metric.CONVERT, start)
+                        processed_frame = capture.half_processed
+                    else:
+                        mono_frame = capture.mono
+                        start = telemetry.lap(Metric.CONVERT, start)
+                        processed_frame = capture.processed
+                        if mono_frame is not frame:
+                            mono_buffer = mono_frame
+                    start = telemetry.lap(Metric.PROCESS, start)
+                    if not ring.write(frame_data, frame, mono_frame, processed_frame):
+                        telemetry.count(Counter.UNPUBLISHED)
+                    start = telemetry.lap(Metric.PUBLISH, start)
+
+                    if tracker is None:
+                        fit = analyzer.analyze(processed_frame)
+                    else:
+                        fit = track_analyze(tracker, analyzer, processed_frame)
+
+                    if dispatch_config.fast_mono:
+                        fit = fit.rescaled(Capture.HALF_SCALE, Capture.HALF_SHIFT)
+                    record = analyzer.record(fit, frame_data)
+                    record_queue.put(record)
+                    stream.publish(record)
+                    stability.update(record)
+                    start = telemetry.lap(Metric.ANALYZE, start)
+
+                    if channel.should_record():
+                        if recorder is None:
+                            recorder = create_recorder(
+                                dispatch_config.record_format,
+                                utils.get_filename(camera.name, dispatch_config.record_format),
+                                analyzer.record_type,
+                                camera.config,
+                                dispatch_config.record_batch_size,
+                                dispatch_config.record_flush_interval
+                            )
+                        recorder.write(record)
+                        recorded = True
+                        telemetry.lap(Metric.RECORD, start)
+
+                if not recorded and missing_log.active and channel.should_record():
+                    missing_log.log(frame_data.frame_id, MissingReason.ANALYSIS_FAILED)
+            finally:
+                camera.release(frame)
+    finally:
+        if recorder is not None:
+            recorder.close()
+        if frame_writer is not None:
+            frame_writer.close()
+
+def track_analyze(tracker: RoiTracker, analyzer: Analyzer, frame: Frame) -> BeamFit:
+    """
+    Analyses the tracked region and moves the region for the next frame. The result is given in pixels of the full
+    processed frame. A failing analysis starts a full frame search.
+
+    :param frame: Processed frame of the tracked region, or the full processed frame during a full frame search.
+    :raises ValueError: The analysis failed (e.g. a dark or flat frame).
+    """
+    roi = tracker.roi
+    try:
+        fit = analyzer.analyze(frame, (0, 0) if roi is None else roi[:2])
+    except ValueError:
+        tracker.reset()
+        raise
+
+    if roi is None:
+        tracker.reset(frame.shape[:2])
+    tracker.update(fit.horiz, fit.vert)
+    return fit
+
+def sync_updates(channel: Channel, camera: Camera, processors: tuple[Processor, ...]) -> DisplayMode | None:
+    """
+    Applies the commands sent to the dispatched camera since the last call, in order.
+
+    :return: The latest display mode sent, None if there was none.
+    :rtype: DisplayMode | None
+    """
+    display_mode = None
+
+    def apply(command: Command) -> None:
+        nonlocal display_mode
+        match command.kind:
+            case CommandKind.FILTERS:
+                for processor in processors:
+                    processor.updated_pipline(command.payload)
+            case CommandKind.CAMERA_CONFIG:
+                camera.config = command.payload
+            case CommandKind.REQUEST_CAMERA_CONFIG:
+                channel.reply(command, camera.config)
+            case CommandKind.DISPLAY_MODE:
+                display_mode = command.payload
+
+    channel.poll(apply)
+    return display_mode
+
+def get_overlay(record: Record, display_mode: DisplayMode, analysis_processor: Processor, display_processor: Processor, dispatch_config: DispatchConfig) -> Overlay:
+    """
+    Places the fit result of a record on the displayed frame. Records are relative to the frame cropped by the analysis
+    processor, the display shows either the full frame or the frame cropped by the display processor.
+    """
+    scale = Capture.HALF_SCALE if dispatch_config.fast_mono else 1.0
+    offset_x, offset_y = analysis_processor.offset
+    center_x = record.center_horiz + offset_x * scale
+    center_y = record.center_vert + offset_y * scale
+    if display_mode == DisplayMode.PROCESSED:
+        display_offset_x, display_offset_y = display_processor.offset
+        center_x -= display_offset_x
+        center_y -= display_offset_y
+    return Overlay(center_x, center_y, record.sigma_horiz, record.sigma_vert)
\ No newline at end of file
@@ -0,0 +1,171 @@
+from __future__ import annotations
+from dataclasses import dataclass
+from typing import TYPE_CHECKING
+
+from utils import Frame, Capture, DisplayMode
+import utils
+
+import numpy
+import cv2
+import time
+
+if TYPE_CHECKING:
+    import pygame
+
+@dataclass
+class Overlay:
+    """
+    Fit result drawn on top of the displayed frame. Positions and widths are given in pixels of the displayed frame
+    before downscaling.
+    """
+    center_x: float
+    center_y: float
+    sigma_x: float
+    sigma_y: float
+
+class Display:
+    """
+    Window showing the live frames. Renders at a capped rate into one persistent surface, so the display
+    never limits how fast frames are acquired or analysed.
+
+    pygame is only imported and the window only opened with the first pump() or show(), so that a dispatched camera
+    starts acquiring without waiting for them.
+    """
+    OVERLAY_COLOR = (255, 64, 64)
+
+    def __init__(self, display: int, size: tuple[int, int], rate: float):
+        """
+        **DO NOT USE!** Constructor for Display class is only for internal usage.
+        Use Display.create(...) instead!
+        """
+        self._display = display
+        self._size = size
+        self._pygame = None
+        self._screen: pygame.Surface | None = None
+        self._period = 1.0 / rate if rate > 0 else 0.0
+        self._next_time = 0.0
+        self._surface: pygame.Surface | None = None
+        self._rgb_buffer: Frame | None = None
+        self._mono_buffer: Frame | None = None
+        self._scale = 1.0
+        self._font: pygame.font.Font | None = None
+
+    @classmethod
+    def create(cls, display: int = 0, size: tuple[int, int] = (1000, 800), rate: float = 30.0) -> Display:
+        """
+        Creates the Display. The window opens with the first pump() or show().
+
+        :param display: Index of the monitor the window is opened on.
+        :type display: int
+        :param size: Window size (width, height) in pixels. Frames are scaled to fit.
+        :type size: tuple[int, int]
+        :param rate: Maximum number of rendered frames per second. Renders every frame if 0.
+        :type rate: float
+        :return: Display object.
+        :rtype: Display
+        """
+        return cls(display, size, rate)
+
+    def time_until_due(self) -> float:
+        """
+        Seconds until the next frame should be rendered; 0 or less if it is due.
+        """
+        return self._next_time - time.perf_counter()
+
+    def show(self, capture: Capture, display_mode: DisplayMode, overlay: Overlay | None = None) -> None:
+        """
+        Renders the frame selected by the display mode. Frames are scaled in one resize step into the buffer backing
+        the persistent surface; mono frames are scaled before they are expanded to RGB.
+        """
+        pygame = self._open()
+        self._next_time = max(self._next_time + self._period, time.perf_counter())
+
+        match display_mode:
+            case DisplayMode.RGB:
+                frame = capture.rgb
+                self._prepare(frame)
+                self._resize(frame, self._rgb_buffer)
+            case DisplayMode.MONO | DisplayMode.PROCESSED:
+                frame = capture.mono if display_mode == DisplayMode.MONO else capture.processed
+                self._prepare(frame)
+                utils.expand_mono_rgb(self._resize(frame, self._mono_buffer), self._rgb_buffer)
+        cv2.flip(self._rgb_buffer, 1, dst=self._rgb_buffer)
+
+        self._screen.fill((0, 0, 0))
+        self._screen.blit(self._surface, (0, 0))
+        if overlay is not None:
+            self._draw_overlay(overlay, self._rgb_buffer.shape[1])
+        pygame.display.flip()
+
+    def pump(self) -> None:
+        """
+        Processes the window events, keeps the window responsive while no frame is rendered.
+        """
+        self._open().event.pump()
+
+    def quit(self) -> None:
+        if self._pygame is not None:
+            self._pygame.quit()
+
+    def _open(self):
+        """
+        Imports pygame and opens the window on first use. Only for internal usage.
+
+        :return: The pygame module.
+        """
+        if self._pygame is None:
+            import pygame
+            pygame.init()
+            pygame.display.set_caption("CamView")
+            self._screen = pygame.display.set_mode(self._size, display=self._display)
+            self._pygame = pygame
+        return self._pygame
+
+    def _prepare(self, frame: Frame) -> None:
+        """
+        Fits the frame into the window keeping its aspect ratio and (re)allocates the buffers and the surface
+        whenever that size changes. The surface shares its memory with the RGB buffer. Only for internal usage.
+        """
+        height, width = frame.shape[:2]
+        window_width, window_height = self._screen.get_size()
+        self._scale = min(window_width / width, window_height / height)
+        shape = (max(int(height * self._scale), 1), max(int(width * self._scale), 1))
+
+        if self._rgb_buffer is None or self._rgb_buffer.shape[:2] != shape:
+            self._rgb_buffer = numpy.empty(shape + (3,), numpy.uint8)
+            self._mono_buffer = numpy.empty(shape, numpy.uint8)
+            self._surface = self._pygame.image.frombuffer(self._rgb_buffer, (shape[1], shape[0]), "RGB")
+
+    def _resize(self, frame: Frame, buffer: Frame) -> Frame:
+        """
+        Scales a frame into a buffer. Bilinear interpolation: area averaging is several times slower for non-integer
+        factors and the beam profile is smooth anyway. Only for internal usage.
+        """
+        if frame.shape[:2] == buffer.shape[:2]:
+            numpy.copyto(buffer, frame)
+        else:
+            cv2.resize(frame, (buffer.shape[1], buffer.shape[0]), dst=buffer, interpolation=cv2.INTER_LINEAR)
+        return buffer
+
+    def _draw_overlay(self, overlay: Overlay, width: int) -> None:
+        """
+        Draws the fit center and the 1 sigma ellipse. The displayed image is mirrored horizontally like it always was
+        (numpy.rot90 before pygame.surfarray.make_surface), so is the overlay. Only for internal usage.
+        """
+        x = width - 1 - (overlay.center_x + 0.5) * self._scale + 0.5
+        y = (overlay.center_y + 0.5) * self._scale - 0.5
+        sigma_x = max(overlay.sigma_x * self._scale, 1.0)
+        sigma_y = max(overlay.sigma_y * self._scale, 1.0)
+        if not all(numpy.isfinite((x, y, sigma_x, sigma_y))):
+            return
+
+        pygame = self._pygame
+        pygame.draw.line(self._screen, self.OVERLAY_COLOR, (x - 10, y), (x + 10, y))
+        pygame.draw.line(self._screen, self.OVERLAY_COLOR, (x, y - 10), (x, y + 10))
+        pygame.draw.ellipse(self._screen, self.OVERLAY_COLOR, pygame.Rect(x - sigma_x, y - sigma_y, 2 * sigma_x, 2 * sigma_y), 1)
+
+        if self._font is None:
+            pygame.font.init()
+            self._font = pygame.font.Font(None, 22)
+        label = f"x {overlay.center_x:.1f}  σx {overlay.sigma_x:.1f}   y {overlay.center_y:.1f}  σy {overlay.sigma_y:.1f}"
+        self._screen.blit(self._font.render(label, True, self.OVERLAY_COLOR), (8, self._screen.get_height() - 24))
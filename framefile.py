@@ -0,0 +1,232 @@
+from __future__ import annotations
+from dataclasses import asdict
+from typing import Any
+
+from utils import Frame, FrameData, CaptureFormat, CameraConfig
+
+import numpy
+import json
+import os
+
+INDEX_DTYPE = numpy.dtype([
+    ("frame_id", numpy.int64),
+    ("timestamp", numpy.int64),
+    ("exposure_time", numpy.float64),
+])
+"""
+Row of the sidecar index. Row i describes frame i of the raw file.
+"""
+
+HEADER_SIZE = 4096
+"""
+Size of the zero padded header in front of the frames. Page aligned, so the frames can be memory-mapped directly.
+"""
+
+MAGIC = b"CAMVRAW1"
+
+def index_path(path: str) -> str:
+    return path + ".idx"
+
+class FrameWriter:
+    """
+    Appends every frame to a preallocated, memory-mapped raw file. Writing a frame is a plain memory copy into the
+    page cache, nothing is encoded on the hot path. A sidecar index maps every frame to its frame id and timestamp.
+
+    File layout: MAGIC, the JSON header padded to HEADER_SIZE bytes, then the frames back to back in their capture format.
+    """
+    def __init__(self, path: str, header: dict[str, Any], capacity: int, grow_by: int):
+        """
+        **DO NOT USE!** Constructor for FrameWriter class is only for internal usage.
+        Use FrameWriter.create(...) instead!
+        """
+        self._path = path
+        self._header = header
+        self._shape = tuple(header["shape"])
+        self._frame_size = header["frame_size"]
+        self._capacity = 0
+        self._grow_by = grow_by
+        self._count = 0
+        self._frames: numpy.memmap | None = None
+        self._index_file = open(index_path(path), "wb")
+        self._allocate(capacity)
+
+    @classmethod
+    def create(cls, path: str, camera_config: CameraConfig, capture_format: CaptureFormat, capacity: int = 1024, grow_by: int = 1024) -> FrameWriter:
+        """
+        Creates the raw file and its index. The frame geometry is taken from the camera config.
+
+        :param path: Path of the raw file. The index is written next to it with an additional .idx extension.
+        :type path: str
+        :param camera_config: Config of the recording camera; width, height and offsets (ROI) are stored in the header.
+        :type camera_config: CameraConfig
+        :param capture_format: Pixel format of the recorded frames.
+        :type capture_format: CaptureFormat
+        :param capacity: Number of frames preallocated on disk.
+        :type capacity: int
+        :param grow_by: Number of frames the file grows by once it is full.
+        :type grow_by: int
+        :return: FrameWriter object.
+        :rtype: FrameWriter
+        """
+        channels = 3 if capture_format == CaptureFormat.RGB8 else 1
+        shape = (camera_config.height, camera_config.width) + ((channels,) if channels > 1 else ())
+        header = {
+            "capture_format": capture_format,
+            "shape": shape,
+            "frame_size": int(numpy.prod(shape)),
+            "dtype": "uint8",
+            "header_size": HEADER_SIZE,
+            "camera_config": asdict(camera_config),
+        }
+        encoded = json.dumps(header, default=str).encode()
+        if len(MAGIC) + len(encoded) > HEADER_SIZE:
+            raise ValueError("Raw file header too large")
+
+        with open(path, "wb") as file:
+            file.write(MAGIC)
+            file.write(encoded.ljust(HEADER_SIZE - len(MAGIC), b"\0"))
+        return cls(path, header, capacity, grow_by)
+
+    def write(self, frame_data: FrameData, frame: Frame) -> int:
+        """
+        Copies a frame into the next slot of the raw file.
+
+        :raises ValueError: The frame does not match the geometry of the file.
+        :return: Position of the frame in the file.
+        :rtype: int
+        """
+        if frame.shape != self._shape:
+            raise ValueError(f"Frame of shape {frame.shape} does not fit into raw file of shape {self._shape}")
+        if self._count == self._capacity:
+            self._allocate(self._capacity + self._grow_by)
+
+        self._frames[self._count] = frame
+        self._index_file.write(numpy.array(
+            (frame_data.frame_id, frame_data.timestamp, frame_data.exposure_time), INDEX_DTYPE
+        ).tobytes())
+        self._count += 1
+        return self._count - 1
+
+    def flush(self) -> None:
+        self._frames.flush()
+        self._index_file.flush()
+
+    def close(self) -> None:
+        """
+        Flushes the frames and the index and trims the unused preallocated space.
+        """
+        self.flush()
+        self._frames = None
+        self._index_file.close()
+        with open(self._path, "r+b") as file:
+            file.truncate(HEADER_SIZE + self._count * self._frame_size)
+
+    @property
+    def count(self) -> int:
+        return self._count
+
+    def _allocate(self, capacity: int) -> None:
+        """
+        Grows the file to the capacity and maps it again. Only for internal usage.
+        """
+        if self._frames is not None:
+            self._frames.flush()
+            self._frames = None
+        with open(self._path, "r+b") as file:
+            file.truncate(HEADER_SIZE + capacity * self._frame_size)
+        self._frames = numpy.memmap(self._path, numpy.uint8, "r+", HEADER_SIZE, (capacity,) + self._shape)
+        self._capacity = capacity
+
+class FrameReader:
+    """
+    Opens a raw file written by FrameWriter. Frames are memory-mapped, so any frame is reached in O(1) without reading the others.
+    """
+    def __init__(self, frames: numpy.memmap, index: numpy.ndarray, header: dict[str, Any]):
+        """
+        **DO NOT USE!** Constructor for FrameReader class is only for internal usage.
+        Use FrameReader.open(...) instead!
+        """
+        self._frames = frames
+        self._index = index
+        self._header = header
+
+    @classmethod
+    def open(cls, path: str) -> FrameReader:
+        """
+        Maps a raw file and loads its index. Frames without an index row (e.g. after a crash) are not exposed.
+
+        :param path: Path of the raw file.
+        :type path: str
+        :raises ValueError: The file is not a raw file.
+        :return: FrameReader object.
+        :rtype: FrameReader
+        """
+        header = read_header(path)
+        shape = tuple(header["shape"])
+        index = numpy.fromfile(index_path(path), INDEX_DTYPE)
+        stored = (os.path.getsize(path) - HEADER_SIZE) // header["frame_size"]
+        index = index[:stored]
+        frames = numpy.memmap(path, numpy.uint8, "r", HEADER_SIZE, (len(index),) + shape) if len(index) else numpy.empty((0,) + shape, numpy.uint8)
+        return cls(frames, index, header)
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def __getitem__(self, position: int) -> tuple[FrameData, Frame]:
+        """
+        Frame data and zero-copy frame at a position of the file.
+        """
+        row = self._index[position]
+        frame_data = FrameData(int(row["frame_id"]), int(row["timestamp"]), float(row["exposure_time"]), self._header["capture_format"])
+        return frame_data, self._frames[position]
+
+    def find(self, frame_id: int) -> int:
+        """
+        Position of a frame id in the file.
+
+        :raises KeyError: The frame was not recorded.
+        """
+        position = int(numpy.searchsorted(self._index["frame_id"], frame_id))
+        if position == len(self._index) or self._index["frame_id"][position] != frame_id:
+            raise KeyError(frame_id)
+        return position
+
+    def find_time(self, timestamp: int) -> int:
+        """
+        Position of the first frame taken at or after a timestamp (camera timestamp in nanoseconds).
+
+        :raises KeyError: No frame was taken at or after the timestamp.
+        """
+        position = int(numpy.searchsorted(self._index["timestamp"], timestamp))
+        if position == len(self._index):
+            raise KeyError(timestamp)
+        return position
+
+    def offset(self, position: int) -> int:
+        """
+        Byte offset of the frame at a position in the raw file, for readers that do not use numpy.
+        """
+        return self._header["header_size"] + position * self._header["frame_size"]
+
+    @property
+    def frames(self) -> numpy.memmap:
+        return self._frames
+
+    @property
+    def index(self) -> numpy.ndarray:
+        return self._index
+
+    @property
+    def header(self) -> dict[str, Any]:
+        return self._header
+
+def read_header(path: str) -> dict[str, Any]:
+    """
+    Reads the JSON header of a raw file.
+
+    :raises ValueError: The file is not a raw file.
+    """
+    with open(path, "rb") as file:
+        if file.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not a raw frame file")
+        return json.loads(file.read(HEADER_SIZE - len(MAGIC)).rstrip(b"\0"))
@@ -0,0 +1,376 @@
+from __future__ import annotations
+from dataclasses import dataclass, field, replace
+from collections import deque
+from typing import Callable
+
+from camera import Camera, CameraConfig
+from simulator import SimulatedCamera
+from context import Context
+from stage import Stage, StageQueue, StageClosed, DropPolicy
+from utils import Frame, FrameData, except_continue, except_raise
+
+from functools import partial
+import threading
+import time
+
+@dataclass
+class TriggerConfig:
+    """
+    Hardware trigger shared by all cameras of a MultiCamera. Every exposure is started by the signal on the input line,
+    so the cameras expose simultaneously and their frames match one to one.
+    """
+    source: str = "Line0"
+    """
+    Trigger input line of the cameras (see Camera.set_trigger).
+    """
+
+@dataclass
+class MatchedFrames:
+    """
+    Frames of all cameras that belong to the same moment. The frames are pooled buffers; hand them back with MultiCamera.release(...).
+    """
+    timestamp: int
+    """
+    Timestamp of the earliest frame in nanoseconds, on the common clock of the MultiCamera.
+    """
+    skew: int
+    """
+    Timestamp difference between the latest and the earliest frame in nanoseconds.
+    """
+    frames: dict[str, tuple[FrameData, Frame]]
+
+@dataclass
+class CameraStats:
+    frames: int = 0
+    """
+    Number of acquired frames.
+    """
+    missed: int = 0
+    """
+    Number of frames the camera exposed but never delivered (gaps in the frame ids).
+    """
+    incomplete: int = 0
+    """
+    Number of failed acquisitions (incomplete images, timeouts).
+    """
+    unmatched: int = 0
+    """
+    Number of acquired frames without a partner from every other camera.
+    """
+
+@dataclass
+class MultiCameraStats:
+    cameras: dict[str, CameraStats] = field(default_factory=dict)
+    matched: int = 0
+    """
+    Number of emitted MatchedFrames.
+    """
+    max_skew: int = 0
+    """
+    Largest skew of all MatchedFrames in nanoseconds.
+    """
+    mean_skew: float = 0.0
+    """
+    Mean skew of all MatchedFrames in nanoseconds.
+    """
+
+class FrameMatcher:
+    """
+    Matches frames of several cameras by their timestamps on a common clock. Frames arrive in timestamp order per camera;
+    the earliest pending frames of all cameras form a match if they lie within the tolerance. A frame that cannot be
+    matched anymore (all other cameras are already past it) is dropped.
+    """
+    def __init__(self, names: tuple[str, ...], tolerance: int, max_pending: int, on_drop: Callable[[str, tuple[FrameData, Frame]], None]):
+        """
+        **DO NOT USE!** Constructor for FrameMatcher class is only for internal usage.
+        Use FrameMatcher.create(...) instead!
+        """
+        self._names = names
+        self._tolerance = tolerance
+        self._max_pending = max_pending
+        self._on_drop = on_drop
+        self._pending: dict[str, deque[tuple[int, FrameData, Frame]]] = {name: deque() for name in names}
+
+    @classmethod
+    def create(cls, names: tuple[str, ...], tolerance: int, max_pending: int = 16, on_drop: Callable[[str, tuple[FrameData, Frame]], None] | None = None) -> FrameMatcher:
+        """
+        Creates a FrameMatcher.
+
+        :param names: Names of the matched cameras.
+        :type names: tuple[str, ...]
+        :param tolerance: Maximum timestamp difference of matching frames in nanoseconds.
+        :type tolerance: int
+        :param max_pending: Maximum number of frames waiting for their partners per camera, e.g. while another camera stalls.
+        :type max_pending: int
+        :param on_drop: Callback receiving the camera name and every frame that is not matched.
+        :type on_drop: Callable[[str, tuple[FrameData, Frame]], None] | None
+        :return: FrameMatcher object.
+        :rtype: FrameMatcher
+        """
+        return cls(names, tolerance, max_pending, on_drop if on_drop is not None else lambda name, item: None)
+
+    def add(self, name: str, frame_data: FrameData, frame: Frame, timestamp: int) -> list[MatchedFrames]:
+        """
+        Adds a frame of a camera.
+
+        :param timestamp: Timestamp of the frame on the common clock in nanoseconds.
+        :type timestamp: int
+        :return: Matches completed by this frame, oldest first.
+        :rtype: list[MatchedFrames]
+        """
+        pending = self._pending[name]
+        pending.append((timestamp, frame_data, frame))
+        if len(pending) > self._max_pending:
+            self._drop(name)
+
+        matches = []
+        while all(self._pending.values()):
+            heads = [self._pending[name][0][0] for name in self._names]
+            earliest, latest = min(heads), max(heads)
+            if latest - earliest <= self._tolerance:
+                frames = {}
+                for name in self._names:
+                    _, frame_data, frame = self._pending[name].popleft()
+                    frames[name] = (frame_data, frame)
+                matches.append(MatchedFrames(earliest, latest - earliest, frames))
+                continue
+            for name, head in zip(self._names, heads):
+                if head < latest - self._tolerance:
+                    self._drop(name)
+        return matches
+
+    def drain(self) -> None:
+        """
+        Drops all pending frames.
+        """
+        for name in self._names:
+            while self._pending[name]:
+                self._drop(name)
+
+    def _drop(self, name: str) -> None:
+        """
+        Drops the earliest pending frame of a camera. Only for internal usage.
+        """
+        _, frame_data, frame = self._pending[name].popleft()
+        self._on_drop(name, (frame_data, frame))
+
+ACQUISITION_TIMEOUT = 500
+"""
+Timeout in milliseconds for a single acquisition, so that the acquisition threads can notice stop().
+"""
+ARRIVAL_QUEUE_SIZE = 64
+"""
+Number of acquired frames (of all cameras) the matcher may fall behind before the acquisition threads wait for it.
+"""
+MATCHED_QUEUE_SIZE = 16
+"""
+Number of matched frame sets waiting for the consumer before the matcher waits for it.
+"""
+
+class MultiCamera:
+    """
+    Acquires several cameras in one process: one Spinnaker system, one acquisition thread per camera and a matcher
+    thread that pairs the frames of all cameras by timestamp. Nothing is dropped between the stages; if the consumer
+    falls behind, the acquisition threads wait and the cameras' own buffers decide (gaps show up in the stats).
+    """
+    def __init__(self, context: Context, cameras: dict[str, Camera | SimulatedCamera], trigger: TriggerConfig | None, tolerance: int | None):
+        """
+        **DO NOT USE!** Constructor for MultiCamera class is only for internal usage.
+        Use MultiCamera.create(...) instead!
+        """
+        self._context = context
+        self._cameras = cameras
+        self._trigger = trigger
+        self._tolerance = tolerance
+        self._clock_offsets: dict[str, int] = {name: 0 for name in cameras}
+        self._stats = MultiCameraStats({name: CameraStats() for name in cameras})
+        self._stats_lock = threading.Lock()
+        self._last_frame_ids: dict[str, int | None] = {name: None for name in cameras}
+        self._arrival_queue = StageQueue.create(ARRIVAL_QUEUE_SIZE, DropPolicy.BLOCK, on_drop=self._release_arrival)
+        self._matched_queue = StageQueue.create(MATCHED_QUEUE_SIZE, DropPolicy.BLOCK, on_drop=self.release)
+        self._stages: list[Stage] = []
+
+    @classmethod
+    def create(cls, names: list[str], configs: dict[str, CameraConfig] | None = None, trigger: TriggerConfig | None = None, tolerance: int | None = None) -> MultiCamera:
+        """
+        Discovers the cameras once and sets up the named ones.
+
+        :param names: Camera names as listed in the camera map.
+        :type names: list[str]
+        :param configs: Optional camera config per name.
+        :type configs: dict[str, CameraConfig] | None
+        :param trigger: Optional hardware trigger shared by all cameras. Free running if None.
+        :type trigger: TriggerConfig | None
+        :param tolerance: Maximum timestamp difference of matching frames in nanoseconds. Defaults to half the shortest frame period.
+        :type tolerance: int | None
+        :raises Exception: A camera is not connected or cannot be set up.
+        :return: MultiCamera object, not acquiring yet.
+        :rtype: MultiCamera
+        """
+        context = Context.create(search=False)
+        cameras: dict[str, Camera | SimulatedCamera] = {}
+        try:
+            for name in names:
+                camera = context.get_camera(name)
+                cameras[name] = camera
+                camera.setup(auto_off=True)
+                if configs is not None and name in configs:
+                    camera.config = configs[name]
+        except Exception:
+            for camera in cameras.values():
+                camera.deinit()
+            context.release()
+            raise
+        return cls(context, cameras, trigger, tolerance)
+
+    @property
+    def names(self) -> tuple[str, ...]:
+        return tuple(self._cameras)
+
+    @property
+    def cameras(self) -> dict[str, Camera | SimulatedCamera]:
+        return self._cameras
+
+    def start(self) -> None:
+        """
+        Starts the acquisition of all cameras. The timestamp clocks are reset back to back; the remaining offsets between
+        them are measured on the host clock and removed from the timestamps used for matching.
+        """
+        for camera in self._cameras.values():
+            camera.set_trigger(self._trigger.source if self._trigger is not None else None)
+
+        reset_times = {}
+        for name, camera in self._cameras.items():
+            camera.reset_timestamp()
+            reset_times[name] = time.perf_counter_ns()
+        reference = min(reset_times.values())
+        self._clock_offsets = {name: reset_time - reference for name, reset_time in reset_times.items()}
+
+        tolerance = self._tolerance
+        if tolerance is None:
+            frame_rate = max(camera.config.frame_rate for camera in self._cameras.values())
+            tolerance = int(0.5e9 / frame_rate)
+        matcher = FrameMatcher.create(self.names, tolerance, on_drop=self._unmatched)
+
+        with except_raise("Cannot begin multi camera acquisition"):
+            for camera in self._cameras.values():
+                camera.begin(reset_timestamp=False)
+
+        self._stages = [
+            Stage.create(f"acquisition-{name}", partial(self._acquisition_stage, name, camera))
+            for name, camera in self._cameras.items()
+        ]
+        self._stages.append(Stage.create("matcher", partial(self._matcher_stage, matcher)))
+        for stage in self._stages:
+            stage.start()
+
+    def get(self, timeout: float | None = None) -> MatchedFrames:
+        """
+        Takes the next set of matched frames, oldest first. Release it with release(...) once it is processed.
+
+        :raises queue.Empty: No match within the timeout.
+        :raises RuntimeError: A camera or the matcher failed.
+        """
+        for stage in self._stages:
+            stage.check()
+        return self._matched_queue.get(timeout)
+
+    def release(self, matched: MatchedFrames) -> None:
+        """
+        Hands the frames of a match back to the frame pools of their cameras.
+        """
+        for name, (_, frame) in matched.frames.items():
+            self._cameras[name].release(frame)
+
+    @property
+    def stats(self) -> MultiCameraStats:
+        """
+        Snapshot of the acquisition and matching statistics.
+        """
+        with self._stats_lock:
+            return replace(self._stats, cameras={name: replace(stats) for name, stats in self._stats.cameras.items()})
+
+    def stop(self) -> None:
+        """
+        Stops the acquisition of all cameras and releases every frame still in the pipeline.
+        """
+        acquisition, matcher = self._stages[:-1], self._stages[-1:]
+        for stage in acquisition:
+            stage.stop()
+        self._matched_queue.close()
+        for stage in acquisition:
+            stage.join()
+        self._arrival_queue.close()
+        for stage in matcher:
+            stage.join()
+        for matched in self._matched_queue.drain():
+            self.release(matched)
+        for name, camera in self._cameras.items():
+            with except_continue(f"Cannot end acquisition of {name}"):
+                camera.end()
+        self._stages = []
+
+    def close(self) -> None:
+        """
+        Nessessary for cleanup. Deinitializes the cameras and releases the Spinnaker system.
+        """
+        for camera in self._cameras.values():
+            camera.deinit()
+        self._cameras = {}
+        self._context.release()
+
+    def _acquisition_stage(self, name: str, camera: Camera | SimulatedCamera, stop: threading.Event) -> None:
+        """
+        Acquisition thread of one camera. Moves the timestamps onto the common clock. Only for internal usage.
+        """
+        stats = self._stats.cameras[name]
+        offset = self._clock_offsets[name]
+        while not stop.is_set():
+            try:
+                frame_data, frame = camera.acquire(ACQUISITION_TIMEOUT)
+            except Exception:
+                with self._stats_lock:
+                    stats.incomplete += 1
+                continue
+
+            last_frame_id = self._last_frame_ids[name]
+            with self._stats_lock:
+                stats.frames += 1
+                if last_frame_id is not None and frame_data.frame_id > last_frame_id + 1:
+                    stats.missed += frame_data.frame_id - last_frame_id - 1
+            self._last_frame_ids[name] = frame_data.frame_id
+            self._arrival_queue.put((name, frame_data, frame, frame_data.timestamp + offset))
+
+    def _matcher_stage(self, matcher: FrameMatcher, stop: threading.Event) -> None:
+        """
+        Matcher thread. Runs until the arrival queue is closed. Only for internal usage.
+        """
+        try:
+            while True:
+                try:
+                    name, frame_data, frame, timestamp = self._arrival_queue.get()
+                except StageClosed:
+                    break
+                for matched in matcher.add(name, frame_data, frame, timestamp):
+                    with self._stats_lock:
+                        stats = self._stats
+                        stats.mean_skew += (matched.skew - stats.mean_skew) / (stats.matched + 1)
+                        stats.matched += 1
+                        stats.max_skew = max(stats.max_skew, matched.skew)
+                    self._matched_queue.put(matched)
+        finally:
+            matcher.drain()
+
+    def _unmatched(self, name: str, item: tuple[FrameData, Frame]) -> None:
+        """
+        Drop callback of the matcher. Only for internal usage.
+        """
+        with self._stats_lock:
+            self._stats.cameras[name].unmatched += 1
+        self._cameras[name].release(item[1])
+
+    def _release_arrival(self, item: tuple[str, FrameData, Frame, int]) -> None:
+        """
+        Drop callback of the arrival queue (only used once it is closed). Only for internal usage.
+        """
+        self._cameras[item[0]].release(item[2])
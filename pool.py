@@ -0,0 +1,108 @@
+from __future__ import annotations
+
+from utils import Frame
+
+import numpy
+import threading
+
+class FramePool:
+    """
+    Pool of preallocated frame buffers with reference counting. A buffer taken from the pool is handed to the consuming
+    stages and returns to the pool once every holder released it, so acquisition does not allocate a frame per image.
+    """
+    def __init__(self, shape: tuple[int, ...], capacity: int, dtype: numpy.dtype):
+        """
+        **DO NOT USE!** Constructor for FramePool class is only for internal usage.
+        Use FramePool.create(...) instead!
+        """
+        self._shape = shape
+        self._capacity = capacity
+        self._dtype = dtype
+        self._lock = threading.Lock()
+        self._free: list[Frame] = []
+        self._refs: dict[int, list] = {}
+        self._allocated = 0
+
+    @classmethod
+    def create(cls, shape: tuple[int, ...], capacity: int, preallocate: int = 0, dtype: numpy.dtype = numpy.uint8) -> FramePool:
+        """
+        Creates a FramePool. Buffers are allocated on demand up to the capacity; beyond it, frames are allocated
+        without being pooled.
+
+        :param shape: Shape of every buffer.
+        :type shape: tuple[int, ...]
+        :param capacity: Maximum number of pooled buffers.
+        :type capacity: int
+        :param preallocate: Number of buffers allocated right away.
+        :type preallocate: int
+        :return: FramePool object.
+        :rtype: FramePool
+        """
+        pool = cls(tuple(shape), capacity, dtype)
+        with pool._lock:
+            for _ in range(min(preallocate, capacity)):
+                pool._free.append(numpy.empty(pool._shape, dtype))
+                pool._allocated += 1
+        return pool
+
+    def take(self) -> Frame:
+        """
+        Takes a buffer out of the pool. The caller holds the single reference to it.
+        """
+        with self._lock:
+            if self._free:
+                frame = self._free.pop()
+            elif self._allocated < self._capacity:
+                frame = numpy.empty(self._shape, self._dtype)
+                self._allocated += 1
+            else:
+                return numpy.empty(self._shape, self._dtype)
+            self._refs[id(frame)] = [frame, 1]
+            return frame
+
+    def retain(self, frame: Frame, count: int = 1) -> None:
+        """
+        Adds references to a pooled buffer, one for every additional holder. Frames not taken from this pool are ignored.
+        """
+        with self._lock:
+            entry = self._refs.get(id(frame))
+            if entry is not None:
+                entry[1] += count
+
+    def release(self, frame: Frame) -> None:
+        """
+        Drops one reference to a pooled buffer. The buffer returns to the pool with its last reference.
+        Frames not taken from this pool are ignored.
+        """
+        with self._lock:
+            entry = self._refs.get(id(frame))
+            if entry is None or entry[0] is not frame:
+                return
+            entry[1] -= 1
+            if entry[1] > 0:
+                return
+            del self._refs[id(frame)]
+            if frame.shape == self._shape:
+                self._free.append(frame)
+            else:
+                self._allocated -= 1
+
+    def resize(self, shape: tuple[int, ...]) -> None:
+        """
+        Changes the buffer shape. Free buffers are dropped right away, buffers in use once they are released.
+        """
+        shape = tuple(shape)
+        with self._lock:
+            if shape == self._shape:
+                return
+            self._allocated -= len(self._free)
+            self._free.clear()
+            self._shape = shape
+
+    @property
+    def shape(self) -> tuple[int, ...]:
+        return self._shape
+
+    @property
+    def in_use(self) -> int:
+        return len(self._refs)
@@ -2,7 +2,11 @@ from __future__ import annotations
 from typing import TypeAlias, Callable
 
 from utils import Frame
+from background import Background, get_background
 
+import inspect
+import numpy
+import math
 import cv2
 from functools import partial
 
@@ -32,9 +36,18 @@ def median(frame: Frame, ksize: int) -> Frame:
 def subtract(frame: Frame, sub: Frame) -> Frame:
     return cv2.subtract(frame, sub)
 
-def threshold(frame: Frame, value: int) -> Frame:
-    frame[frame < value] = 0
-    return frame
+def subtract_background(frame: Frame, background: Background) -> Frame:
+    """
+    Subtracts the current state of a live background. Frames pass unchanged while there is no background yet.
+    """
+    sub = background.resolve(frame.shape)
+    return frame if sub is None else cv2.subtract(frame, sub)
+
+def threshold(frame: Frame, value: int, dst: Frame | None = None) -> Frame:
+    """
+    Sets every pixel below the value to 0. Does not modify the passed frame unless it is passed as dst as well.
+    """
+    return cv2.threshold(frame, math.ceil(value) - 1, 255, cv2.THRESH_TOZERO, dst=dst)[1]
 
 def crop(frame: Frame, width: int, height: int, offset_x: int, offset_y: int) -> Frame:
     return frame[offset_y:offset_y + height, offset_x:offset_x + width]
@@ -56,8 +69,11 @@ class ProcessFilter:
         return partial(median, ksize=ksize)
     
     def SUBSTRACT(camera_name: str) -> FrameFilter:
-        sub = cv2.imread(f"./config/{camera_name}.png")
-        return partial(subtract, sub=sub)
+        """
+        Returns a FrameFilter function object that subtracts the live background of a camera (see background.Background).
+        The filter references the background, so updates apply without rebuilding the pipeline.
+        """
+        return partial(subtract_background, background=get_background(camera_name))
     
     def CROP(width: int, height: int, offset_x: int, offset_y: int) -> FrameFilter:
         return partial(crop, width=width, height=height, offset_x=offset_x, offset_y=offset_y)
@@ -67,13 +83,168 @@ class ProcessFilter:
 
 Pipeline: TypeAlias = tuple[FrameFilter, ...]
 
+Region: TypeAlias = tuple[int, int, int, int]
+"""
+Rectangle (x0, y0, x1, y1) in pixels of the frame passed to Processor.process.
+"""
+
+COMPILED_FILTERS = (median, subtract, subtract_background, threshold, crop)
+"""
+Filter functions the Processor compiles. Any other filter is applied as it is and splits the pipeline into separately compiled segments.
+"""
+
+def filter_args(filter: FrameFilter) -> tuple[Callable, dict[str, object]] | None:
+    """
+    Filter function and its bound arguments if the filter is one of the COMPILED_FILTERS, None otherwise.
+    """
+    if not isinstance(filter, partial) or filter.func not in COMPILED_FILTERS:
+        return None
+    arguments = inspect.signature(filter.func).bind_partial(None, *filter.args, **filter.keywords).arguments
+    arguments.pop("frame")
+    return filter.func, arguments
+
+def _view(frame: Frame, region: Region, origin: Region) -> Frame:
+    """
+    View of a region of a frame that itself covers the origin region. Only for internal usage.
+    """
+    return frame[region[1] - origin[1]:region[3] - origin[1], region[0] - origin[0]:region[2] - origin[0]]
+
+def _median_step(frame: Frame, ksize: int, dst: Frame, region: Region, origin: Region) -> Frame:
+    return _view(cv2.medianBlur(frame, ksize, dst=dst), region, origin)
+
+def _subtract_step(frame: Frame, sub: Frame, dst: Frame | None, value: int | None) -> Frame:
+    dst = frame if dst is None else dst
+    cv2.subtract(frame, sub, dst=dst)
+    if value is not None:
+        threshold(dst, value, dst)
+    return dst
+
+def _background_step(frame: Frame, background: Background, shape: tuple[int, ...], region: Region, origin: Region, dst: Frame | None, value: int | None) -> Frame:
+    sub = background.resolve(shape)
+    if sub is not None:
+        return _subtract_step(frame, _view(sub, region, origin), dst, value)
+    dst = frame if dst is None else dst
+    if value is not None:
+        return threshold(frame, value, dst)
+    if dst is not frame:
+        numpy.copyto(dst, frame)
+    return dst
+
+def _threshold_step(frame: Frame, value: int, dst: Frame | None) -> Frame:
+    return threshold(frame, value, frame if dst is None else dst)
+
+def compile_segment(filters: Pipeline, shape: tuple[int, ...], dtype: numpy.dtype) -> Callable[[Frame], Frame] | None:
+    """
+    Compiles a sequence of COMPILED_FILTERS for frames of one shape into steps with preallocated output buffers:
+
+    - Crops are resolved first, so every filter only works on the part of the frame that reaches the output.
+      Subtract and threshold are pointwise; a median needs a margin of ksize // 2 around the kept part, which is
+      clipped to the frame it sees in the original order, so border pixels are replicated exactly as before.
+    - A subtract followed by a threshold runs on one buffer without an intermediate frame. A live background is
+      looked up on every call, so its updates apply to the compiled steps as well.
+    - The passed frame is never written to; later filters work in place on the buffer of the previous one.
+
+    The steps produce exactly the output of the uncompiled filters.
+
+    :return: Function applying the compiled steps, or None if the filters cannot be compiled for this shape
+             (negative crops, an empty output or a subtracted frame that does not match).
+    :rtype: Callable[[Frame], Frame] | None
+    """
+    operations = [filter_args(filter) for filter in filters]
+    height, width = shape[:2]
+    channels = tuple(shape[2:])
+
+    # Region of the input frame that each filter sees in the original order.
+    regions: list[Region] = []
+    region = (0, 0, width, height)
+    for func, args in operations:
+        regions.append(region)
+        if func is crop:
+            if min(args["width"], args["height"], args["offset_x"], args["offset_y"]) < 0:
+                return None
+            x0, y0, x1, y1 = region
+            region = (
+                x0 + min(args["offset_x"], x1 - x0),
+                y0 + min(args["offset_y"], y1 - y0),
+                x0 + min(args["offset_x"] + args["width"], x1 - x0),
+                y0 + min(args["offset_y"] + args["height"], y1 - y0)
+            )
+    output = region
+    if output[2] <= output[0] or output[3] <= output[1]:
+        return None
+
+    # Region each filter has to compute so that the output is exact, walking backwards from the output.
+    needs: list[Region] = [output] * len(operations)
+    need = output
+    for index in reversed(range(len(operations))):
+        func, args = operations[index]
+        if func is median:
+            margin = args["ksize"] // 2
+            x0, y0, x1, y1 = regions[index]
+            need = (max(need[0] - margin, x0), max(need[1] - margin, y0), min(need[2] + margin, x1), min(need[3] + margin, y1))
+        needs[index] = need
+
+    def buffer(region: Region) -> Frame:
+        return numpy.empty((region[3] - region[1], region[2] - region[0]) + channels, dtype)
+
+    start = needs[0] if operations else output
+    steps: list[Callable[[Frame], Frame]] = []
+    owned = False
+    index = 0
+    while index < len(operations):
+        func, args = operations[index]
+        need = needs[index]
+        after = needs[index + 1] if index + 1 < len(operations) else output
+        if func is median:
+            steps.append(partial(_median_step, ksize=args["ksize"], dst=buffer(need), region=after, origin=need))
+            owned = after == need
+        elif func is subtract or func is subtract_background:
+            seen = regions[index]
+            seen_shape = (seen[3] - seen[1], seen[2] - seen[0]) + channels
+            value = None
+            following = next((later for later in range(index + 1, len(operations)) if operations[later][0] is not crop), None)
+            if following is not None and operations[following][0] is threshold:
+                value = operations[following][1]["value"]
+            dst = None if owned else buffer(need)
+
+            if func is subtract:
+                sub = args["sub"]
+                if sub is None or sub.dtype != dtype or sub.shape != seen_shape:
+                    return None
+                steps.append(partial(_subtract_step, sub=_view(sub, need, seen), dst=dst, value=value))
+            else:
+                if dtype != numpy.uint8 or channels:
+                    return None
+                steps.append(partial(_background_step, background=args["background"], shape=seen_shape, region=need, origin=seen, dst=dst, value=value))
+            owned = True
+            if value is not None:
+                index = following
+        elif func is threshold:
+            steps.append(partial(_threshold_step, value=args["value"], dst=None if owned else buffer(need)))
+            owned = True
+        index += 1
+
+    def run(frame: Frame) -> Frame:
+        frame = _view(frame, start, (0, 0, width, height))
+        for step in steps:
+            frame = step(frame)
+        return frame
+    return run
+
 class Processor:
+    COMPILED_CACHE_SIZE = 16
+    """
+    Maximum number of compiled segments kept (one per frame shape and region of interest).
+    """
+
     def __init__(self, filters: Pipeline):
         """
         **DO NOT USE!** Constructor for Processor class is only for internal usage.
         Use Processor.create(...) instead
         """
         self._filters = filters
+        self._segments = self._split(filters)
+        self._compiled: dict[tuple, Callable[[Frame], Frame] | None] = {}
 
     @classmethod
     def create(cls, *filters: FrameFilter) -> Processor:
@@ -89,8 +260,76 @@ class Processor:
     
     def updated_pipline(self, filters: Pipeline) -> None:
         self._filters = filters
-    
-    def process(self, frame: Frame) -> Frame:
+        self._segments = self._split(filters)
+        self._compiled = {}
+
+    @property
+    def offset(self) -> tuple[int, int]:
+        """
+        Position (x, y) of the processed frame within the unprocessed one, i.e. the summed offsets of all crop filters.
+        """
+        offset_x, offset_y = 0, 0
         for filter in self._filters:
-            frame = filter(frame)
-        return frame
\ No newline at end of file
+            if isinstance(filter, partial) and filter.func is crop:
+                offset_x += filter.keywords["offset_x"]
+                offset_y += filter.keywords["offset_y"]
+        return offset_x, offset_y
+    
+    @property
+    def filters(self) -> Pipeline:
+        return self._filters
+
+    def process(self, frame: Frame, roi: Region | None = None) -> Frame:
+        """
+        Applies the pipeline. It is compiled (see compile_segment(...)) on the first frame of every shape.
+        The passed frame is not modified. The returned frame is a view of the passed frame (if no filter changes pixels)
+        or of a buffer of this Processor, which is overwritten by the next call.
+
+        :param frame: Frame to be processed.
+        :type frame: Frame
+        :param roi: Optional region of interest (x0, y0, x1, y1) in pixels of the processed frame. Only this region is
+                    returned, and the compiled filters only compute what it needs. Equals cropping the processed frame.
+        :type roi: Region | None
+        :return: Processed frame.
+        :rtype: Frame
+        """
+        segments = self._segments
+        if roi is not None:
+            roi_crop = partial(crop, width=roi[2] - roi[0], height=roi[3] - roi[1], offset_x=roi[0], offset_y=roi[1])
+            if segments and isinstance(segments[-1], tuple):
+                segments = segments[:-1] + [segments[-1] + (roi_crop,)]
+            else:
+                segments = segments + [(roi_crop,)]
+
+        for index, segment in enumerate(segments):
+            if not isinstance(segment, tuple):
+                frame = segment(frame)
+                continue
+
+            key = (index, frame.shape, frame.dtype.str, roi if index == len(segments) - 1 else None)
+            if key not in self._compiled:
+                if len(self._compiled) >= self.COMPILED_CACHE_SIZE:
+                    self._compiled.clear()
+                self._compiled[key] = compile_segment(segment, frame.shape, frame.dtype)
+            compiled = self._compiled[key]
+            if compiled is not None:
+                frame = compiled(frame)
+            else:
+                for filter in segment:
+                    frame = filter(frame)
+        return frame
+
+    @staticmethod
+    def _split(filters: Pipeline) -> list[Pipeline | FrameFilter]:
+        """
+        Splits the pipeline into runs of compilable filters and the other filters in between. Only for internal usage.
+        """
+        segments: list[Pipeline | FrameFilter] = []
+        for filter in filters:
+            if filter_args(filter) is None:
+                segments.append(filter)
+            elif segments and isinstance(segments[-1], tuple):
+                segments[-1] += (filter,)
+            else:
+                segments.append((filter,))
+        return segments
@@ -0,0 +1,309 @@
+from __future__ import annotations
+from dataclasses import fields, asdict
+from typing import Any, TypeAlias
+
+import threading
+import numpy
+import json
+import time
+import csv
+import os
+
+class RecordFormat:
+    """
+    Configuration class for the file format records are written in.
+    """
+    CSV = "csv"
+    """
+    One text row per record, readable by any tool. Costs text formatting on every record.
+    """
+    BINARY = "rec"
+    """
+    Fixed-width binary rows written in batches, see BinaryRecorder. Convert with convert_to_csv(...).
+    """
+
+FIELD_TYPES = {
+    "int": numpy.int64,
+    "float": numpy.float64,
+    "bool": numpy.bool_,
+}
+
+def record_dtype(record_type: type) -> numpy.dtype:
+    """
+    Structured dtype with one column per field of a record dataclass, in field order.
+    """
+    return numpy.dtype([(field.name, FIELD_TYPES[str(field.type)]) for field in fields(record_type)])
+
+def record_row(record: Any, names: tuple[str, ...]) -> tuple:
+    """
+    Field values of a record in the given order. Unlike dataclasses.astuple, nothing is copied recursively.
+    """
+    return tuple(getattr(record, name) for name in names)
+
+class CsvRecorder:
+    """
+    Writes records as CSV rows with a header of the field names.
+    """
+    def __init__(self, file, writer, names: tuple[str, ...], flush_interval: float):
+        """
+        **DO NOT USE!** Constructor for CsvRecorder class is only for internal usage.
+        Use CsvRecorder.create(...) instead!
+        """
+        self._file = file
+        self._writer = writer
+        self._names = names
+        self._flush_interval = flush_interval
+        self._last_flush = time.perf_counter()
+
+    @classmethod
+    def create(cls, path: str, record_type: type, flush_interval: float = 0.0) -> CsvRecorder:
+        """
+        Creates the file and writes the header.
+
+        :param path: Path of the record file.
+        :type path: str
+        :param record_type: Dataclass of the written records.
+        :type record_type: type
+        :param flush_interval: Seconds between two flushes to disk. Flushes after every record if 0.
+        :type flush_interval: float
+        :return: CsvRecorder object.
+        :rtype: CsvRecorder
+        """
+        names = tuple(field.name for field in fields(record_type))
+        file = open(path, "w", newline="")
+        writer = csv.writer(file)
+        writer.writerow(names)
+        return cls(file, writer, names, flush_interval)
+
+    def write(self, record: Any) -> None:
+        self._writer.writerow(record_row(record, self._names))
+        now = time.perf_counter()
+        if now - self._last_flush >= self._flush_interval:
+            self._file.flush()
+            self._last_flush = now
+
+    def close(self) -> None:
+        self._file.close()
+
+class BinaryRecorder:
+    """
+    Writes records as fixed-width rows of a structured numpy dtype. Records are collected in a preallocated batch
+    and written to disk when the batch is full or the flush interval has passed.
+
+    File layout: MAGIC, the header length as little-endian uint32, a JSON header (dtype, record type and camera config)
+    and the rows.
+    """
+    MAGIC = b"CAMVREC1"
+
+    def __init__(self, file, dtype: numpy.dtype, batch_size: int, flush_interval: float):
+        """
+        **DO NOT USE!** Constructor for BinaryRecorder class is only for internal usage.
+        Use BinaryRecorder.create(...) instead!
+        """
+        self._file = file
+        self._names = dtype.names
+        self._batch = numpy.zeros(batch_size, dtype)
+        self._count = 0
+        self._flush_interval = flush_interval
+        self._last_flush = time.perf_counter()
+
+    @classmethod
+    def create(cls, path: str, record_type: type, camera_config: Any = None, batch_size: int = 256, flush_interval: float = 1.0) -> BinaryRecorder:
+        """
+        Creates the file and writes the header.
+
+        :param path: Path of the record file.
+        :type path: str
+        :param record_type: Dataclass of the written records. Its fields must be int, float or bool.
+        :type record_type: type
+        :param camera_config: Optional camera config dataclass stored in the header.
+        :param batch_size: Number of records written to disk at once.
+        :type batch_size: int
+        :param flush_interval: Maximum number of seconds a record waits in the batch.
+        :type flush_interval: float
+        :return: BinaryRecorder object.
+        :rtype: BinaryRecorder
+        """
+        dtype = record_dtype(record_type)
+        header = json.dumps({
+            "record_type": record_type.__name__,
+            "dtype": dtype.descr,
+            "camera_config": asdict(camera_config) if camera_config is not None else None,
+        }, default=str).encode()
+
+        file = open(path, "wb")
+        file.write(cls.MAGIC)
+        file.write(len(header).to_bytes(4, "little"))
+        file.write(header)
+        return cls(file, dtype, batch_size, flush_interval)
+
+    def write(self, record: Any) -> None:
+        self._batch[self._count] = record_row(record, self._names)
+        self._count += 1
+        if self._count == len(self._batch) or time.perf_counter() - self._last_flush >= self._flush_interval:
+            self.flush()
+
+    def flush(self) -> None:
+        """
+        Writes the collected records to disk.
+        """
+        if self._count > 0:
+            self._file.write(self._batch[:self._count].tobytes())
+            self._count = 0
+        self._file.flush()
+        self._last_flush = time.perf_counter()
+
+    def close(self) -> None:
+        self.flush()
+        self._file.close()
+
+class MissingReason:
+    """
+    Enumeration over the reasons a frame is missing from a lossless recording.
+    """
+    INCOMPLETE = "incomplete"
+    """
+    The camera delivered the image incomplete.
+    """
+    BUFFER_OVERRUN = "buffer_overrun"
+    """
+    The image never arrived, all stream buffers were full (or it was lost in transport).
+    """
+    ANALYSIS_BACKLOG = "analysis_backlog"
+    """
+    The image never arrived while acquisition was held back by a full analysis queue.
+    """
+    ANALYSIS_FAILED = "analysis_failed"
+    """
+    The image arrived, but could not be fitted.
+    """
+    RAW_RECORD_FAILED = "raw_record_failed"
+    """
+    The image arrived, but could not be written to the raw record file.
+    """
+    DISCARDED = "discarded"
+    """
+    The image arrived while the dispatch stopped and was not analysed anymore.
+    """
+
+class MissingFrameLog:
+    """
+    CSV log (frame_id, reason) of every frame missing from a lossless recording. Shared by the acquisition and analysis
+    stages; logging while no log is open does nothing.
+    """
+    def __init__(self):
+        """
+        **DO NOT USE!** Constructor for MissingFrameLog class is only for internal usage.
+        Use MissingFrameLog.create() instead!
+        """
+        self._lock = threading.Lock()
+        self._file = None
+        self._count = 0
+
+    @classmethod
+    def create(cls) -> MissingFrameLog:
+        """
+        Creates a MissingFrameLog without an open log file, see start(...).
+        """
+        return cls()
+
+    def start(self, path: str) -> None:
+        """
+        Opens a new log file. A previously opened one is closed.
+        """
+        file = open(path, "w", newline="")
+        file.write("frame_id,reason\n")
+        file.flush()
+        with self._lock:
+            previous, self._file = self._file, file
+            self._count = 0
+        if previous is not None:
+            previous.close()
+
+    def log(self, first_frame_id: int, reason: MissingReason, count: int = 1) -> None:
+        """
+        Logs count consecutive missing frames, starting with first_frame_id. Written to disk right away.
+        """
+        with self._lock:
+            if self._file is None:
+                return
+            self._file.writelines(f"{frame_id},{reason}\n" for frame_id in range(first_frame_id, first_frame_id + count))
+            self._file.flush()
+            self._count += count
+
+    def stop(self) -> None:
+        with self._lock:
+            file, self._file = self._file, None
+        if file is not None:
+            file.close()
+
+    @property
+    def active(self) -> bool:
+        return self._file is not None
+
+    @property
+    def count(self) -> int:
+        """
+        Number of frames logged to the current (or last) log file.
+        """
+        return self._count
+
+Recorder: TypeAlias = CsvRecorder | BinaryRecorder
+
+def create_recorder(record_format: RecordFormat, path: str, record_type: type, camera_config: Any = None, batch_size: int = 256, flush_interval: float = 1.0) -> Recorder:
+    """
+    Creates the recorder for the given record format. See CsvRecorder.create(...) and BinaryRecorder.create(...).
+    """
+    match record_format:
+        case RecordFormat.CSV:
+            return CsvRecorder.create(path, record_type, flush_interval)
+        case RecordFormat.BINARY:
+            return BinaryRecorder.create(path, record_type, camera_config, batch_size, flush_interval)
+    raise ValueError(f"Unknown record format: {record_format}")
+
+def read_header(path: str) -> tuple[dict[str, Any], int]:
+    """
+    Reads the JSON header of a binary record file.
+
+    :raises ValueError: The file is not a binary record file.
+    :return: The header and the byte offset of the first row.
+    :rtype: tuple[dict[str, Any], int]
+    """
+    with open(path, "rb") as file:
+        if file.read(len(BinaryRecorder.MAGIC)) != BinaryRecorder.MAGIC:
+            raise ValueError(f"{path} is not a binary record file")
+        length = int.from_bytes(file.read(4), "little")
+        header = json.loads(file.read(length))
+    return header, len(BinaryRecorder.MAGIC) + 4 + length
+
+def read_records(path: str) -> tuple[numpy.ndarray, dict[str, Any]]:
+    """
+    Reads all rows of a binary record file. A partially written last row (e.g. after a crash) is ignored.
+
+    :return: Structured array with one entry per record, and the header.
+    :rtype: tuple[numpy.ndarray, dict[str, Any]]
+    """
+    header, offset = read_header(path)
+    dtype = numpy.dtype([tuple(column) for column in header["dtype"]])
+    count = (os.path.getsize(path) - offset) // dtype.itemsize
+    return numpy.fromfile(path, dtype, count, offset=offset), header
+
+def convert_to_csv(path: str, csv_path: str | None = None) -> str:
+    """
+    Converts a binary record file to the CSV layout written by CsvRecorder.
+
+    :param path: Path of the binary record file.
+    :type path: str
+    :param csv_path: Path of the CSV file. Defaults to the record path with a .csv extension.
+    :type csv_path: str | None
+    :return: Path of the written CSV file.
+    :rtype: str
+    """
+    records, _ = read_records(path)
+    if csv_path is None:
+        csv_path = os.path.splitext(path)[0] + ".csv"
+    with open(csv_path, "w", newline="") as file:
+        writer = csv.writer(file)
+        writer.writerow(records.dtype.names)
+        writer.writerows(records.tolist())
+    return csv_path
@@ -0,0 +1,315 @@
+from __future__ import annotations
+from dataclasses import dataclass
+from typing import Any
+
+from recorder import BinaryRecorder, RecordFormat, record_dtype, read_records
+from analyzer import MomentRecord, CentroidRecord, EllipseRecord
+from utils import DataRecord
+
+import numpy
+import json
+import os
+
+RECORD_TYPES = (DataRecord, MomentRecord, CentroidRecord, EllipseRecord)
+"""
+Record types whose column types are known when a CSV file is loaded. Columns of other files load as float64,
+except frame_id and timestamp.
+"""
+CACHE_SUFFIX = ".cache"
+"""
+Suffix of the binary sidecar a CSV record file is cached in, next to it (e.g. I0T2-20260128-1131.csv.cache).
+"""
+
+@dataclass
+class GapReport:
+    records: int
+    first_frame_id: int
+    last_frame_id: int
+    missing: int
+    """
+    Frame ids between the first and the last record without a record.
+    """
+    gaps: list[tuple[int, int]]
+    """
+    First missing frame id and number of missing frames of every gap, in order.
+    """
+    duration: float
+    """
+    Seconds between the first and the last record, from the camera timestamps.
+    """
+    frame_rate: float
+    """
+    Effective rate of recorded frames per second.
+    """
+    camera_frame_rate: float
+    """
+    Rate of frames the camera delivered per second, including the missing ones.
+    """
+
+class RecordTable:
+    """
+    Records of one record file (or merged from several, see merge_records(...)) as column arrays, with queries by
+    frame id and timestamp. Queries return RecordTable objects sharing the columns where possible.
+
+    CSV files are parsed once and cached in a binary sidecar (see CACHE_SUFFIX), keyed by the size and modification
+    time of the CSV file. A file that only grew since (a running recording) just has its new rows parsed. Binary record
+    files are read directly.
+    """
+    def __init__(self, rows: numpy.ndarray, header: dict[str, Any], cameras: tuple[str, ...] = ()):
+        """
+        **DO NOT USE!** Constructor for RecordTable class is only for internal usage.
+        Use RecordTable.load(...) instead!
+        """
+        self._rows = rows
+        self._header = header
+        self._cameras = cameras
+        self._frame_order: numpy.ndarray | None = None
+        self._time_order: numpy.ndarray | None = None
+
+    @classmethod
+    def load(cls, path: str, cache: bool = True) -> RecordTable:
+        """
+        Loads a CSV or binary record file.
+
+        :param path: Path of the record file, e.g. ./record/I0T2-20260128-1131.csv.
+        :type path: str
+        :param cache: Use and update the binary sidecar of a CSV file. Without, the file is parsed completely.
+        :type cache: bool
+        :return: RecordTable with all complete rows of the file.
+        :rtype: RecordTable
+        """
+        if path.endswith("." + RecordFormat.BINARY):
+            rows, header = read_records(path)
+        else:
+            rows, header = load_csv(path, cache)
+        return cls(rows, header, (camera_name(path),))
+
+    @property
+    def names(self) -> tuple[str, ...]:
+        return self._rows.dtype.names
+
+    @property
+    def rows(self) -> numpy.ndarray:
+        """
+        Structured array with one entry per record, in file order.
+        """
+        return self._rows
+
+    @property
+    def record_type(self) -> str | None:
+        return self._header.get("record_type")
+
+    @property
+    def camera_config(self) -> dict[str, Any] | None:
+        """
+        Camera config stored with a binary record file, None for CSV files.
+        """
+        return self._header.get("camera_config")
+
+    @property
+    def cameras(self) -> tuple[str, ...]:
+        """
+        Camera names, indexed by the camera column of merged tables.
+        """
+        return self._cameras
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def __getitem__(self, name: str) -> numpy.ndarray:
+        return self._rows[name]
+
+    def frame(self, frame_id: int) -> numpy.void | None:
+        """
+        Record of a frame id, None if the frame has no record.
+        """
+        frame_ids = self._rows["frame_id"]
+        order = self._order("frame_id")
+        index = int(numpy.searchsorted(frame_ids if order is None else frame_ids[order], frame_id))
+        if index == len(frame_ids):
+            return None
+        index = index if order is None else int(order[index])
+        return self._rows[index] if frame_ids[index] == frame_id else None
+
+    def frames(self, first: int, last: int) -> RecordTable:
+        """
+        Records with first <= frame_id <= last.
+        """
+        return self._range("frame_id", first, last)
+
+    def between(self, start: int, end: int) -> RecordTable:
+        """
+        Records with start <= timestamp <= end (camera timestamps in nanoseconds).
+        """
+        return self._range("timestamp", start, end)
+
+    def gap_report(self) -> GapReport:
+        """
+        Frame id gaps and frame rates. With merged tables, frame ids of different cameras are not comparable;
+        report the tables of the cameras instead.
+        """
+        if len(self._rows) == 0:
+            return GapReport(0, -1, -1, 0, [], 0.0, 0.0, 0.0)
+        frame_ids = numpy.unique(self._rows["frame_id"])
+        steps = numpy.diff(frame_ids)
+        at = numpy.flatnonzero(steps > 1)
+        gaps = [(int(frame_ids[i]) + 1, int(steps[i]) - 1) for i in at]
+
+        timestamps = self._rows["timestamp"]
+        duration = (int(timestamps.max()) - int(timestamps.min())) * 1e-9
+        first, last = int(frame_ids[0]), int(frame_ids[-1])
+        return GapReport(
+            len(self._rows),
+            first,
+            last,
+            sum(count for _, count in gaps),
+            gaps,
+            duration,
+            (len(frame_ids) - 1) / duration if duration > 0 else 0.0,
+            (last - first) / duration if duration > 0 else 0.0
+        )
+
+    def _range(self, name: str, low: int, high: int) -> RecordTable:
+        """
+        Rows with low <= column <= high; a view if the column is sorted. Only for internal usage.
+        """
+        column = self._rows[name]
+        order = self._order(name)
+        keys = column if order is None else column[order]
+        start = int(numpy.searchsorted(keys, low, "left"))
+        stop = int(numpy.searchsorted(keys, high, "right"))
+        rows = self._rows[start:stop] if order is None else self._rows[numpy.sort(order[start:stop])]
+        return RecordTable(rows, self._header, self._cameras)
+
+    def _order(self, name: str) -> numpy.ndarray | None:
+        """
+        Sort order of the frame id or timestamp column, None if the column is sorted already (the usual case).
+        Only for internal usage.
+        """
+        attribute = "_frame_order" if name == "frame_id" else "_time_order"
+        order = getattr(self, attribute)
+        if order is None:
+            column = self._rows[name]
+            order = numpy.empty(0, numpy.int64) if numpy.all(column[1:] >= column[:-1]) else numpy.argsort(column, kind="stable")
+            setattr(self, attribute, order)
+        return order if len(order) else None
+
+def camera_name(path: str) -> str:
+    """
+    Camera name of a record file named by utils.get_filename(...), e.g. I0T2 for I0T2-20260128-1131.csv.
+    """
+    return os.path.basename(path).rsplit("-", 2)[0]
+
+def csv_dtype(names: tuple[str, ...]) -> numpy.dtype:
+    """
+    Column types of a CSV record file from its header row. Only for internal usage.
+    """
+    for record_type in RECORD_TYPES:
+        dtype = record_dtype(record_type)
+        if dtype.names == names:
+            return dtype
+    return numpy.dtype([(name, numpy.int64 if name in ("frame_id", "timestamp") else numpy.float64) for name in names])
+
+def parse_csv(data: bytes, dtype: numpy.dtype) -> numpy.ndarray:
+    """
+    Parses complete CSV rows without a header row. All values are parsed at once as float64 and converted per column,
+    so integer columns are exact up to 2**53 (timestamps up to 104 days). Only for internal usage.
+
+    :raises ValueError: A row does not have one value per column.
+    """
+    lines = data.count(b"\n")
+    text = data.replace(b"\r\n", b",").replace(b"\n", b",").decode()
+    values = numpy.fromstring(text, dtype=numpy.float64, sep=",") if lines else numpy.empty(0)
+    columns = len(dtype.names)
+    if values.size != lines * columns:
+        raise ValueError(f"Malformed CSV records: {values.size} values in {lines} rows of {columns} columns")
+    values = values.reshape(lines, columns)
+    rows = numpy.empty(lines, dtype)
+    for i, name in enumerate(dtype.names):
+        rows[name] = values[:, i]
+    return rows
+
+def load_csv(path: str, cache: bool = True) -> tuple[numpy.ndarray, dict[str, Any]]:
+    """
+    Reads the complete rows of a CSV record file through its binary sidecar, see RecordTable. Only for internal usage.
+
+    :return: Structured array with one entry per record, and a header like that of a binary record file.
+    :rtype: tuple[numpy.ndarray, dict[str, Any]]
+    """
+    stat = os.stat(path)
+    cache_path = path + CACHE_SUFFIX
+    rows = None
+    parsed = 0
+    if cache and os.path.exists(cache_path):
+        cached_rows, cached_header = read_records(cache_path)
+        source = cached_header.get("source", {})
+        if source.get("mtime_ns") == stat.st_mtime_ns and source.get("size") == stat.st_size:
+            return cached_rows, cached_header
+        if stat.st_size > source.get("size", 0) and source.get("parsed", 0) > 0:
+            rows, parsed = cached_rows, source["parsed"]
+
+    with open(path, "rb") as file:
+        if rows is None:
+            names = tuple(file.readline().decode().strip().split(","))
+            rows = numpy.empty(0, csv_dtype(names))
+            parsed = file.tell()
+        file.seek(parsed)
+        data = file.read()
+    complete = data.rfind(b"\n") + 1
+    if complete > 0:
+        rows = numpy.concatenate((rows, parse_csv(data[:complete], rows.dtype)))
+        parsed += complete
+
+    header = {
+        "record_type": next((record_type.__name__ for record_type in RECORD_TYPES if record_dtype(record_type) == rows.dtype), None),
+        "dtype": rows.dtype.descr,
+        "camera_config": None,
+        "source": {"mtime_ns": stat.st_mtime_ns, "size": stat.st_size, "parsed": parsed},
+    }
+    if cache:
+        write_cache(cache_path, rows, header)
+    return rows, header
+
+def write_cache(path: str, rows: numpy.ndarray, header: dict[str, Any]) -> None:
+    """
+    Writes a sidecar in the binary record file layout (see BinaryRecorder), so read_records(...) reads it.
+    Written to a temporary file and renamed, so a reader never sees a partial sidecar. Only for internal usage.
+    """
+    encoded = json.dumps(header).encode()
+    temporary = path + ".tmp"
+    with open(temporary, "wb") as file:
+        file.write(BinaryRecorder.MAGIC)
+        file.write(len(encoded).to_bytes(4, "little"))
+        file.write(encoded)
+        file.write(rows.tobytes())
+    os.replace(temporary, path)
+
+def merge_records(tables: list[RecordTable]) -> RecordTable:
+    """
+    Merges the records of several cameras into one table ordered by timestamp, e.g. to follow the beam through
+    several cameras of a synchronized setup. The merged table has the columns all tables share and an additional
+    camera column, the index of the camera in RecordTable.cameras.
+
+    :param tables: Tables of the cameras.
+    :type tables: list[RecordTable]
+    :return: Merged RecordTable.
+    :rtype: RecordTable
+    """
+    names = [name for name in tables[0].names if all(name in table.names for table in tables[1:])]
+    cameras = tuple(camera for table in tables for camera in table.cameras)
+    dtype = numpy.dtype([("camera", numpy.int64)] + [(name, tables[0].rows.dtype[name]) for name in names])
+
+    rows = numpy.empty(sum(len(table) for table in tables), dtype)
+    start = 0
+    offset = 0
+    for table in tables:
+        stop = start + len(table)
+        part = rows[start:stop]
+        for name in names:
+            part[name] = table[name]
+        part["camera"] = table["camera"] + offset if "camera" in table.names else offset
+        start = stop
+        offset += len(table.cameras)
+
+    order = numpy.argsort(rows["timestamp"], kind="stable")
+    return RecordTable(rows[order], {"record_type": None, "dtype": dtype.descr, "camera_config": None}, cameras)
@@ -0,0 +1,239 @@
+from __future__ import annotations
+from concurrent.futures import ProcessPoolExecutor
+
+from processor import Processor, ProcessFilter, FrameFilter
+from framefile import FrameReader
+from recorder import RecordFormat, create_recorder
+import utils
+from utils import Frame, FrameData, CaptureFormat, Capture, CameraConfig, DataRecord, Gaussian
+
+import argparse
+import numpy
+import glob
+import time
+import cv2
+import sys
+import os
+
+class PngFrames:
+    """
+    Directory of frames saved as PNG (e.g. I0T3-08082025152658-0.png), ordered by the session timestamp (DDMMYYYYhhmmss)
+    and the frame number at the end of their name. Offers the same indexing as framefile.FrameReader. Color PNGs
+    (e.g. written by utils.save_subimage) are read as RGB frames.
+    """
+    def __init__(self, paths: list[str], frame_ids: list[int]):
+        """
+        **DO NOT USE!** Constructor for PngFrames class is only for internal usage.
+        Use PngFrames.open(...) instead!
+        """
+        self._paths = paths
+        self._frame_ids = frame_ids
+
+    @classmethod
+    def open(cls, path: str) -> PngFrames:
+        """
+        Lists the PNG frames of a directory. The frame numbers are the frame ids, unless files have no frame number or
+        several sessions in the directory repeat them; then the frames are numbered by their position.
+
+        :param path: Directory containing the PNG frames.
+        :type path: str
+        :raises ValueError: The directory contains no PNG files.
+        :return: PngFrames object.
+        :rtype: PngFrames
+        """
+        paths = glob.glob(os.path.join(path, "*.png"))
+        if not paths:
+            raise ValueError(f"No PNG frames found in {path}")
+
+        def frame_key(png_path: str) -> tuple[str, int] | None:
+            parts = os.path.splitext(os.path.basename(png_path))[0].rsplit("-", 2)
+            if not parts[-1].isdigit():
+                return None
+            stamp = parts[-2] if len(parts) == 3 and parts[-2].isdigit() else ""
+            if len(stamp) == 14:
+                stamp = stamp[4:8] + stamp[2:4] + stamp[0:2] + stamp[8:]
+            return stamp, int(parts[-1])
+
+        keys = [frame_key(png_path) for png_path in paths]
+        if None in keys:
+            paths.sort()
+            return cls(paths, list(range(len(paths))))
+        ordered = sorted(zip(keys, paths))
+        numbers = [number for (_, number), _ in ordered]
+        frame_ids = numbers if len(set(numbers)) == len(numbers) else list(range(len(numbers)))
+        return cls([png_path for _, png_path in ordered], frame_ids)
+
+    def __len__(self) -> int:
+        return len(self._paths)
+
+    def __getitem__(self, position: int) -> tuple[FrameData, Frame]:
+        frame = cv2.imread(self._paths[position], cv2.IMREAD_COLOR)
+        if frame is None:
+            raise ValueError(f"Cannot read {self._paths[position]}")
+        return FrameData(self._frame_ids[position], 0, 0.0, CaptureFormat.RGB8), cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+
+def open_frames(path: str) -> FrameReader | PngFrames:
+    """
+    Opens recorded frames: a raw file written by framefile.FrameWriter or a directory of PNG frames.
+    """
+    if os.path.isdir(path):
+        return PngFrames.open(path)
+    return FrameReader.open(path)
+
+def parse_filter(spec: str) -> FrameFilter:
+    """
+    Builds a filter from its command line spec NAME[=ARG,...], e.g. median=3, threshold=30.5 or crop=640,480,100,50.
+    NAME is one of the ProcessFilter functions (case insensitive). Arguments are passed as int or float if they are
+    numbers, as str otherwise (e.g. the camera name of substract=I0T3).
+
+    :raises ValueError: Unknown filter or invalid arguments.
+    """
+    name, _, args = spec.partition("=")
+    filter_factory = getattr(ProcessFilter, name.strip().upper(), None)
+    if filter_factory is None:
+        raise ValueError(f"Unknown filter: {name}")
+    values = [parse_arg(arg.strip()) for arg in args.split(",") if arg.strip()]
+    try:
+        return filter_factory(*values)
+    except TypeError as ex:
+        raise ValueError(f"Invalid arguments for filter {name}: {args}") from ex
+
+def parse_arg(arg: str) -> int | float | str:
+    """
+    Command line filter argument as int, float or str. Only for internal usage.
+    """
+    for number_type in (int, float):
+        try:
+            return number_type(arg)
+        except ValueError:
+            pass
+    return arg
+
+def check_pipeline(frames: FrameReader | PngFrames, filter_specs: list[str], half: bool) -> None:
+    """
+    Processes the first frame with the pipeline, so that invalid filter arguments (e.g. an even median kernel size)
+    fail before the worker processes start instead of inside them.
+
+    :raises ValueError: A filter spec is invalid or the pipeline cannot process the frames.
+    """
+    processor = Processor.create(*(parse_filter(spec) for spec in filter_specs))
+    if len(frames) == 0:
+        return
+    frame_data, frame = frames[0]
+    capture = Capture.create(frame_data, frame, processor.process)
+    try:
+        capture.half_processed if half else capture.processed
+    except (TypeError, ValueError, cv2.error) as ex:
+        raise ValueError(f"Invalid filter pipeline {' '.join(filter_specs)}: {ex}") from ex
+
+_frames: FrameReader | PngFrames | None = None
+_processor: Processor | None = None
+_half: bool = False
+
+def _init_worker(path: str, filter_specs: list[str], half: bool) -> None:
+    """
+    Worker process initializer. Every worker opens the frames (a raw file is only mapped, not read) and builds the
+    processor once. Only for internal usage.
+    """
+    global _frames, _processor, _half
+    _frames = open_frames(path)
+    _processor = Processor.create(*(parse_filter(spec) for spec in filter_specs))
+    _half = half
+
+def _process_chunk(chunk: tuple[int, int]) -> list[DataRecord]:
+    """
+    Processes and projects the frames of a position range and fits all their projections in one batch. Only for internal usage.
+    """
+    frame_datas = []
+    horiz_projs = []
+    vert_projs = []
+    for position in range(*chunk):
+        frame_data, frame = _frames[position]
+        capture = Capture.create(frame_data, frame, _processor.process)
+        horiz_proj, vert_proj = utils.project(capture.half_processed if _half else capture.processed)
+        frame_datas.append(frame_data)
+        horiz_projs.append(horiz_proj)
+        vert_projs.append(vert_proj)
+
+    horiz_params, horiz_perr = utils.gauss_fit_batch(numpy.stack(horiz_projs))
+    vert_params, vert_perr = utils.gauss_fit_batch(numpy.stack(vert_projs))
+
+    records = []
+    for i, frame_data in enumerate(frame_datas):
+        horiz_gaussian = Gaussian(*horiz_params[i], horiz_perr[i])
+        vert_gaussian = Gaussian(*vert_params[i], vert_perr[i])
+        if _half:
+            horiz_gaussian = horiz_gaussian.rescaled(Capture.HALF_SCALE, Capture.HALF_SHIFT)
+            vert_gaussian = vert_gaussian.rescaled(Capture.HALF_SCALE, Capture.HALF_SHIFT)
+        records.append(DataRecord.create(horiz_gaussian, vert_gaussian, frame_data))
+    return records
+
+def reprocess(path: str, output: str, filter_specs: list[str], record_format: RecordFormat = RecordFormat.CSV, half: bool = False, workers: int | None = None, chunk_size: int = 64) -> int:
+    """
+    Reanalyses recorded frames with a new processor pipeline. Chunks of frames are processed, projected and fitted
+    in parallel worker processes; the records are written in frame order.
+
+    :param path: Raw file or directory of PNG frames.
+    :type path: str
+    :param output: Path of the written record file.
+    :type output: str
+    :param filter_specs: Filter specs of the processor pipeline in order, see parse_filter(...).
+    :type filter_specs: list[str]
+    :param record_format: File format of the records.
+    :type record_format: RecordFormat
+    :param half: Analyse the half resolution mono frame like DispatchConfig.fast_mono.
+    :type half: bool
+    :param workers: Number of worker processes. Defaults to the number of cores.
+    :type workers: int | None
+    :param chunk_size: Number of frames handed to a worker at once.
+    :type chunk_size: int
+    :return: Number of written records.
+    :rtype: int
+    """
+    frames = open_frames(path)
+    check_pipeline(frames, filter_specs, half)
+    camera_config = None
+    if isinstance(frames, FrameReader) and frames.header.get("camera_config") is not None:
+        camera_config = CameraConfig(**frames.header["camera_config"])
+    chunks = [(start, min(start + chunk_size, len(frames))) for start in range(0, len(frames), chunk_size)]
+
+    recorder = create_recorder(record_format, output, DataRecord, camera_config)
+    count = 0
+    try:
+        with ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(path, filter_specs, half)) as executor:
+            for records in executor.map(_process_chunk, chunks):
+                for record in records:
+                    recorder.write(record)
+                count += len(records)
+    finally:
+        recorder.close()
+    return count
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Reanalyse recorded frames with a different processor pipeline.")
+    parser.add_argument("input", help="raw frame file or directory of PNG frames")
+    parser.add_argument("-o", "--output", help="record file, defaults to the input path with a -reprocessed suffix")
+    parser.add_argument("-f", "--filter", dest="filters", action="append", default=[], metavar="NAME[=ARG,...]",
+                        help="processor filter, applied in the given order (e.g. median=3, threshold=30, crop=640,480,100,50)")
+    parser.add_argument("--format", choices=(RecordFormat.BINARY, RecordFormat.CSV), default=RecordFormat.CSV, help="record file format")
+    parser.add_argument("--half", action="store_true", help="analyse the half resolution mono frame")
+    parser.add_argument("-j", "--workers", type=int, default=None, help="number of worker processes, defaults to the number of cores")
+    parser.add_argument("--chunk-size", type=int, default=64, help="frames per worker task")
+    args = parser.parse_args(argv)
+
+    output = args.output
+    if output is None:
+        output = f"{os.path.splitext(args.input.rstrip(os.sep))[0]}-reprocessed.{args.format}"
+
+    start = time.perf_counter()
+    try:
+        count = reprocess(args.input, output, args.filters, args.format, args.half, args.workers, args.chunk_size)
+    except ValueError as ex:
+        print(f"Reprocessing failed: {ex}", file=sys.stderr)
+        return 1
+    duration = time.perf_counter() - start
+    print(f"{count} frames in {duration:.1f} s ({count / duration:.1f} fps) -> {output}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
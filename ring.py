@@ -0,0 +1,242 @@
+from __future__ import annotations
+from dataclasses import dataclass
+from multiprocessing import shared_memory, resource_tracker
+
+from utils import Frame, FrameData
+
+import numpy
+import sys
+
+HEADER_DTYPE = numpy.dtype([
+    ("slots", numpy.int64),
+    ("height", numpy.int64),
+    ("width", numpy.int64),
+    ("channels", numpy.int64),
+    ("head", numpy.int64),
+])
+
+META_DTYPE = numpy.dtype([
+    ("sequence", numpy.int64),
+    ("frame_id", numpy.int64),
+    ("timestamp", numpy.int64),
+    ("exposure_time", numpy.float64),
+    ("capture_format", "S16"),
+    ("raw_shape", numpy.int32, 3),
+    ("mono_shape", numpy.int32, 2),
+    ("processed_shape", numpy.int32, 2),
+])
+
+def attach_shared_memory(name: str) -> shared_memory.SharedMemory:
+    """
+    Attaches to an existing shared memory block without handing it to the resource tracker of this process.
+    Otherwise the tracker would unlink the block as soon as a reading process exits, although the writer still owns it.
+    """
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name=name, track=False)
+    shm = shared_memory.SharedMemory(name=name)
+    resource_tracker.unregister(shm._name, "shared_memory")
+    return shm
+
+def create_shared_memory(name: str, size: int) -> shared_memory.SharedMemory:
+    """
+    Creates a shared memory block. A stale block of the same name (left behind by a crashed process) is replaced.
+    """
+    try:
+        stale = attach_shared_memory(name)
+        stale.close()
+        stale.unlink()
+    except FileNotFoundError:
+        pass
+    return shared_memory.SharedMemory(name=name, create=True, size=size)
+
+@dataclass
+class RingFrame:
+    """
+    One frame read from a FrameRing. The frame arrays are zero-copy views into shared memory and stay valid
+    only until the writer reuses the slot. Check with FrameRing.is_current(...) after using them or copy them.
+    """
+    sequence: int
+    slot: int
+    frame_data: FrameData
+    raw: Frame
+    mono: Frame | None
+    processed: Frame | None
+
+class FrameRing:
+    """
+    Ring of preallocated frame slots in shared memory. One process writes raw, mono and processed frames,
+    any number of local processes read the latest frames without copying them through a pipe.
+    """
+    def __init__(self, shm: shared_memory.SharedMemory, owner: bool):
+        """
+        **DO NOT USE!** Constructor for FrameRing class is only for internal usage.
+        Use FrameRing.create(...) or FrameRing.attach(...) instead!
+        """
+        self._shm = shm
+        self._owner = owner
+        self._header = numpy.ndarray((), HEADER_DTYPE, shm.buf, 0)
+
+        slots = int(self._header["slots"])
+        height, width, channels = int(self._header["height"]), int(self._header["width"]), int(self._header["channels"])
+        self._slots = slots
+        self._frame_size = height * width
+
+        offset = HEADER_DTYPE.itemsize
+        self._meta = numpy.ndarray((slots,), META_DTYPE, shm.buf, offset)
+        offset += slots * META_DTYPE.itemsize
+        self._raw = numpy.ndarray((slots, self._frame_size * channels), numpy.uint8, shm.buf, offset)
+        offset += slots * self._frame_size * channels
+        self._mono = numpy.ndarray((slots, self._frame_size), numpy.uint8, shm.buf, offset)
+        offset += slots * self._frame_size
+        self._processed = numpy.ndarray((slots, self._frame_size), numpy.uint8, shm.buf, offset)
+
+    @classmethod
+    def create(cls, name: str, slots: int, height: int, width: int, channels: int = 3) -> FrameRing:
+        """
+        Creates the shared memory block and takes ownership of it. Only the owner writes frames and unlinks the block.
+
+        :param name: System wide name of the ring. Readers attach by this name.
+        :type name: str
+        :param slots: Number of frames kept in the ring.
+        :type slots: int
+        :param height: Maximum frame height in pixels.
+        :type height: int
+        :param width: Maximum frame width in pixels.
+        :type width: int
+        :param channels: Maximum number of channels of a raw frame.
+        :type channels: int
+        :return: Empty FrameRing object owning the shared memory.
+        :rtype: FrameRing
+        """
+        frame_size = height * width
+        size = HEADER_DTYPE.itemsize + slots * (META_DTYPE.itemsize + frame_size * (channels + 2))
+        shm = create_shared_memory(name, size)
+
+        header = numpy.ndarray((), HEADER_DTYPE, shm.buf, 0)
+        header["slots"] = slots
+        header["height"] = height
+        header["width"] = width
+        header["channels"] = channels
+        header["head"] = 0
+        del header
+
+        ring = cls(shm, True)
+        ring._meta["sequence"] = 0
+        return ring
+
+    @classmethod
+    def attach(cls, name: str) -> FrameRing:
+        """
+        Attaches to a ring created by another process.
+
+        :param name: Name the ring was created with.
+        :type name: str
+        :raises FileNotFoundError: The ring does not exist (yet).
+        :return: FrameRing object for reading.
+        :rtype: FrameRing
+        """
+        return cls(attach_shared_memory(name), False)
+
+    def write(self, frame_data: FrameData, raw: Frame, mono: Frame | None = None, processed: Frame | None = None) -> int:
+        """
+        Copies a frame into the next slot and publishes it. Frames that do not fit into a slot are not written.
+
+        :return: Sequence number of the written frame, 0 if it was not written.
+        :rtype: int
+        """
+        if raw.size > self._raw.shape[1] or any(frame is not None and frame.size > self._frame_size for frame in (mono, processed)):
+            return 0
+
+        sequence = int(self._header["head"]) + 1
+        slot = sequence % self._slots
+        meta = self._meta[slot]
+        meta["sequence"] = -1
+
+        raw_shape = raw.shape + (1,) * (3 - raw.ndim)
+        self._raw[slot, :raw.size].reshape(raw.shape)[...] = raw
+        meta["raw_shape"] = raw_shape
+
+        meta["mono_shape"] = (0, 0)
+        if mono is not None:
+            self._mono[slot, :mono.size].reshape(mono.shape)[...] = mono
+            meta["mono_shape"] = mono.shape
+
+        meta["processed_shape"] = (0, 0)
+        if processed is not None:
+            self._processed[slot, :processed.size].reshape(processed.shape)[...] = processed
+            meta["processed_shape"] = processed.shape
+
+        meta["frame_id"] = frame_data.frame_id
+        meta["timestamp"] = frame_data.timestamp
+        meta["exposure_time"] = frame_data.exposure_time
+        meta["capture_format"] = frame_data.capture_format.encode()
+        meta["sequence"] = sequence
+        self._header["head"] = sequence
+        return sequence
+
+    def latest(self, count: int = 1) -> list[RingFrame]:
+        """
+        Reads up to count of the most recently written frames, newest first. Slots that are being rewritten are skipped.
+
+        :param count: Maximum number of frames. Limited to one less than the number of slots.
+        :type count: int
+        :return: Zero-copy views of the frames.
+        :rtype: list[RingFrame]
+        """
+        head = int(self._header["head"])
+        frames = []
+        for sequence in range(head, max(head - min(count, self._slots - 1), 0), -1):
+            frame = self._read(sequence)
+            if frame is not None:
+                frames.append(frame)
+        return frames
+
+    def is_current(self, frame: RingFrame) -> bool:
+        """
+        Tells whether the slot of a read frame still holds that frame, i.e. whether its views were not overwritten meanwhile.
+        """
+        return int(self._meta[frame.slot]["sequence"]) == frame.sequence
+
+    @property
+    def head(self) -> int:
+        """
+        Sequence number of the most recently written frame (0 before the first frame).
+        """
+        return int(self._header["head"])
+
+    def close(self) -> None:
+        """
+        Nessessary for cleanup. Releases the mapping and, if this process owns the ring, removes the shared memory block.
+        """
+        del self._header, self._meta, self._raw, self._mono, self._processed
+        self._shm.close()
+        if self._owner:
+            self._shm.unlink()
+
+    def _read(self, sequence: int) -> RingFrame | None:
+        """
+        Builds the views of one slot if it still holds the requested sequence. Only for internal usage.
+        """
+        slot = sequence % self._slots
+        meta = self._meta[slot].copy()
+        if int(meta["sequence"]) != sequence:
+            return None
+
+        raw_shape = tuple(int(dim) for dim in meta["raw_shape"])
+        if raw_shape[2] == 1:
+            raw_shape = raw_shape[:2]
+        raw = self._raw[slot, :numpy.prod(raw_shape)].reshape(raw_shape)
+
+        mono_shape = tuple(int(dim) for dim in meta["mono_shape"])
+        mono = self._mono[slot, :numpy.prod(mono_shape)].reshape(mono_shape) if mono_shape[0] > 0 else None
+
+        processed_shape = tuple(int(dim) for dim in meta["processed_shape"])
+        processed = self._processed[slot, :numpy.prod(processed_shape)].reshape(processed_shape) if processed_shape[0] > 0 else None
+
+        frame_data = FrameData(
+            int(meta["frame_id"]),
+            int(meta["timestamp"]),
+            float(meta["exposure_time"]),
+            meta["capture_format"].decode()
+        )
+        return RingFrame(sequence, slot, frame_data, raw, mono, processed)
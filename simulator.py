@@ -0,0 +1,299 @@
+from __future__ import annotations
+from dataclasses import dataclass, fields, replace
+from typing import Any
+
+from camera import Camera, CameraConfig, BufferMode, IncompleteFrame
+from utils import FrameData, Frame, CaptureFormat
+from pool import FramePool
+
+import numpy
+import time
+
+@dataclass
+class SimulationConfig:
+    """
+    Parameters of the synthetic beam produced by a SimulatedCamera.
+    Positions and widths are given in pixels, intensities in 8 bit counts.
+    """
+    capture_format: CaptureFormat = CaptureFormat.BAYER_RG8
+    width: int = 1440
+    height: int = 1080
+    frame_rate: float = 100.0
+    exposure_time: float = 5000.0
+    amplitude: float = 180.0
+    center_x: float | None = None
+    center_y: float | None = None
+    sigma_x: float = 60.0
+    sigma_y: float = 80.0
+    color: tuple[float, float, float] = (1.0, 0.8, 0.6)
+    background: float = 12.0
+    noise: float = 3.0
+    drift: float = 0.05
+    incomplete_rate: float = 0.0
+    gap_rate: float = 0.0
+    seed: int | None = None
+
+    @classmethod
+    def from_dict(cls, entry: dict[str, Any]) -> SimulationConfig:
+        """
+        Builds a SimulationConfig from a camera map entry. Unknown keys (such as "simulated") are ignored.
+
+        :param entry: Camera map entry of a simulated camera.
+        :type entry: dict[str, Any]
+        :return: Simulation parameters with defaults for every missing key.
+        :rtype: SimulationConfig
+        """
+        names = {field.name for field in fields(cls)}
+        kwargs = {key: value for key, value in entry.items() if key in names}
+        if "color" in kwargs:
+            kwargs["color"] = tuple(kwargs["color"])
+        return cls(**kwargs)
+
+class SimulatedCamera:
+    """
+    Synthetic stand-in for Camera. Produces Gaussian beam frames paced at the configured frame rate without any hardware.
+    Like a camera in BufferMode.PREVIEW, frames that are not fetched in time are skipped and show up as frame id gaps.
+    In BufferMode.LOSSLESS, late frames are delivered in order until more are due than there are stream buffers.
+    """
+    NOISE_MARGIN = 64
+    """
+    Extra rows and columns of the pregenerated noise field. Every frame takes a randomly shifted window of it.
+    """
+
+    def __init__(self, name: str, sim_config: SimulationConfig):
+        """
+        **DO NOT USE!** Constructor for SimulatedCamera class is only for internal usage.
+        Use SimulatedCamera.init(...) instead!
+        """
+        self._name = name
+        self._sim = sim_config
+        self._rng = numpy.random.default_rng(sim_config.seed)
+        self._config: CameraConfig
+        self._streaming = False
+        self._buffer_mode = BufferMode.PREVIEW
+        self._buffer_count = Camera.PREVIEW_BUFFER_COUNT
+        self._frame_id = 0
+        self._start_time = 0.0
+        self._next_time = 0.0
+        self._center_x = 0.0
+        self._center_y = 0.0
+        self._noise: numpy.ndarray
+        self._mosaic: numpy.ndarray | None
+        self._buffer: numpy.ndarray
+        self._pool = FramePool.create((0, 0), Camera.POOL_CAPACITY)
+
+    @classmethod
+    def init(cls, name: str, sim_config: SimulationConfig) -> SimulatedCamera:
+        """
+        Creates and initializes a SimulatedCamera object.
+
+        :param name: Camera name as used in the camera map.
+        :type name: str
+        :param sim_config: Parameters of the simulated beam and sensor.
+        :type sim_config: SimulationConfig
+        :return: Initialized SimulatedCamera object.
+        :rtype: SimulatedCamera
+        """
+        camera = cls(name, sim_config)
+        camera._center_x = sim_config.center_x if sim_config.center_x is not None else sim_config.width / 2
+        camera._center_y = sim_config.center_y if sim_config.center_y is not None else sim_config.height / 2
+        camera._allocate()
+        return camera
+
+    def setup(self, auto_off: bool) -> None:
+        """
+        Counterpart of Camera.setup. The simulation has no automatic exposure or gain, so there is nothing to switch off.
+        """
+        self.update_config()
+
+    def update_config(self) -> None:
+        self._config = CameraConfig(
+            width = self._sim.width,
+            height = self._sim.height,
+            offset_x = 0,
+            offset_y = 0,
+            frame_rate = self._sim.frame_rate,
+            adc_bit_depth = None,
+            exposure_time = self._sim.exposure_time,
+            gain = 0.0,
+            gamma = 1.0
+        )
+
+    @property
+    def name(self) -> str:
+        return self._name
+
+    @property
+    def config(self) -> CameraConfig:
+        return replace(self._config)
+
+    @config.setter
+    def config(self, config: CameraConfig) -> None:
+        """
+        Counterpart of the Camera.config setter. The noise field is only regenerated if the sensor size changes.
+        """
+        size = (self._sim.width, self._sim.height)
+        if not self._streaming:
+            if config.width is not None:
+                self._sim.width = config.width
+            if config.height is not None:
+                self._sim.height = config.height
+            if (self._sim.width, self._sim.height) != size:
+                self._allocate()
+
+        if config.exposure_time is not None:
+            self._sim.exposure_time = config.exposure_time
+
+        if config.frame_rate is not None:
+            self._sim.frame_rate = min(config.frame_rate, 1e6 / self._sim.exposure_time)
+
+        self.update_config()
+
+    def set_buffering(self, mode: BufferMode, memory_budget: int = 0) -> int:
+        """
+        Counterpart of Camera.set_buffering. The number of stream buffers is sized from the simulated frame size.
+        """
+        if mode == BufferMode.LOSSLESS:
+            frame_size = self._sim.width * self._sim.height * (3 if self._sim.capture_format == CaptureFormat.RGB8 else 1)
+            self._buffer_count = max(memory_budget // frame_size, Camera.LOSSLESS_MIN_BUFFER_COUNT)
+        else:
+            self._buffer_count = Camera.PREVIEW_BUFFER_COUNT
+        self._buffer_mode = mode
+        return self._buffer_count
+
+    def set_trigger(self, source: str | None) -> None:
+        """
+        Counterpart of Camera.set_trigger. The simulation keeps running at its frame rate; cameras sharing a trigger are
+        simulated by equal frame rates and a coordinated timestamp reset.
+        """
+        pass
+
+    def reset_timestamp(self) -> None:
+        """
+        Resets the frame timestamps like TimestampReset on a physical camera.
+        """
+        self._start_time = time.perf_counter()
+
+    def begin(self, reset_timestamp: bool = True) -> None:
+        """
+        Begins the simulated acquisition. The first exposure starts right away.
+        """
+        if reset_timestamp:
+            self.reset_timestamp()
+        self._streaming = True
+        self._next_time = time.perf_counter()
+
+    def acquire(self, timeout: int | None = None) -> tuple[FrameData, Frame]:
+        """
+        Waits for the next simulated exposure and returns its frame data and frame, just like Camera.acquire.
+        The timeout is accepted for compatibility; a simulated frame is always due within one frame period.
+
+        :raises IncompleteFrame: Image is incomplete (simulated with the configured incomplete rate).
+        """
+        period = 1.0 / self._sim.frame_rate
+        now = time.perf_counter()
+        if now < self._next_time:
+            time.sleep(self._next_time - now)
+        else:
+            missed = int((now - self._next_time) / period)
+            if self._buffer_mode == BufferMode.LOSSLESS:
+                missed = max(missed - self._buffer_count + 1, 0)
+            self._frame_id += missed
+            self._next_time += missed * period
+
+        if self._sim.gap_rate > 0 and self._rng.random() < self._sim.gap_rate:
+            self._frame_id += int(self._rng.integers(1, 4))
+
+        frame_id = self._frame_id
+        timestamp = int((self._next_time - self._start_time) * 1e9)
+        self._frame_id += 1
+        self._next_time += period
+        self._drift()
+
+        if self._sim.incomplete_rate > 0 and self._rng.random() < self._sim.incomplete_rate:
+            raise IncompleteFrame(frame_id)
+
+        frame_data = FrameData(frame_id, timestamp, self._sim.exposure_time, self._sim.capture_format)
+        return frame_data, self._render()
+
+    def release(self, frame: Frame) -> None:
+        """
+        Hands an acquired frame back to the frame pool, like Camera.release.
+        """
+        self._pool.release(frame)
+
+    @property
+    def pool(self) -> FramePool:
+        return self._pool
+
+    def end(self) -> None:
+        """
+        Stops the simulated acquisition.
+        """
+        self._streaming = False
+
+    def deinit(self) -> None:
+        """
+        Counterpart of Camera.deinit. There is no device handle to release.
+        """
+        pass
+
+    def _allocate(self) -> None:
+        """
+        Pregenerates the noise field and the Bayer color mosaic for the current sensor size. Only for internal usage.
+        """
+        height, width = self._sim.height, self._sim.width
+        margin = self.NOISE_MARGIN
+        self._noise = self._rng.normal(
+            self._sim.background, self._sim.noise, (height + margin, width + margin)
+        ).astype(numpy.float32)
+        self._buffer = numpy.empty((height, width), numpy.float32)
+        channels = (3,) if self._sim.capture_format == CaptureFormat.RGB8 else ()
+        self._pool.resize((height, width) + channels)
+
+        self._mosaic = None
+        if self._sim.capture_format == CaptureFormat.BAYER_RG8:
+            red, green, blue = self._sim.color
+            tile = numpy.array([[red, green], [green, blue]], numpy.float32)
+            self._mosaic = numpy.tile(tile, ((height + 1) // 2, (width + 1) // 2))[:height, :width]
+
+    def _drift(self) -> None:
+        """
+        Moves the beam center by a random walk step, kept inside the sensor. Only for internal usage.
+        """
+        if self._sim.drift <= 0:
+            return
+        step_x, step_y = self._rng.normal(0.0, self._sim.drift, 2)
+        self._center_x = min(max(self._center_x + step_x, 0.0), self._sim.width - 1.0)
+        self._center_y = min(max(self._center_y + step_y, 0.0), self._sim.height - 1.0)
+
+    def _render(self) -> Frame:
+        """
+        Renders the separable Gaussian beam on top of a shifted window of the noise field. Only for internal usage.
+        """
+        height, width = self._sim.height, self._sim.width
+        x = (numpy.arange(width, dtype=numpy.float32) - self._center_x) / self._sim.sigma_x
+        y = (numpy.arange(height, dtype=numpy.float32) - self._center_y) / self._sim.sigma_y
+        horiz = numpy.exp(-0.5 * x * x)
+        vert = self._sim.amplitude * numpy.exp(-0.5 * y * y)
+
+        beam = numpy.multiply.outer(vert, horiz, out=self._buffer)
+        shift_x, shift_y = self._rng.integers(0, self.NOISE_MARGIN, 2)
+        noise = self._noise[shift_y:shift_y + height, shift_x:shift_x + width]
+
+        match self._sim.capture_format:
+            case CaptureFormat.BAYER_RG8:
+                beam *= self._mosaic
+                beam += noise
+            case CaptureFormat.MONO8:
+                beam += noise
+            case CaptureFormat.RGB8:
+                color = numpy.array(self._sim.color, numpy.float32)
+                beam = beam[:, :, None] * color + noise[:, :, None]
+            case _:
+                raise ValueError(f"Unsupported capture format: {self._sim.capture_format}")
+
+        numpy.clip(beam, 0, 255, out=beam)
+        frame = self._pool.take()
+        numpy.copyto(frame, beam, casting="unsafe")
+        return frame
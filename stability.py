@@ -0,0 +1,266 @@
+from __future__ import annotations
+from dataclasses import dataclass
+from typing import Any
+
+from ring import attach_shared_memory, create_shared_memory
+
+import numpy
+import math
+
+QUANTITIES = ("center_horiz", "center_vert", "sigma_horiz", "sigma_vert")
+"""
+Record fields the statistics are kept for. Every record type of the analyzers has them, see analyzer.Record.
+"""
+MAX_WINDOWS = 8
+
+HEADER_DTYPE = numpy.dtype([
+    ("block_size", numpy.int64),
+    ("capacity", numpy.int64),
+    ("blocks", numpy.int64),
+    ("windows", numpy.int64, (MAX_WINDOWS,)),
+    ("reference", numpy.float64, (len(QUANTITIES),)),
+])
+BLOCK_DTYPE = numpy.dtype([
+    ("count", numpy.int64),
+    ("first_timestamp", numpy.int64),
+    ("last_timestamp", numpy.int64),
+    ("diffs", numpy.int64),
+    ("sum", numpy.float64, (len(QUANTITIES),)),
+    ("sumsq", numpy.float64, (len(QUANTITIES),)),
+    ("min", numpy.float64, (len(QUANTITIES),)),
+    ("max", numpy.float64, (len(QUANTITIES),)),
+    ("diffsq", numpy.float64, (len(QUANTITIES),)),
+])
+
+@dataclass
+class StabilityStats:
+    """
+    Statistics of one quantity over one window, in pixels.
+    """
+    mean: float
+    std: float
+    min: float
+    max: float
+    allan: dict[int, float]
+    """
+    Allan deviation per averaging length in records, for every averaging length that fits into the window at least twice.
+    """
+
+@dataclass
+class WindowStats:
+    count: int
+    """
+    Number of records in the window; less than its length until enough records arrived.
+    """
+    duration: float
+    """
+    Seconds between the first and the last record of the window, from the camera timestamps.
+    """
+    quantities: dict[str, StabilityStats]
+
+@dataclass
+class StabilitySnapshot:
+    records: int
+    windows: dict[int, WindowStats]
+    """
+    Statistics per window length in records.
+    """
+
+    def asdict(self) -> dict[str, Any]:
+        return {
+            "records": self.records,
+            "windows": {
+                length: {
+                    "count": window.count,
+                    "duration": window.duration,
+                    **{name: vars(stats) for name, stats in window.quantities.items()}
+                } for length, window in self.windows.items()
+            }
+        }
+
+class Stability:
+    """
+    Rolling beam stability statistics (mean, standard deviation, min/max and Allan deviation of the beam centers and
+    widths) over several window lengths, in shared memory. The analysis stage feeds every record; any local process
+    attaches and takes snapshots, so stability numbers are available live without reading the record files.
+
+    Records are summarized in blocks of block_size records (count, sums, squares, extrema and squared successive
+    differences), kept in a ring large enough for the longest window. An update only touches the current block, so
+    it takes constant time and the memory is fixed; a snapshot combines the blocks of each window. Windows therefore
+    cover their length rounded up to whole blocks, and the Allan deviation is available for averaging over 1 record
+    and over block_size records times powers of 4.
+    """
+    def __init__(self, shm, owner: bool):
+        """
+        **DO NOT USE!** Constructor for Stability class is only for internal usage.
+        Use Stability.create(...) or Stability.attach(...) instead!
+        """
+        self._shm = shm
+        self._owner = owner
+        self._header = numpy.ndarray((), HEADER_DTYPE, shm.buf, 0)
+        capacity = int(self._header["capacity"])
+        self._blocks = numpy.ndarray((capacity,), BLOCK_DTYPE, shm.buf, HEADER_DTYPE.itemsize)
+        self._block_size = int(self._header["block_size"])
+        self._capacity = capacity
+        self._count = self._blocks["count"]
+        self._first_timestamp = self._blocks["first_timestamp"]
+        self._last_timestamp = self._blocks["last_timestamp"]
+        self._diffs = self._blocks["diffs"]
+        self._sum = self._blocks["sum"]
+        self._sumsq = self._blocks["sumsq"]
+        self._min = self._blocks["min"]
+        self._max = self._blocks["max"]
+        self._diffsq = self._blocks["diffsq"]
+        self._index = 0
+        self._last: numpy.ndarray | None = None
+        self._reference: numpy.ndarray | None = None
+
+    @classmethod
+    def create(cls, name: str, windows: tuple[int, ...] = (100, 1000, 10000), block_size: int = 10) -> Stability:
+        """
+        Creates the shared memory block and takes ownership of it.
+
+        :param name: System wide name of the statistics block. Readers attach by this name.
+        :type name: str
+        :param windows: Window lengths in records, at most MAX_WINDOWS.
+        :type windows: tuple[int, ...]
+        :param block_size: Number of records summarized per block, the resolution of the windows.
+        :type block_size: int
+        :return: Stability object without records.
+        :rtype: Stability
+        """
+        if not 0 < len(windows) <= MAX_WINDOWS or min(windows) <= 0 or block_size <= 0:
+            raise ValueError(f"Invalid stability windows {windows} or block size {block_size}")
+        capacity = -(-max(windows) // block_size) + 2
+        shm = create_shared_memory(name, HEADER_DTYPE.itemsize + capacity * BLOCK_DTYPE.itemsize)
+        header = numpy.ndarray((), HEADER_DTYPE, shm.buf, 0)
+        header[()] = numpy.zeros((), HEADER_DTYPE)
+        header["block_size"] = block_size
+        header["capacity"] = capacity
+        header["windows"][:len(windows)] = sorted(windows)
+        del header
+        stability = cls(shm, True)
+        stability._blocks[:] = numpy.zeros(capacity, BLOCK_DTYPE)
+        return stability
+
+    @classmethod
+    def attach(cls, name: str) -> Stability:
+        """
+        Attaches to a statistics block created by another process.
+
+        :raises FileNotFoundError: The statistics block does not exist (yet).
+        """
+        return cls(attach_shared_memory(name), False)
+
+    def update(self, record: Any) -> None:
+        """
+        Adds a record (any record type of the analyzers). Records with non-finite values are skipped.
+        Values are kept relative to the first record, so that the sums of squares do not lose the small variations
+        of large positions.
+        """
+        value = numpy.array([getattr(record, quantity) for quantity in QUANTITIES], numpy.float64)
+        if not numpy.all(numpy.isfinite(value)):
+            return
+        if self._reference is None:
+            self._reference = value.copy()
+            self._header["reference"] = value
+        value -= self._reference
+
+        index = self._index
+        count = int(self._count[index])
+        if count == 0:
+            self._first_timestamp[index] = record.timestamp
+            self._min[index] = value
+            self._max[index] = value
+        else:
+            numpy.minimum(self._min[index], value, out=self._min[index])
+            numpy.maximum(self._max[index], value, out=self._max[index])
+        self._sum[index] += value
+        self._sumsq[index] += value * value
+        if self._last is not None:
+            difference = value - self._last
+            self._diffsq[index] += difference * difference
+            self._diffs[index] += 1
+        self._last_timestamp[index] = record.timestamp
+        self._count[index] = count + 1
+        self._last = value
+
+        if count + 1 >= self._block_size:
+            self._index = (index + 1) % self._capacity
+            self._blocks[self._index] = numpy.zeros((), BLOCK_DTYPE)
+            self._header["blocks"] += 1
+
+    def snapshot(self) -> StabilitySnapshot:
+        """
+        Combines the blocks of every window. The block in flight may be off by the record being added meanwhile.
+        """
+        header = self._header.copy()
+        blocks = self._blocks.copy()
+        completed = int(header["blocks"])
+        reference = header["reference"]
+        order = (completed - numpy.arange(min(completed + 1, self._capacity - 1))) % self._capacity
+        counts = blocks["count"][order]
+        records = int(completed * self._block_size + counts[0])
+
+        windows = {}
+        for length in (int(length) for length in header["windows"] if length > 0):
+            used = min(int(numpy.searchsorted(numpy.cumsum(counts), length)) + 1, len(order))
+            windows[length] = self._window(blocks[order[:used]], reference)
+        return StabilitySnapshot(records, windows)
+
+    def close(self) -> None:
+        """
+        Nessessary for cleanup. Releases the mapping and, if this process owns the block, removes it.
+        """
+        del self._header, self._blocks, self._count, self._first_timestamp, self._last_timestamp, self._diffs
+        del self._sum, self._sumsq, self._min, self._max, self._diffsq
+        self._shm.close()
+        if self._owner:
+            self._shm.unlink()
+
+    def _window(self, blocks: numpy.ndarray, reference: numpy.ndarray) -> WindowStats:
+        """
+        Statistics of the given blocks, newest first. Only for internal usage.
+        """
+        blocks = blocks[blocks["count"] > 0]
+        count = int(numpy.sum(blocks["count"]))
+        if count == 0:
+            return WindowStats(0, 0.0, {})
+
+        total = numpy.sum(blocks["sum"], axis=0)
+        mean = total / count
+        variance = (numpy.sum(blocks["sumsq"], axis=0) - total * mean) / max(count - 1, 1)
+        minimum = numpy.min(blocks["min"], axis=0)
+        maximum = numpy.max(blocks["max"], axis=0)
+        allan = self._allan(blocks)
+        duration = (int(blocks["last_timestamp"][0]) - int(blocks["first_timestamp"][-1])) * 1e-9
+
+        quantities = {
+            quantity: StabilityStats(
+                float(mean[i] + reference[i]),
+                math.sqrt(max(float(variance[i]), 0.0)),
+                float(minimum[i] + reference[i]),
+                float(maximum[i] + reference[i]),
+                {length: float(deviation[i]) for length, deviation in allan.items()}
+            ) for i, quantity in enumerate(QUANTITIES)
+        }
+        return WindowStats(count, duration, quantities)
+
+    def _allan(self, blocks: numpy.ndarray) -> dict[int, numpy.ndarray]:
+        """
+        Allan deviations of the blocks, newest first: over 1 record from the squared successive differences, over
+        block_size * 4**k records from the means of complete blocks (non-overlapping). Only for internal usage.
+        """
+        allan = {}
+        diffs = int(numpy.sum(blocks["diffs"]))
+        if diffs > 0:
+            allan[1] = numpy.sqrt(0.5 * numpy.sum(blocks["diffsq"], axis=0) / diffs)
+
+        complete = blocks[blocks["count"] == self._block_size]
+        means = complete["sum"] / self._block_size
+        group = 1
+        while len(means) // group >= 2:
+            averages = means[:len(means) // group * group].reshape(-1, group, len(QUANTITIES)).mean(axis=1)
+            allan[group * self._block_size] = numpy.sqrt(0.5 * numpy.mean(numpy.diff(averages, axis=0)**2, axis=0))
+            group *= 4
+        return allan
@@ -0,0 +1,204 @@
+from __future__ import annotations
+from collections import deque
+from typing import Any, Callable
+
+import threading
+import queue
+
+class DropPolicy:
+    """
+    Configuration class for the behaviour of a full StageQueue.
+    """
+    BLOCK = 0
+    """
+    The producer waits until the consumer made space. No item is ever lost.
+    """
+    DROP_OLDEST = 1
+    """
+    The oldest queued item is discarded in favour of the new one. The consumer always sees the most recent items.
+    """
+    DROP_NEWEST = 2
+    """
+    The new item is discarded. The consumer keeps working through the items that are already queued.
+    """
+
+class StageClosed(Exception):
+    """
+    Raised by StageQueue.get once the queue is closed and all remaining items have been consumed.
+    """
+
+class StageQueue:
+    """
+    Bounded thread-safe queue between two pipeline stages with a configurable drop policy.
+    """
+    def __init__(self, maxsize: int, policy: DropPolicy, on_drop: Callable[[Any], None] | None):
+        """
+        **DO NOT USE!** Constructor for StageQueue class is only for internal usage.
+        Use StageQueue.create(...) instead!
+        """
+        self._maxsize = maxsize
+        self._policy = policy
+        self._on_drop = on_drop
+        self._items: deque[Any] = deque()
+        self._cond = threading.Condition()
+        self._closed = False
+        self._dropped = 0
+
+    @classmethod
+    def create(cls, maxsize: int, policy: DropPolicy = DropPolicy.BLOCK, on_drop: Callable[[Any], None] | None = None) -> StageQueue:
+        """
+        Creates a StageQueue.
+
+        :param maxsize: Maximum number of queued items.
+        :type maxsize: int
+        :param policy: Behaviour when an item is put into a full queue.
+        :type policy: DropPolicy
+        :param on_drop: Optional callback that receives every item that is not delivered (e.g. to release its buffers).
+        :type on_drop: Callable[[Any], None] | None
+        :return: Empty StageQueue object.
+        :rtype: StageQueue
+        """
+        return cls(maxsize, policy, on_drop)
+
+    def put(self, item: Any, timeout: float | None = None) -> bool:
+        """
+        Puts an item into the queue according to the drop policy.
+
+        :param item: Item to be passed on to the consuming stage.
+        :param timeout: Maximum waiting time for DropPolicy.BLOCK. Waits indefinitely if None.
+        :type timeout: float | None
+        :return: False if the passed item was discarded, True otherwise.
+        :rtype: bool
+        """
+        dropped = None
+        with self._cond:
+            if self._closed:
+                dropped = item
+            elif len(self._items) >= self._maxsize:
+                match self._policy:
+                    case DropPolicy.BLOCK:
+                        if not self._cond.wait_for(lambda: len(self._items) < self._maxsize or self._closed, timeout) or self._closed:
+                            dropped = item
+                    case DropPolicy.DROP_OLDEST:
+                        dropped = self._items.popleft()
+                    case DropPolicy.DROP_NEWEST:
+                        dropped = item
+
+            if dropped is not None:
+                self._dropped += 1
+            if dropped is not item:
+                self._items.append(item)
+                self._cond.notify_all()
+
+        if dropped is not None and self._on_drop is not None:
+            self._on_drop(dropped)
+        return dropped is not item
+
+    def get(self, timeout: float | None = None) -> Any:
+        """
+        Takes the oldest item out of the queue.
+
+        :param timeout: Maximum waiting time for an item. Waits indefinitely if None.
+        :type timeout: float | None
+        :raises queue.Empty: No item arrived within the timeout.
+        :raises StageClosed: The queue is closed and drained.
+        """
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._items or self._closed, timeout):
+                raise queue.Empty
+            if not self._items:
+                raise StageClosed
+            item = self._items.popleft()
+            self._cond.notify_all()
+            return item
+
+    def close(self) -> None:
+        """
+        Closes the queue. Waiting producers and consumers wake up; remaining items can still be consumed.
+        """
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    def drain(self) -> list[Any]:
+        """
+        Removes and returns all queued items without waiting. The drop callback is not called for them.
+        """
+        with self._cond:
+            items = list(self._items)
+            self._items.clear()
+            self._cond.notify_all()
+            return items
+
+    @property
+    def depth(self) -> int:
+        return len(self._items)
+
+    @property
+    def dropped(self) -> int:
+        return self._dropped
+
+class Stage:
+    """
+    A pipeline stage running its loop on a dedicated thread.
+    """
+    def __init__(self, name: str, target: Callable[[threading.Event], None]):
+        """
+        **DO NOT USE!** Constructor for Stage class is only for internal usage.
+        Use Stage.create(...) instead!
+        """
+        self._name = name
+        self._target = target
+        self._stop = threading.Event()
+        self._error: Exception | None = None
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+
+    @classmethod
+    def create(cls, name: str, target: Callable[[threading.Event], None]) -> Stage:
+        """
+        Creates a Stage. The target runs the stage loop and should return once the passed stop event is set.
+
+        :param name: Name of the stage (used for the thread name and error messages).
+        :type name: str
+        :param target: Stage loop taking the stop event.
+        :type target: Callable[[threading.Event], None]
+        :return: Stage object, not started yet.
+        :rtype: Stage
+        """
+        return cls(name, target)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        """
+        Signals the stage loop to return. Does not wait for it.
+        """
+        self._stop.set()
+
+    def join(self, timeout: float | None = None) -> None:
+        self._thread.join(timeout)
+
+    def is_alive(self) -> bool:
+        return self._thread.is_alive()
+
+    def check(self) -> None:
+        """
+        Reraises the exception that ended the stage loop, if any.
+        """
+        if self._error is not None:
+            raise RuntimeError(f"Stage {self._name} failed") from self._error
+
+    @property
+    def name(self) -> str:
+        return self._name
+
+    def _run(self) -> None:
+        """
+        Thread entry point. Captures the exception of a failing stage loop. Only for internal usage.
+        """
+        try:
+            self._target(self._stop)
+        except Exception as ex:
+            print(f"Stage {self._name} failed: {ex}")
+            self._error = ex
@@ -0,0 +1,245 @@
+from __future__ import annotations
+from typing import Any
+
+from ring import attach_shared_memory, create_shared_memory
+from recorder import record_dtype, record_row
+
+import numpy
+import json
+import time
+
+DTYPE_SIZE = 4096
+"""
+Bytes reserved in the header for the record dtype (JSON), which lets subscribers attach by name only.
+"""
+HEADER_DTYPE = numpy.dtype([
+    ("slots", numpy.int64),
+    ("head", numpy.int64),
+    ("dtype", f"S{DTYPE_SIZE}"),
+])
+WAIT_INTERVAL = 0.0002
+"""
+Seconds a waiting subscriber sleeps between two checks for new records. Bounds the added latency well below a
+millisecond at a negligible load.
+"""
+
+class RecordStream:
+    """
+    Publishes the records of a dispatched camera to any number of local subscribers through a ring of fixed-width
+    binary rows in shared memory (see RecordSubscriber). Publishing never waits for subscribers: a row is written
+    into the next slot and the head sequence advanced, like FrameRing. Subscribers only read, so they attach and
+    detach at any time without the publisher noticing; one that falls more than a ring behind loses the overwritten
+    records (and counts them) instead of slowing the publisher down.
+    """
+    def __init__(self, shm, owner: bool):
+        """
+        **DO NOT USE!** Constructor for RecordStream class is only for internal usage.
+        Use RecordStream.create(...) or RecordStream.attach(...) instead!
+        """
+        self._shm = shm
+        self._owner = owner
+        self._header = numpy.ndarray((), HEADER_DTYPE, shm.buf, 0)
+        slots = int(self._header["slots"])
+        dtype = numpy.dtype([tuple(column) for column in json.loads(bytes(self._header["dtype"][()]).decode())])
+        self._slots = slots
+        self._sequence = numpy.ndarray((slots,), numpy.int64, shm.buf, HEADER_DTYPE.itemsize)
+        self._rows = numpy.ndarray((slots,), dtype, shm.buf, HEADER_DTYPE.itemsize + slots * 8)
+        self._names = dtype.names
+
+    @classmethod
+    def create(cls, name: str, record_type: type, slots: int = 1024) -> RecordStream:
+        """
+        Creates the shared memory block and takes ownership of it. Only the owner publishes and unlinks the block.
+
+        :param name: System wide name of the stream. Subscribers attach by this name.
+        :type name: str
+        :param record_type: Dataclass of the published records, see analyzer.Record. Its fields must be int, float or bool.
+        :type record_type: type
+        :param slots: Number of records kept for subscribers. Determines how far a subscriber may fall behind.
+        :type slots: int
+        :return: Empty RecordStream object owning the shared memory.
+        :rtype: RecordStream
+        """
+        dtype = record_dtype(record_type)
+        descr = json.dumps(dtype.descr).encode()
+        if len(descr) > DTYPE_SIZE:
+            raise ValueError(f"Record type {record_type.__name__} has too many fields for a record stream")
+        shm = create_shared_memory(name, HEADER_DTYPE.itemsize + slots * (8 + dtype.itemsize))
+
+        header = numpy.ndarray((), HEADER_DTYPE, shm.buf, 0)
+        header["slots"] = slots
+        header["head"] = 0
+        header["dtype"] = descr
+        del header
+
+        stream = cls(shm, True)
+        stream._sequence[:] = 0
+        return stream
+
+    @classmethod
+    def attach(cls, name: str) -> RecordStream:
+        """
+        Attaches to a stream created by another process, see RecordSubscriber.attach(...).
+
+        :raises FileNotFoundError: The stream does not exist (yet).
+        """
+        return cls(attach_shared_memory(name), False)
+
+    def publish(self, record: Any) -> int:
+        """
+        Writes a record into the next slot and advances the head. Never waits.
+
+        :return: Sequence number of the record.
+        :rtype: int
+        """
+        sequence = int(self._header["head"]) + 1
+        slot = sequence % self._slots
+        self._sequence[slot] = -1
+        self._rows[slot] = record_row(record, self._names)
+        self._sequence[slot] = sequence
+        self._header["head"] = sequence
+        return sequence
+
+    @property
+    def head(self) -> int:
+        """
+        Sequence number of the most recently published record (0 before the first record).
+        """
+        return int(self._header["head"])
+
+    @property
+    def slots(self) -> int:
+        return self._slots
+
+    @property
+    def dtype(self) -> numpy.dtype:
+        return self._rows.dtype
+
+    def read(self, first: int, last: int) -> tuple[numpy.ndarray, int]:
+        """
+        Copies the records with sequence numbers first to last that are still in the ring. Records overwritten
+        before or while they are copied are left out.
+
+        :return: Copied rows in order, and the number of records left out.
+        :rtype: tuple[numpy.ndarray, int]
+        """
+        sequences = numpy.arange(first, last + 1)
+        slots = sequences % self._slots
+        rows = self._rows[slots]
+        current = self._sequence[slots] == sequences
+        if numpy.all(current):
+            return rows, 0
+        return rows[current], int(numpy.count_nonzero(~current))
+
+    def close(self) -> None:
+        """
+        Nessessary for cleanup. Releases the mapping and, if this process owns the stream, removes the shared memory block.
+        """
+        del self._header, self._sequence, self._rows
+        self._shm.close()
+        if self._owner:
+            self._shm.unlink()
+
+class RecordSubscriber:
+    """
+    Reads the records of a RecordStream in order from any local process. Every subscriber keeps its own position,
+    so subscribers do not affect each other or the publisher. A subscriber that falls behind by more than the ring
+    skips to the oldest record still available and counts the skipped ones as dropped; latest() gives the newest
+    record regardless of the position.
+    """
+    def __init__(self, stream: RecordStream, position: int):
+        """
+        **DO NOT USE!** Constructor for RecordSubscriber class is only for internal usage.
+        Use RecordSubscriber.attach(...) instead!
+        """
+        self._stream = stream
+        self._position = position
+        self._dropped = 0
+
+    @classmethod
+    def attach(cls, name: str, from_start: bool = False) -> RecordSubscriber:
+        """
+        Attaches to a record stream, e.g. dispatch.stream_name(camera name).
+
+        :param name: Name the stream was created with.
+        :type name: str
+        :param from_start: Start with the oldest record still in the ring instead of the next one published.
+        :type from_start: bool
+        :raises FileNotFoundError: The stream does not exist (yet).
+        :return: RecordSubscriber object.
+        :rtype: RecordSubscriber
+        """
+        stream = RecordStream.attach(name)
+        head = stream.head
+        return cls(stream, max(head - stream.slots + 2, 1) if from_start else head + 1)
+
+    @property
+    def dtype(self) -> numpy.dtype:
+        """
+        Structured dtype of the records, one field per record field.
+        """
+        return self._stream.dtype
+
+    @property
+    def dropped(self) -> int:
+        """
+        Number of records lost so far because this subscriber fell behind.
+        """
+        return self._dropped
+
+    def poll(self, max_count: int | None = None) -> numpy.ndarray:
+        """
+        Reads the records published since the last call, without waiting.
+
+        :param max_count: Maximum number of records, the oldest first. All available if None.
+        :type max_count: int | None
+        :return: Structured array of the records in order, empty if there are none.
+        :rtype: numpy.ndarray
+        """
+        head = self._stream.head
+        if self._position > head:
+            return numpy.empty(0, self.dtype)
+
+        oldest = max(head - self._stream.slots + 2, 1)
+        if self._position < oldest:
+            self._dropped += oldest - self._position
+            self._position = oldest
+        last = head if max_count is None else min(head, self._position + max_count - 1)
+        rows, lost = self._stream.read(self._position, last)
+        self._dropped += lost
+        self._position = last + 1
+        return rows
+
+    def wait(self, timeout: float | None = None, max_count: int | None = None) -> numpy.ndarray:
+        """
+        Reads the records published since the last call, waiting for at least one.
+
+        :param timeout: Maximum number of seconds to wait, forever if None.
+        :type timeout: float | None
+        :return: Structured array of the records in order, empty if the timeout passed.
+        :rtype: numpy.ndarray
+        """
+        deadline = time.perf_counter() + timeout if timeout is not None else None
+        while self._position > self._stream.head:
+            if deadline is not None and time.perf_counter() >= deadline:
+                return numpy.empty(0, self.dtype)
+            time.sleep(WAIT_INTERVAL)
+        return self.poll(max_count)
+
+    def latest(self) -> numpy.void | None:
+        """
+        Newest record, independent of the position of the subscriber. None before the first record.
+        """
+        head = self._stream.head
+        while head > 0:
+            rows, _ = self._stream.read(head, head)
+            if len(rows):
+                return rows[0]
+            head = self._stream.head
+        return None
+
+    def close(self) -> None:
+        """
+        Detaches from the stream. The publisher is not affected.
+        """
+        self._stream.close()
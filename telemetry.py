@@ -0,0 +1,339 @@
+from __future__ import annotations
+from dataclasses import dataclass, asdict
+
+from ring import attach_shared_memory, create_shared_memory
+
+import numpy
+import json
+import math
+import time
+
+class Metric:
+    """
+    Enumeration over the timed steps of the dispatch loop.
+    """
+    ACQUIRE = 0
+    """
+    camera.acquire(...), including the wait for the next image.
+    """
+    CONVERT = 1
+    """
+    Conversion of the raw frame to the mono frame that is analysed.
+    """
+    PROCESS = 2
+    """
+    Processing pipeline on the mono frame.
+    """
+    PUBLISH = 3
+    """
+    Copy of the frames into the shared memory ring.
+    """
+    ANALYZE = 4
+    """
+    Beam analysis of the processed frame (e.g. projections and Gaussian fits), see analyzer.
+    """
+    RECORD = 5
+    """
+    Writing the record and, with raw recording, the raw frame.
+    """
+    DISPLAY = 6
+    """
+    Rendering a frame in the window, including its conversion for display.
+    """
+    COUNT = 7
+    NAMES = ("acquire", "convert", "process", "publish", "analyze", "record", "display")
+
+class Counter:
+    """
+    Enumeration over the frame counters of the dispatch loop.
+    """
+    FRAMES = 0
+    """
+    Frames acquired.
+    """
+    MISSING = 1
+    """
+    Frames never acquired, from gaps in the frame ids. Includes incomplete frames, if the camera counted them.
+    """
+    INCOMPLETE = 2
+    """
+    Images the camera delivered incomplete.
+    """
+    ERRORS = 3
+    """
+    Other failed acquisitions (e.g. timeouts).
+    """
+    UNPUBLISHED = 4
+    """
+    Frames not published to the shared memory ring, as they do not fit its slots (e.g. after a resize at runtime).
+    """
+    COUNT = 5
+
+class QueueSlot:
+    """
+    Enumeration over the stage queues of the dispatch loop.
+    """
+    ANALYSIS = 0
+    DISPLAY = 1
+    RECORD = 2
+    COUNT = 3
+    NAMES = ("analysis", "display", "record")
+
+class Phase:
+    """
+    Enumeration over the startup phases of a dispatched camera, in order.
+    """
+    PROCESS = 0
+    """
+    The dispatch process runs, its modules are imported.
+    """
+    CONTEXT = 1
+    CAMERA = 2
+    """
+    The camera is found and initialized.
+    """
+    SETUP = 3
+    ACQUISITION = 4
+    """
+    The image acquisition began.
+    """
+    FIRST_FRAME = 5
+    COUNT = 6
+    NAMES = ("process", "context", "camera", "setup", "acquisition", "first_frame")
+
+SUB_BUCKETS = 4
+"""
+Number of buckets per power of two. Latencies are resolved to 25% of their magnitude.
+"""
+MIN_EXPONENT = 10
+"""
+Latencies up to 2**MIN_EXPONENT nanoseconds (about 1 µs) fall into the first bucket.
+"""
+BUCKET_COUNT = 25 * SUB_BUCKETS
+"""
+The last bucket collects every latency above 2**(MIN_EXPONENT + 24) nanoseconds (about 17 s).
+"""
+
+TELEMETRY_DTYPE = numpy.dtype([
+    ("first_timestamp", numpy.int64),
+    ("last_timestamp", numpy.int64),
+    ("last_frame_id", numpy.int64),
+    ("startup", numpy.float64, (Phase.COUNT,)),
+    ("counters", numpy.int64, (Counter.COUNT,)),
+    ("queues", numpy.int64, (QueueSlot.COUNT, 3)),
+    ("count", numpy.int64, (Metric.COUNT,)),
+    ("total", numpy.int64, (Metric.COUNT,)),
+    ("max", numpy.int64, (Metric.COUNT,)),
+    ("buckets", numpy.int64, (Metric.COUNT, BUCKET_COUNT)),
+])
+
+def bucket_index(latency: int) -> int:
+    """
+    Histogram bucket of a latency in nanoseconds.
+    """
+    mantissa, exponent = math.frexp(latency)
+    index = (exponent - MIN_EXPONENT) * SUB_BUCKETS + int((mantissa - 0.5) * 2 * SUB_BUCKETS)
+    return min(max(index, 0), BUCKET_COUNT - 1)
+
+def bucket_upper(index: int) -> int:
+    """
+    Upper bound of a histogram bucket in nanoseconds.
+    """
+    exponent, sub = divmod(index + 1, SUB_BUCKETS)
+    return int(2 ** (MIN_EXPONENT + exponent - 1) * (1 + sub / SUB_BUCKETS))
+
+@dataclass
+class LatencyStats:
+    """
+    Latency distribution of one step in seconds. Percentiles are upper bucket bounds, i.e. accurate to 25%.
+    """
+    count: int
+    mean: float
+    p50: float
+    p90: float
+    p99: float
+    max: float
+
+@dataclass
+class QueueStats:
+    depth: int
+    max_depth: int
+    dropped: int
+
+@dataclass
+class TelemetrySnapshot:
+    frames: int
+    missing: int
+    """
+    Frames never acquired, from gaps in the frame ids.
+    """
+    incomplete: int
+    errors: int
+    unpublished: int
+    """
+    Frames not published to the shared memory ring, see Counter.UNPUBLISHED.
+    """
+    frame_rate: float
+    """
+    Average acquisition rate in frames per second, from the camera timestamps.
+    """
+    latency: dict[str, LatencyStats]
+    queues: dict[str, QueueStats]
+    startup: dict[str, float]
+    """
+    Wall clock time (time.time()) every startup phase completed at, for the phases completed so far.
+    """
+
+class Telemetry:
+    """
+    Fixed-size latency histograms and frame counters of a dispatched camera in shared memory. The stages of the
+    dispatch loop write their own entries without locking; any local process attaches and takes snapshots.
+    Counters and histograms are cumulative since the camera was dispatched.
+    """
+    def __init__(self, shm, owner: bool):
+        """
+        **DO NOT USE!** Constructor for Telemetry class is only for internal usage.
+        Use Telemetry.create(...) or Telemetry.attach(...) instead!
+        """
+        self._shm = shm
+        self._owner = owner
+        self._block = numpy.ndarray((), TELEMETRY_DTYPE, shm.buf, 0)
+        self._counters = self._block["counters"]
+        self._queues = self._block["queues"]
+        self._count = self._block["count"]
+        self._total = self._block["total"]
+        self._max = self._block["max"]
+        self._buckets = self._block["buckets"]
+
+    @classmethod
+    def create(cls, name: str) -> Telemetry:
+        """
+        Creates the shared memory block and takes ownership of it.
+
+        :param name: System wide name of the telemetry block. Readers attach by this name.
+        :type name: str
+        :return: Telemetry object with cleared counters.
+        :rtype: Telemetry
+        """
+        shm = create_shared_memory(name, TELEMETRY_DTYPE.itemsize)
+        telemetry = cls(shm, True)
+        telemetry._block[()] = numpy.zeros((), TELEMETRY_DTYPE)
+        telemetry._block["last_frame_id"] = -1
+        return telemetry
+
+    @classmethod
+    def attach(cls, name: str) -> Telemetry:
+        """
+        Attaches to a telemetry block created by another process.
+
+        :raises FileNotFoundError: The telemetry block does not exist (yet).
+        """
+        return cls(attach_shared_memory(name), False)
+
+    def lap(self, metric: int, start: int) -> int:
+        """
+        Adds the time since start to the histogram of a step.
+
+        :param metric: Timed step, see Metric.
+        :type metric: int
+        :param start: Start of the step from time.perf_counter_ns().
+        :type start: int
+        :return: Current time from time.perf_counter_ns(), the start of the next step.
+        :rtype: int
+        """
+        now = time.perf_counter_ns()
+        latency = now - start
+        self._count[metric] += 1
+        self._total[metric] += latency
+        if latency > self._max[metric]:
+            self._max[metric] = latency
+        self._buckets[metric, bucket_index(latency)] += 1
+        return now
+
+    def mark(self, phase: int) -> None:
+        """
+        Notes the completion of a startup phase, see Phase.
+        """
+        self._block["startup"][phase] = time.time()
+
+    def frame(self, frame_id: int, timestamp: int) -> None:
+        """
+        Counts an acquired frame and the frames missing since the previous one.
+        """
+        block = self._block
+        last_frame_id = int(block["last_frame_id"])
+        if last_frame_id < 0:
+            self.mark(Phase.FIRST_FRAME)
+            block["first_timestamp"] = timestamp
+        elif frame_id > last_frame_id + 1:
+            self._counters[Counter.MISSING] += frame_id - last_frame_id - 1
+        block["last_frame_id"] = frame_id
+        block["last_timestamp"] = timestamp
+        self._counters[Counter.FRAMES] += 1
+
+    def count(self, counter: int) -> None:
+        self._counters[counter] += 1
+
+    def queue(self, slot: int, depth: int, dropped: int) -> None:
+        """
+        Samples the depth and the number of dropped items of a stage queue.
+        """
+        queue = self._queues[slot]
+        queue[0] = depth
+        if depth > queue[1]:
+            queue[1] = depth
+        queue[2] = dropped
+
+    def snapshot(self) -> TelemetrySnapshot:
+        """
+        Copies the current state. Entries written meanwhile may be off by the frame in flight.
+        """
+        block = self._block.copy()
+        counters = block["counters"]
+        frames = int(counters[Counter.FRAMES])
+        duration = int(block["last_timestamp"]) - int(block["first_timestamp"])
+        latency = {
+            name: self._latency(int(block["count"][metric]), int(block["total"][metric]), int(block["max"][metric]), block["buckets"][metric])
+            for metric, name in enumerate(Metric.NAMES)
+        }
+        queues = {
+            name: QueueStats(*(int(value) for value in block["queues"][slot]))
+            for slot, name in enumerate(QueueSlot.NAMES)
+        }
+        return TelemetrySnapshot(
+            frames,
+            int(counters[Counter.MISSING]),
+            int(counters[Counter.INCOMPLETE]),
+            int(counters[Counter.ERRORS]),
+            int(counters[Counter.UNPUBLISHED]),
+            (frames - 1) / (duration * 1e-9) if frames > 1 and duration > 0 else 0.0,
+            latency,
+            queues,
+            {name: float(when) for name, when in zip(Phase.NAMES, block["startup"]) if when > 0}
+        )
+
+    def close(self) -> None:
+        """
+        Nessessary for cleanup. Releases the mapping and, if this process owns the block, removes it.
+        """
+        del self._block, self._counters, self._queues, self._count, self._total, self._max, self._buckets
+        self._shm.close()
+        if self._owner:
+            self._shm.unlink()
+
+    def _latency(self, count: int, total: int, maximum: int, buckets: numpy.ndarray) -> LatencyStats:
+        """
+        Summarizes the histogram of one step. Only for internal usage.
+        """
+        if count == 0:
+            return LatencyStats(0, 0.0, 0.0, 0.0, 0.0, 0.0)
+        cumulative = numpy.cumsum(buckets)
+        percentile = lambda p: min(bucket_upper(int(numpy.searchsorted(cumulative, p * cumulative[-1]))), maximum) * 1e-9
+        return LatencyStats(count, total / count * 1e-9, percentile(0.5), percentile(0.9), percentile(0.99), maximum * 1e-9)
+
+def append_metrics(path: str, snapshot: TelemetrySnapshot) -> None:
+    """
+    Appends a snapshot as one JSON line to a metrics file.
+    """
+    with open(path, "a") as file:
+        file.write(json.dumps({"time": time.time(), **asdict(snapshot)}) + "\n")
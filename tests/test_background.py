@@ -0,0 +1,24 @@
+import numpy
+
+import background
+import utils
+
+def test_save_subimage_keeps_background(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(background, "_backgrounds", {})
+    (tmp_path / "config").mkdir()
+
+    learned = background.get_background("CAM")
+    learned.update(numpy.full((16, 16), 20, numpy.uint8))
+    learned.save()
+    background.flush_backgrounds()
+    expected = learned.frame.copy()
+
+    beam = numpy.zeros((16, 16, 3), numpy.uint8)
+    beam[4:12, 4:12] = 255
+    utils.save_subimage("CAM", beam)
+
+    monkeypatch.setattr(background, "_backgrounds", {})
+    reloaded = background.get_background("CAM")
+    assert reloaded.frame is not None
+    assert numpy.array_equal(reloaded.frame, expected)
@@ -0,0 +1,117 @@
+from __future__ import annotations
+
+from processor import Region
+from utils import Gaussian
+
+import math
+
+class RoiTracker:
+    """
+    Places a region of interest a few sigma around the beam, based on the fit of the previous frame, so that
+    processing, projection and fitting only cover the beam instead of the whole frame.
+
+    All positions are given in pixels of the processed frame without region of interest, i.e. the frame the records
+    refer to. Analyzers place their results there when given the corner of the region, see analyzer.
+    """
+    ALIGN = 16
+    """
+    The region edges are aligned to multiples of ALIGN pixels, so that small beam movements do not change the region
+    (every new region recompiles the processor pipeline).
+    """
+
+    def __init__(self, sigmas: float, min_size: int):
+        """
+        **DO NOT USE!** Constructor for RoiTracker class is only for internal usage.
+        Use RoiTracker.create(...) instead!
+        """
+        self._sigmas = sigmas
+        self._min_size = min_size
+        self._bounds: tuple[int, int] | None = None
+        self._roi: Region | None = None
+        self._lost = 0
+
+    @classmethod
+    def create(cls, sigmas: float = 6.0, min_size: int = 64) -> RoiTracker:
+        """
+        Creates a RoiTracker. It starts with a full frame search.
+
+        :param sigmas: Half width and height of the region in fitted sigmas.
+        :type sigmas: float
+        :param min_size: Minimum width and height of the region in pixels.
+        :type min_size: int
+        :return: RoiTracker object.
+        :rtype: RoiTracker
+        """
+        return cls(sigmas, min_size)
+
+    @property
+    def roi(self) -> Region | None:
+        """
+        Region (x0, y0, x1, y1) to be analysed next, or None for a full frame search.
+        """
+        return self._roi
+
+    @property
+    def lost(self) -> int:
+        """
+        Number of times the beam was lost and the tracker fell back to a full frame search.
+        """
+        return self._lost
+
+    def reset(self, bounds: tuple[int, int] | None = None) -> None:
+        """
+        Falls back to a full frame search.
+
+        :param bounds: Size (height, width) of the full processed frame, if it is known.
+        :type bounds: tuple[int, int] | None
+        """
+        if self._roi is not None:
+            self._lost += 1
+        self._roi = None
+        if bounds is not None:
+            self._bounds = bounds
+
+    def update(self, horiz_gaussian: Gaussian, vert_gaussian: Gaussian) -> None:
+        """
+        Places the region for the next frame around the fits of the current one (given in full processed frame pixels).
+        Falls back to a full frame search if the fits lost the beam. The region only moves once the beam leaves it
+        or it is much larger than needed.
+        """
+        if self._bounds is None:
+            return
+        height, width = self._bounds
+        search = self._roi if self._roi is not None else (0, 0, width, height)
+        if not self._found(horiz_gaussian, search[0], search[2]) or not self._found(vert_gaussian, search[1], search[3]):
+            self.reset()
+            return
+
+        x0, x1 = self._span(horiz_gaussian, width)
+        y0, y1 = self._span(vert_gaussian, height)
+        if self._roi is not None:
+            rx0, ry0, rx1, ry1 = self._roi
+            inside = rx0 <= x0 and ry0 <= y0 and x1 <= rx1 and y1 <= ry1
+            if inside and (rx1 - rx0) * (ry1 - ry0) <= 4 * (x1 - x0) * (y1 - y0):
+                return
+
+        if (x0, y0, x1, y1) == (0, 0, width, height):
+            self._roi = None
+        else:
+            self._roi = (x0, y0, x1, y1)
+
+    def _found(self, gaussian: Gaussian, low: int, high: int) -> bool:
+        """
+        Whether a fit describes a beam inside the searched interval. Only for internal usage.
+        """
+        values = (gaussian.amplitude, gaussian.center, gaussian.sigma)
+        return all(math.isfinite(value) for value in values) and gaussian.amplitude > 0 \
+            and gaussian.sigma > 0 and low <= gaussian.center < high
+
+    def _span(self, gaussian: Gaussian, size: int) -> tuple[int, int]:
+        """
+        Aligned interval of sigmas * sigma around the center, at least min_size wide and clipped to the frame.
+        Only for internal usage.
+        """
+        half = max(self._sigmas * gaussian.sigma, self._min_size / 2)
+        low = math.floor((gaussian.center - half) / self.ALIGN) * self.ALIGN
+        high = math.ceil((gaussian.center + half) / self.ALIGN) * self.ALIGN
+        return max(low, 0), min(high, size)
@@ -1,17 +1,16 @@
 from __future__ import annotations
 from dataclasses import dataclass, asdict
 from contextlib import contextmanager
+from functools import cached_property
 from typing import Callable, TypeAlias, Any
 
 # from Processors import Processor, ProcessFilter
 
 import cv2
 import numpy
-import scipy
 
 import time
 import threading
-import keyboard
 
 class HardwareTimer:
     def __init__(self, epoch_count: int, epoch_callback: Callable[[float], None] | None):
@@ -146,12 +145,6 @@ Frame: TypeAlias = cv2.typing.MatLike
 Type alias for a pixel array (Frame data)
 """
 
-@dataclass
-class Capture:
-    rgb: Frame
-    mono: Frame
-    processed: Frame
-
 def keyboard_signal(key: str) -> threading.Event:
     """
     Helper function to define a break condition on specific keyboard input to stop the acquisition loop..
@@ -161,6 +154,8 @@ def keyboard_signal(key: str) -> threading.Event:
     :return: Thread signal that is set whenever specified keyboard input is detected.
     :rtype: threading.Event
     """
+    import keyboard
+
     signal = threading.Event()
     keyboard.add_hotkey(key, lambda: signal.set())
     return signal
@@ -175,6 +170,18 @@ class DisplayMode:
     MONO = 1
     PROCESSED = 2
 
+@dataclass
+class CameraConfig:
+    width: int | None = None
+    height: int | None = None
+    offset_x: int | None = None
+    offset_y: int | None = None
+    frame_rate: int | None = None
+    adc_bit_depth: Any | None = None
+    exposure_time: int | None = None
+    gain: float | None = None
+    gamma: float | None = None
+
 @dataclass
 class FrameData:
     frame_id: int
@@ -182,24 +189,127 @@ class FrameData:
     exposure_time: float
     capture_format: CaptureFormat
 
-def convert_bayer_mono(frame: Frame) -> Frame:
-    return cv2.cvtColor(frame, cv2.COLOR_BayerRG2GRAY)
+def convert_bayer_mono(frame: Frame, dst: Frame | None = None) -> Frame:
+    return cv2.cvtColor(frame, cv2.COLOR_BayerRG2GRAY, dst=dst)
     
-def convert_bayer_rgb(frame: Frame) -> Frame:
-    return cv2.cvtColor(frame, cv2.COLOR_BayerRG2RGB)
+def convert_bayer_rgb(frame: Frame, dst: Frame | None = None) -> Frame:
+    return cv2.cvtColor(frame, cv2.COLOR_BayerRG2RGB, dst=dst)
+
+def convert_rgb_mono(frame: Frame, dst: Frame | None = None) -> Frame:
+    return cv2.cvtColor(frame, cv2.COLOR_RGB2GRAY, dst=dst)
+
+def expand_mono_rgb(frame: Frame, dst: Frame | None = None) -> Frame:
+    return cv2.cvtColor(frame, cv2.COLOR_GRAY2RGB, dst=dst)
+
+def decimate_bayer_green(frame: Frame) -> Frame:
+    """
+    Half resolution mono frame from the two green pixels of every 2x2 BayerRG cell. No demosaicing involved.
+    """
+    return ((frame[0::2, 1::2].astype(numpy.uint16) + frame[1::2, 0::2]) >> 1).astype(numpy.uint8)
+
+def decimate_mono(frame: Frame) -> Frame:
+    """
+    Half resolution mono frame by averaging every 2x2 cell.
+    """
+    return cv2.resize(frame, (frame.shape[1] // 2, frame.shape[0] // 2), interpolation=cv2.INTER_AREA)
 
-def convert_rgb_mono(frame: Frame) -> Frame:
-    return cv2.cvtColor(frame, cv2.COLOR_RGB2GRAY)
+class Capture:
+    """
+    An acquired frame together with its conversions. The RGB, mono and processed frames are computed on first access
+    and cached, so only what the current display mode and analysis need is ever converted.
+    """
+    HALF_SCALE = 2.0
+    """
+    Size of a half resolution pixel in full resolution pixels.
+    """
+    HALF_SHIFT = 0.5
+    """
+    Full resolution position of the center of the first half resolution pixel.
+    """
 
-def expand_mono_rgb(frame: Frame) -> Frame:
-    return cv2.cvtColor(frame, cv2.COLOR_GRAY2RGB)
+    def __init__(self, frame_data: FrameData, frame: Frame, process: Callable[[Frame], Frame] | None, mono_dst: Frame | None):
+        """
+        **DO NOT USE!** Constructor for Capture class is only for internal usage.
+        Use Capture.create(...) instead!
+        """
+        self._frame_data = frame_data
+        self._frame = frame
+        self._process = process
+        self._mono_dst = mono_dst if mono_dst is not None and mono_dst.shape == frame.shape[:2] else None
 
-def get_filename(camera_name: str) -> str:
+    @classmethod
+    def create(cls, frame_data: FrameData, frame: Frame, process: Callable[[Frame], Frame] | None = None, mono_dst: Frame | None = None) -> Capture:
+        """
+        Wraps an acquired frame. Nothing is converted yet.
+
+        :param frame_data: Frame data of the acquired frame.
+        :type frame_data: FrameData
+        :param frame: Acquired frame in the capture format of the frame data.
+        :type frame: Frame
+        :param process: Processing applied to the mono frame (e.g. Processor.process). The processed frame equals the mono frame if None.
+        :type process: Callable[[Frame], Frame] | None
+        :param mono_dst: Optional buffer the mono frame is converted into instead of a new allocation. Unused for MONO8 frames, which are their own mono frame.
+        :type mono_dst: Frame | None
+        :return: Capture object.
+        :rtype: Capture
+        """
+        return cls(frame_data, frame, process, mono_dst)
+
+    @property
+    def frame_data(self) -> FrameData:
+        return self._frame_data
+
+    @property
+    def raw(self) -> Frame:
+        return self._frame
+
+    @cached_property
+    def rgb(self) -> Frame:
+        match self._frame_data.capture_format:
+            case CaptureFormat.BAYER_RG8:
+                return convert_bayer_rgb(self._frame)
+            case CaptureFormat.MONO8:
+                return expand_mono_rgb(self._frame)
+            case CaptureFormat.RGB8:
+                return self._frame
+
+    @cached_property
+    def mono(self) -> Frame:
+        match self._frame_data.capture_format:
+            case CaptureFormat.BAYER_RG8:
+                return convert_bayer_mono(self._frame, self._mono_dst)
+            case CaptureFormat.MONO8:
+                return self._frame
+            case CaptureFormat.RGB8:
+                return convert_rgb_mono(self._frame, self._mono_dst)
+
+    @cached_property
+    def half_mono(self) -> Frame:
+        """
+        Half resolution mono frame for fast analysis. BayerRG frames are decimated to their green pixels without demosaicing.
+        Positions convert to full resolution by x * HALF_SCALE + HALF_SHIFT.
+        """
+        if self._frame_data.capture_format == CaptureFormat.BAYER_RG8:
+            return decimate_bayer_green(self._frame)
+        return decimate_mono(self.mono)
+
+    @cached_property
+    def processed(self) -> Frame:
+        return self.mono if self._process is None else self._process(self.mono)
+
+    @cached_property
+    def half_processed(self) -> Frame:
+        return self.half_mono if self._process is None else self._process(self.half_mono)
+
+def get_filename(camera_name: str, extension: str = "csv") -> str:
     lt = time.localtime()
-    return f"./record/{camera_name}-{lt.tm_year}{lt.tm_mon:02d}{lt.tm_mday:02d}-{lt.tm_hour:02d}{lt.tm_min:02d}.csv"
+    return f"./record/{camera_name}-{lt.tm_year}{lt.tm_mon:02d}{lt.tm_mday:02d}-{lt.tm_hour:02d}{lt.tm_min:02d}.{extension}"
 
 def save_subimage(camera_name: str, frame: Frame) -> None:
-    cv2.imwrite(f"./config/{camera_name}.png", frame)
+    """
+    Saves a mono or RGB frame (e.g. Capture.rgb) as ./config/<camera_name>.png.
+    """
+    cv2.imwrite(f"./config/{camera_name}.png", cv2.cvtColor(frame, cv2.COLOR_RGB2BGR) if frame.ndim == 3 else frame)
 
 def project(frame: Frame) -> tuple[numpy.array[int], numpy.array[int]]:
     hori_dist = numpy.sum(frame, 0)
@@ -214,33 +324,429 @@ class Gaussian:
     offset: float
     perr: numpy.array[float]
 
-def gauss_fit(distribution: numpy.array[int]) -> Gaussian:
-    amp_guess = numpy.max(distribution)
-    offset_guess = numpy.min(distribution)
-    center_guess = distribution.tolist().index(amp_guess)
+    def rescaled(self, factor: float, shift: float) -> Gaussian:
+        """
+        Converts a Gaussian fitted to a projection of a resampled frame (e.g. Capture.half_processed) to full resolution.
+        Positions map to x * factor + shift; widths, amplitude and offset scale by factor, since every projection bin sums factor times as many pixels.
+        """
+        return Gaussian(
+            self.amplitude * factor,
+            self.center * factor + shift,
+            self.sigma * factor,
+            self.offset * factor,
+            self.perr * factor
+        )
 
-    indecies = numpy.arange(len(distribution))
-    mean = numpy.average(indecies, weights=distribution)
-    sigma_guess = numpy.sqrt(numpy.average((indecies - mean)**2, weights=distribution))
+GAUSS_FIT_MAX_ITER = 50
+"""
+Maximum number of Levenberg-Marquardt iterations before gauss_fit falls back to the closed-form estimate.
+"""
+GAUSS_FIT_TOLERANCE = 1e-8
+"""
+Relative change of the squared residual sum below which a fit counts as converged.
+"""
+GAUSS_FIT_BATCH_ROWS = 32
+"""
+Number of rows gauss_fit_batch iterates at once. Small enough for the working arrays of sensor wide projections to
+stay in the CPU cache, large enough to amortize the per-call overhead.
+"""
 
-    def gauss(x: float, amplitude: float, center: float, sigma: float, offset: float) -> float:
-        return amplitude * numpy.exp(-0.5 * ((x - center)**2 / sigma**2))+ offset
+def gauss(x: numpy.array[float], amplitude: float, center: float, sigma: float, offset: float) -> numpy.array[float]:
+    return amplitude * numpy.exp(-0.5 * ((x - center)**2 / sigma**2)) + offset
 
-    params, cov_matrix = scipy.optimize.curve_fit(
-        gauss, 
-        xdata=indecies, 
-        ydata=distribution, 
-        p0=(
-            amp_guess,
-            center_guess,
-            sigma_guess,
-            offset_guess
-        )
-    )
+def gauss_fit(distribution: numpy.array[int], warm_start: Gaussian | None = None) -> Gaussian:
+    """
+    Fits a Gaussian with constant offset to a 1D distribution (e.g. a projection of the beam) by Levenberg-Marquardt
+    iterations with the analytic Jacobian. If the fit does not converge, the closed-form log-parabola estimate
+    (or, failing that, the moments of the distribution) is returned instead. Results centered outside the distribution
+    or wider than it are rejected (see _gauss_plausible).
+
+    :param distribution: Distribution to be fitted.
+    :type distribution: numpy.array[int]
+    :param warm_start: Optional result of the previous frame. The fit runs from it and from the moments, and the result with the lower squared residual sum is kept, so a stale warm start after a jump of the beam cannot lead the fit astray.
+    :type warm_start: Gaussian | None
+    :raises ValueError: The distribution is empty or flat, or no fit describes a beam inside it.
+    :return: Fitted parameters and their standard errors (in the same way as scipy.optimize.curve_fit).
+    :rtype: Gaussian
+    """
+    y = numpy.asarray(distribution, dtype=numpy.float64)
+    x = numpy.arange(len(y), dtype=numpy.float64)
+
+    scale = numpy.max(numpy.abs(y))
+    if len(y) < 5 or scale == 0:
+        raise ValueError("Cannot fit a Gaussian to an empty distribution")
+    y = y / scale
+
+    params = _gauss_guess(x, y)
+    cold = (_gauss_levenberg_marquardt(x, y, params), lambda: _gauss_log_parabola(x, y), lambda: params)
+    candidates = [_gauss_first_plausible(cold, len(y))]
+    if warm_start is not None:
+        warm = numpy.array([warm_start.amplitude / scale, warm_start.center, abs(warm_start.sigma), warm_start.offset / scale])
+        if numpy.all(numpy.isfinite(warm)) and warm[2] > 0:
+            candidates.append(_gauss_first_plausible((_gauss_levenberg_marquardt(x, y, warm),), len(y)))
+    candidates = [fitted for fitted in candidates if fitted is not None]
+    if not candidates:
+        raise ValueError("Gaussian fit does not describe a beam inside the distribution")
+    fitted = min(candidates, key=lambda candidate: _gauss_ssr(x, y, candidate))
+
+    amplitude, center, sigma, offset = fitted
+    perr = _gauss_perr(x, y, fitted) * numpy.array([scale, 1.0, 1.0, scale])
+    return Gaussian(amplitude * scale, center, abs(sigma), offset * scale, perr)
+
+def gauss_fit_batch(distributions: numpy.ndarray, warm_start: numpy.ndarray | None = None) -> tuple[numpy.ndarray, numpy.ndarray]:
+    """
+    Fits a Gaussian with constant offset to every row of a 2D array (e.g. N projections of the same width), with the
+    same results as gauss_fit per row. The Levenberg-Marquardt iterations run on GAUSS_FIT_BATCH_ROWS rows at once with
+    per-row damping, which saves the per-call overhead of the single fits; rows that do not converge fall back to the
+    closed-form estimate like in gauss_fit. Empty or flat rows, and rows without a plausible fit, yield NaN.
+
+    :param distributions: Array of shape (N, width) with one distribution per row.
+    :type distributions: numpy.ndarray
+    :param warm_start: Optional starting parameters, either one row (amplitude, center, sigma, offset) for all or one row per distribution. Like in gauss_fit, rows are fitted from both the warm start and the moments.
+    :type warm_start: numpy.ndarray | None
+    :return: Parameters (amplitude, center, sigma, offset) and their standard errors, both of shape (N, 4).
+    :rtype: tuple[numpy.ndarray, numpy.ndarray]
+    """
+    y = numpy.array(distributions, dtype=numpy.float64, ndmin=2)
+    count = len(y)
+    params = numpy.full((count, 4), numpy.nan)
+    perr = numpy.full((count, 4), numpy.nan)
+    warm = None if warm_start is None else numpy.broadcast_to(numpy.asarray(warm_start, dtype=numpy.float64), (count, 4))
+    for first in range(0, count, GAUSS_FIT_BATCH_ROWS):
+        rows = slice(first, first + GAUSS_FIT_BATCH_ROWS)
+        params[rows], perr[rows] = _gauss_fit_rows(y[rows], None if warm is None else warm[rows])
+    return params, perr
+
+def _gauss_guess(x: numpy.ndarray, y: numpy.ndarray) -> numpy.ndarray:
+    """
+    Starting parameters from the peak and the moments of the distribution. Only for internal usage.
+    """
+    peak = int(numpy.argmax(y))
+    offset = numpy.min(y)
+    weights = y - offset
+    total = numpy.sum(weights)
+    if total <= 0:
+        raise ValueError("Cannot fit a Gaussian to a flat distribution")
+    mean = numpy.dot(weights, x) / total
+    sigma = numpy.sqrt(numpy.dot(weights, (x - mean)**2) / total)
+    return numpy.array([y[peak] - offset, float(peak), max(sigma, 0.5), offset])
+
+def _gauss_jacobian(x: numpy.ndarray, params: numpy.ndarray) -> tuple[numpy.ndarray, numpy.ndarray]:
+    """
+    Model values and Jacobian (4 x n, one row per parameter) of the Gaussian with offset. Only for internal usage.
+    """
+    amplitude, center, sigma, offset = params
+    u = (x - center) / sigma
+    e = numpy.exp(-0.5 * u * u)
+    ae = amplitude * e
+    jacobian = numpy.empty((4, len(x)))
+    jacobian[0] = e
+    jacobian[1] = ae * u / sigma
+    jacobian[2] = jacobian[1] * u
+    jacobian[3] = 1.0
+    return ae + offset, jacobian
+
+def _gauss_plausible(params: numpy.ndarray, length: int) -> bool:
+    """
+    Whether fitted parameters describe a beam inside the distribution: finite, positive, centered within it and not
+    wider than it. Fits drifting off to a broad, degenerate Gaussian fail this. Only for internal usage.
+    """
+    return bool(numpy.all(numpy.isfinite(params))) and params[0] > 0 and 0 <= params[1] < length and 0 < abs(params[2]) <= length
+
+def _gauss_first_plausible(fits: tuple, length: int) -> numpy.ndarray | None:
+    """
+    First plausible of several fits in order of preference, each given as parameters (or None) or as a function
+    computing them only when needed. Only for internal usage.
+    """
+    for fitted in fits:
+        fitted = fitted() if callable(fitted) else fitted
+        if fitted is not None and _gauss_plausible(fitted, length):
+            return fitted
+    return None
+
+def _gauss_ssr(x: numpy.ndarray, y: numpy.ndarray, params: numpy.ndarray) -> float:
+    residual = y - gauss(x, *params)
+    return float(numpy.dot(residual, residual))
+
+def _gauss_levenberg_marquardt(x: numpy.ndarray, y: numpy.ndarray, params: numpy.ndarray) -> numpy.ndarray | None:
+    """
+    Levenberg-Marquardt iterations with Marquardt's diagonal scaling. Returns None if the fit does not converge. Only for internal usage.
+    """
+    damping = 1e-3
+    model, jacobian = _gauss_jacobian(x, params)
+    residual = y - model
+    ssr = numpy.dot(residual, residual)
+
+    for _ in range(GAUSS_FIT_MAX_ITER):
+        jtj = jacobian @ jacobian.T
+        jtr = jacobian @ residual
+        diagonal = numpy.diag(jtj).copy()
+        diagonal[diagonal == 0] = 1.0
+
+        while True:
+            try:
+                step = numpy.linalg.solve(jtj + damping * numpy.diag(diagonal), jtr)
+            except numpy.linalg.LinAlgError:
+                return None
+            candidate = params + step
+            if candidate[2] == 0:
+                candidate[2] = params[2]
+            candidate_residual = y - gauss(x, *candidate)
+            candidate_ssr = numpy.dot(candidate_residual, candidate_residual)
+            if candidate_ssr <= ssr:
+                break
+            damping *= 10
+            if damping > 1e10:
+                return params if numpy.all(numpy.isfinite(params)) else None
+
+        converged = ssr - candidate_ssr <= GAUSS_FIT_TOLERANCE * ssr
+        params, ssr = candidate, candidate_ssr
+        damping = max(damping / 10, 1e-10)
+        if converged:
+            return params if numpy.all(numpy.isfinite(params)) else None
+        model, jacobian = _gauss_jacobian(x, params)
+        residual = y - model
+    return None
+
+def _gauss_log_parabola(x: numpy.ndarray, y: numpy.ndarray) -> numpy.ndarray | None:
+    """
+    Closed-form estimate: a parabola fitted to the logarithm of the offset-free distribution around its peak,
+    weighted with the squared values. Returns None if the distribution has no parabolic peak. Only for internal usage.
+    """
+    offset = numpy.min(y)
+    values = y - offset
+    mask = values > 0.2 * numpy.max(values)
+    if numpy.count_nonzero(mask) < 3:
+        return None
+
+    xs, vs = x[mask], values[mask]
+    c2, c1, c0 = numpy.polyfit(xs, numpy.log(vs), 2, w=vs)
+    if c2 >= 0:
+        return None
+    sigma = numpy.sqrt(-0.5 / c2)
+    center = -c1 / (2 * c2)
+    amplitude = numpy.exp(c0 - c1 * c1 / (4 * c2))
+    return numpy.array([amplitude, center, sigma, offset])
+
+def _gauss_perr(x: numpy.ndarray, y: numpy.ndarray, params: numpy.ndarray) -> numpy.ndarray:
+    """
+    Standard errors from the covariance estimate inv(J^T J) * SSR / (n - 4). Only for internal usage.
+    """
+    model, jacobian = _gauss_jacobian(x, params)
+    residual = y - model
+    try:
+        cov_matrix = numpy.linalg.inv(jacobian @ jacobian.T) * numpy.dot(residual, residual) / (len(x) - 4)
+    except numpy.linalg.LinAlgError:
+        return numpy.full(4, numpy.inf)
+    return numpy.sqrt(numpy.abs(numpy.diag(cov_matrix)))
+
+def _gauss_guess_batch(x: numpy.ndarray, y: numpy.ndarray) -> numpy.ndarray:
+    """
+    Row-wise counterpart of _gauss_guess for distributions known to be neither empty nor flat. Only for internal usage.
+    """
+    rows = numpy.arange(len(y))
+    peak = numpy.argmax(y, axis=1)
+    offset = numpy.min(y, axis=1)
+    weights = y - offset[:, None]
+    total = numpy.sum(weights, axis=1)
+    mean = weights @ x / total
+    sigma = numpy.sqrt(numpy.sum(weights * (x[None, :] - mean[:, None])**2, axis=1) / total)
+    return numpy.stack([y[rows, peak] - offset, peak.astype(numpy.float64), numpy.maximum(sigma, 0.5), offset], axis=1)
+
+def _gauss_jacobian_batch(x: numpy.ndarray, params: numpy.ndarray) -> tuple[numpy.ndarray, numpy.ndarray]:
+    """
+    Row-wise counterpart of _gauss_jacobian. Returns models (N x n) and Jacobians (N x 4 x n). Only for internal usage.
+    """
+    amplitude, center, sigma, offset = (params[:, i, None] for i in range(4))
+    u = (x[None, :] - center) / sigma
+    e = numpy.exp(-0.5 * u * u)
+    ae = amplitude * e
+    jacobian = numpy.empty((len(params), 4, len(x)))
+    jacobian[:, 0] = e
+    jacobian[:, 1] = ae * u / sigma
+    jacobian[:, 2] = jacobian[:, 1] * u
+    jacobian[:, 3] = 1.0
+    return ae + offset, jacobian
+
+def _gauss_ssr_batch(x: numpy.ndarray, y: numpy.ndarray, params: numpy.ndarray) -> numpy.ndarray:
+    """
+    Row-wise squared residual sums. Only for internal usage.
+    """
+    amplitude, center, sigma, offset = (params[:, i, None] for i in range(4))
+    residual = y - (amplitude * numpy.exp(-0.5 * ((x[None, :] - center) / sigma)**2) + offset)
+    return numpy.einsum("ij,ij->i", residual, residual)
+
+def _gauss_fit_rows(y: numpy.ndarray, warm_start: numpy.ndarray | None) -> tuple[numpy.ndarray, numpy.ndarray]:
+    """
+    gauss_fit_batch on one chunk of rows. Only for internal usage.
+    """
+    count, length = y.shape
+    x = numpy.arange(length, dtype=numpy.float64)
+    params = numpy.full((count, 4), numpy.nan)
+    perr = numpy.full((count, 4), numpy.nan)
+
+    scale = numpy.max(numpy.abs(y), axis=1)
+    offset = numpy.min(y, axis=1)
+    valid = (scale > 0) & (numpy.max(y, axis=1) > offset) & (length >= 5)
+    if not numpy.any(valid):
+        return params, perr
+    y = y[valid] / scale[valid, None]
+    scale = scale[valid]
+
+    start = _gauss_guess_batch(x, y)
+    fitted, converged = _gauss_levenberg_marquardt_batch(x, y, start)
+    converged &= _gauss_plausible_batch(fitted, length)
+    for row in numpy.flatnonzero(~converged):
+        fallback = _gauss_first_plausible((lambda: _gauss_log_parabola(x, y[row]), start[row]), length)
+        fitted[row] = fallback if fallback is not None else numpy.nan
+    if warm_start is not None:
+        warm = warm_start[valid].copy()
+        warm[:, 0] /= scale
+        warm[:, 3] /= scale
+        warm[:, 2] = numpy.abs(warm[:, 2])
+        usable = numpy.flatnonzero(numpy.all(numpy.isfinite(warm), axis=1) & (warm[:, 2] > 0))
+        if len(usable):
+            warm_fitted, warm_converged = _gauss_levenberg_marquardt_batch(x, y[usable], warm[usable])
+            warm_converged &= _gauss_plausible_batch(warm_fitted, length)
+            better = warm_converged & (_gauss_ssr_batch(x, y[usable], warm_fitted) < _gauss_ssr_batch(x, y[usable], fitted[usable]))
+            fitted[usable[better]] = warm_fitted[better]
+
+    fitted[:, 2] = numpy.abs(fitted[:, 2])
+    errors = _gauss_perr_batch(x, y, fitted)
+    fitted[:, 0] *= scale
+    fitted[:, 3] *= scale
+    errors[:, 0] *= scale
+    errors[:, 3] *= scale
+    errors[~numpy.all(numpy.isfinite(fitted), axis=1)] = numpy.nan
+    params[valid] = fitted
+    perr[valid] = errors
+    return params, perr
+
+def _gauss_plausible_batch(params: numpy.ndarray, length: int) -> numpy.ndarray:
+    """
+    Row-wise counterpart of _gauss_plausible. Only for internal usage.
+    """
+    with numpy.errstate(invalid="ignore"):
+        return numpy.all(numpy.isfinite(params), axis=1) & (params[:, 0] > 0) & (params[:, 1] >= 0) & (params[:, 1] < length) & (numpy.abs(params[:, 2]) > 0) & (numpy.abs(params[:, 2]) <= length)
 
-    amplitude, center, sigma, offset= params
-    perr = numpy.sqrt(numpy.diag(cov_matrix))
-    return Gaussian(amplitude, center, sigma, offset, perr)
+def _gauss_terms_batch(x: numpy.ndarray, params: numpy.ndarray) -> tuple[numpy.ndarray, numpy.ndarray]:
+    """
+    Normalized distances u = (x - center) / sigma and exponentials exp(-u²/2) of every row (both N x n), the
+    expensive part of both the model and its Jacobian. Only for internal usage.
+    """
+    u = x[None, :] - params[:, 1, None]
+    u *= 1.0 / params[:, 2, None]
+    e = u * u
+    e *= -0.5
+    numpy.exp(e, out=e)
+    return u, e
+
+def _gauss_residual_batch(y: numpy.ndarray, params: numpy.ndarray, e: numpy.ndarray) -> numpy.ndarray:
+    """
+    Residuals of every row from its exponentials, see _gauss_terms_batch. Only for internal usage.
+    """
+    residual = e * -params[:, 0, None]
+    residual += y
+    residual -= params[:, 3, None]
+    return residual
+
+def _gauss_normal_batch(params: numpy.ndarray, u: numpy.ndarray, e: numpy.ndarray, residual: numpy.ndarray) -> tuple[numpy.ndarray, numpy.ndarray]:
+    """
+    Normal equations J^T J (N x 4 x 4) and J^T r (N x 4) of every row from its terms (see _gauss_terms_batch) and
+    residuals. Only for internal usage.
+    """
+    jacobian = numpy.empty((len(params), 4, u.shape[1]))
+    jacobian[:, 0] = e
+    numpy.multiply(e, (params[:, 0] / params[:, 2])[:, None], out=jacobian[:, 1])
+    jacobian[:, 1] *= u
+    numpy.multiply(jacobian[:, 1], u, out=jacobian[:, 2])
+    jacobian[:, 3] = 1.0
+    return jacobian @ jacobian.transpose(0, 2, 1), numpy.einsum("ikn,in->ik", jacobian, residual)
+
+def _solve_batch(system: numpy.ndarray, rhs: numpy.ndarray) -> numpy.ndarray:
+    """
+    Solves a stack of linear systems. If one is singular, the rows are solved one by one and the singular ones yield
+    NaN, so they do not fail the others. Only for internal usage.
+    """
+    try:
+        return numpy.linalg.solve(system, rhs[:, :, None])[:, :, 0]
+    except numpy.linalg.LinAlgError:
+        pass
+    step = numpy.full(rhs.shape, numpy.nan)
+    for row in range(len(rhs)):
+        try:
+            step[row] = numpy.linalg.solve(system[row], rhs[row])
+        except numpy.linalg.LinAlgError:
+            pass
+    return step
+
+def _gauss_levenberg_marquardt_batch(x: numpy.ndarray, y: numpy.ndarray, params: numpy.ndarray) -> tuple[numpy.ndarray, numpy.ndarray]:
+    """
+    Levenberg-Marquardt iterations on all rows at once, step for step like _gauss_levenberg_marquardt per row.
+    Only the 4 x 4 normal equations of the rows are kept between iterations. Candidate steps are judged by their
+    squared residual sums alone, and the Jacobian is evaluated again only for rows whose step was taken and that
+    keep iterating. Returns the parameters and a mask of the rows that converged. Only for internal usage.
+    """
+    params = params.copy()
+    count = len(params)
+    damping = numpy.full(count, 1e-3)
+    converged = numpy.zeros(count, dtype=bool)
+    active = numpy.arange(count)
+    u, e = _gauss_terms_batch(x, params)
+    residual = _gauss_residual_batch(y, params, e)
+    ssr = numpy.einsum("ij,ij->i", residual, residual)
+    jtj, jtr = _gauss_normal_batch(params, u, e, residual)
+    eye = numpy.eye(4)
+
+    for _ in range(2 * GAUSS_FIT_MAX_ITER):
+        diagonal = numpy.diagonal(jtj, axis1=1, axis2=2).copy()
+        diagonal[diagonal == 0] = 1.0
+        step = _solve_batch(jtj + (damping[active, None] * diagonal)[:, :, None] * eye, jtr)
+        solved = numpy.all(numpy.isfinite(step), axis=1)
+        candidate = params[active] + numpy.where(solved[:, None], step, 0.0)
+        with numpy.errstate(over="ignore", invalid="ignore", divide="ignore"):
+            u, e = _gauss_terms_batch(x, candidate)
+            residual = _gauss_residual_batch(y[active], candidate, e)
+            candidate_ssr = numpy.einsum("ij,ij->i", residual, residual)
+
+        previous_ssr = ssr[active]
+        improved = solved & numpy.isfinite(candidate_ssr) & (candidate_ssr <= previous_ssr)
+        done = improved & (previous_ssr - candidate_ssr <= GAUSS_FIT_TOLERANCE * previous_ssr)
+        rows = active[improved]
+        params[rows] = candidate[improved]
+        ssr[rows] = candidate_ssr[improved]
+        damping[rows] = numpy.maximum(damping[rows] / 10, 1e-10)
+        damping[active[~improved]] *= 10
+
+        stuck = solved & ~improved & (damping[active] > 1e10)
+        keep = solved & ~(done | stuck)
+        converged[active[done | stuck]] = True
+        refresh = improved & keep
+        active = active[keep]
+        if len(active) == 0:
+            break
+        jtj, jtr = jtj[keep], jtr[keep]
+        if numpy.any(refresh):
+            rows = numpy.flatnonzero(refresh[keep])
+            jtj[rows], jtr[rows] = _gauss_normal_batch(candidate[refresh], u[refresh], e[refresh], residual[refresh])
+
+    converged &= numpy.all(numpy.isfinite(params), axis=1)
+    return params, converged
+
+def _gauss_perr_batch(x: numpy.ndarray, y: numpy.ndarray, params: numpy.ndarray) -> numpy.ndarray:
+    """
+    Row-wise counterpart of _gauss_perr. Only for internal usage.
+    """
+    model, jacobian = _gauss_jacobian_batch(x, params)
+    residual = y - model
+    jtj = jacobian @ jacobian.transpose(0, 2, 1)
+    variance = numpy.einsum("ij,ij->i", residual, residual) / (len(x) - 4)
+    perr = numpy.full((len(params), 4), numpy.inf)
+    invertible = numpy.abs(numpy.linalg.det(jtj)) > 0
+    if numpy.any(invertible):
+        cov_matrix = numpy.linalg.inv(jtj[invertible]) * variance[invertible, None, None]
+        perr[invertible] = numpy.sqrt(numpy.abs(numpy.diagonal(cov_matrix, axis1=1, axis2=2)))
+    return perr
 
 @dataclass
 class DataRecord: